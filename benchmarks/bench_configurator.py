@@ -0,0 +1,126 @@
+"""ROI 标注界面渲染基准：对比逐标签整帧 PIL 往返（旧实现）与分层缓存渲染（RoiRenderer）的单帧耗时。
+
+用法：
+    python benchmarks/bench_configurator.py [--rois 0,10,30,60] [--frames 50] [--size 2480x3508] [--font 字体路径]
+
+无需显示器：只拼帧不 imshow。分层渲染分别统计拖拽时的单帧耗时（底图层命中缓存）与 ROI 变化后的重建耗时；
+未找到中文字体时用 PIL 自带字体，保证走的是 PIL 文字路径。
+"""
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import roi_configurator as rc  # noqa: E402
+
+_HEADER = [
+    ("左键拖拽画框; u撤销; c清空; d丢弃黄色; s保存; q退出; ESC退出", (255, 255, 255), 1.0, 2),
+    ("已存在字段: {n}  | 新增框: 0", (255, 255, 255), 0.9, 2),
+    ("提示: 每个框画完即命名；按 s 一次性保存", (255, 255, 255), 0.85, 2),
+    ("提示: 仅按字母键执行操作（s/u/c/d/q），避免 Ctrl 组合键", (255, 255, 255), 0.9, 2),
+]
+
+
+def _setup_font(path=None):
+    if path:
+        rc.CJK_FONT_CANDIDATES.insert(0, path)
+    if any(os.path.exists(p) for p in rc.CJK_FONT_CANDIDATES):
+        return
+    print("[WARN] 未找到中文字体（可用 --font 指定），改用 PIL 自带字体计时。", flush=True)
+    _, _, ImageFont = rc._pil()
+    for fs in (0.6, 0.85, 0.9, 1.0, 1.1):
+        size = int(22 * fs)
+        rc.FONT_CACHE[size] = ImageFont.load_default(size=size)
+
+
+def _rois(n, rng):
+    out = []
+    for i in range(n):
+        x, y = rng.uniform(0, 0.85), rng.uniform(0, 0.95)
+        out.append({"name": f"字段_{i + 1}", "x": x, "y": y, "w": rng.uniform(0.05, 0.15), "h": 0.03})
+    return out
+
+
+def _legacy_text(frame, text, org, color, font_scale, max_width=None, line_spacing=8):
+    """旧 draw_text/draw_text_multiline：每次调用整帧 BGR→RGB→PIL→BGR"""
+    PILImage, ImageDraw, _ = rc._pil()
+    font = rc._load_cjk_font(size=int(22 * font_scale))
+    pil_img = PILImage.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(pil_img)
+    for idx, ln in enumerate(rc.TextBatch._pil_lines(str(text), font, bool(max_width), max_width)):
+        draw.text((org[0], org[1] + idx * (font.size + line_spacing)), ln, font=font, fill=color[::-1])
+    frame[:] = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+
+
+def _legacy_frame(renderer, rois, rect):
+    """旧实现：每帧重建画布，每个标签与每段表头文字各做一次整帧 BGR→RGB→PIL→BGR"""
+    lines = [(t.format(n=len(rois)), c, fs, th) for t, c, fs, th in _HEADER]
+    heights = [rc.measure_text_height(t, fs, max_width=renderer.dw - 40, line_spacing=6) for t, _, fs, _ in lines]
+    header_h = max(rc.HEADER_MIN_H, sum(heights) + 40)
+    display = np.zeros((renderer.dh + header_h, renderer.dw, 3), dtype=np.uint8)
+    display[header_h:] = renderer.base
+    for r in rois:
+        sx, sy, sw, sh = renderer.box(r)
+        sy += header_h
+        cv2.rectangle(display, (sx, sy), (sx + sw, sy + sh), (0, 255, 255), 2)
+        _legacy_text(display, r["name"], (sx + 4, sy + 18), (0, 255, 255), 0.6)
+    x1, y1, x2, y2 = rect
+    cv2.rectangle(display, (int(x1 * renderer.scale), int(y1 * renderer.scale) + header_h),
+                  (int(x2 * renderer.scale), int(y2 * renderer.scale) + header_h), (255, 0, 0), 1)
+    y0 = 30
+    for (t, c, fs, th), lh in zip(lines, heights):
+        _legacy_text(display, t, (20, y0), c, fs, max_width=renderer.dw - 40, line_spacing=6)
+        y0 += lh + rc.HEADER_GAP
+    return display
+
+
+def _time(fn, frames):
+    # 预热用的输入与计时的各帧都不同，重建计时不会命中预热留下的缓存
+    fn(-1)
+    t0 = time.perf_counter()
+    for i in range(frames):
+        fn(i)
+    return (time.perf_counter() - t0) / frames * 1000.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ROI 标注界面渲染耗时")
+    parser.add_argument("--rois", default="0,10,30,60", help="已有 ROI 数量，逗号分隔")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--size", default="2480x3508", help="模板图尺寸 宽x高（默认 A4 300dpi）")
+    parser.add_argument("--font", default=None)
+    args = parser.parse_args(argv)
+    _setup_font(args.font)
+
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    rng = np.random.default_rng(0)
+    img = rng.integers(180, 256, (h, w, 3), dtype=np.uint8)
+    print(f"模板 {w}x{h}，每组 {args.frames} 帧", flush=True)
+    print(f"{'ROI数':>6}{'旧实现(ms/帧)':>16}{'拖拽(ms/帧)':>14}{'重建(ms/次)':>14}", flush=True)
+    for n in (int(v) for v in args.rois.split(",") if v.strip()):
+        rois = _rois(n, rng)
+        renderer = rc.RoiRenderer(img)
+        lines = [(t.format(n=n), c, fs, th) for t, c, fs, th in _HEADER]
+
+        def rect(i):
+            return (100, 100, 400 + i * 5, 200 + i * 3)
+
+        legacy = _time(lambda i: _legacy_frame(renderer, rois, rect(i)), args.frames)
+        drag = _time(lambda i: renderer.compose(renderer.header(lines), renderer.overlay(rois, []), rect(i)),
+                     args.frames)
+        # ROI 列表变化（如新增一个框）时底图层整体重建
+        rebuild = _time(lambda i: renderer.compose(renderer.header(lines),
+                                                   renderer.overlay(rois, [dict(rois[0] if rois else _rois(1, rng)[0],
+                                                                                name=f"新_{i}")])),
+                        max(1, args.frames // 5))
+        print(f"{n:>6}{legacy:>16.2f}{drag:>14.2f}{rebuild:>14.2f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
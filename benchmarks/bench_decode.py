@@ -0,0 +1,99 @@
+"""解码基准：对比完整解码与按 ROI 局部解码（REGION_DECODE / DECODE_GRAY）的耗时与解码像素量。
+
+用法：
+    python benchmarks/bench_decode.py [--images 20] [--size 3024x4032] [--repeat 3]
+
+默认以 images/ 中的样例放大成手机拍照尺寸的 JPEG/PNG 作为输入，ROI 取自 roi_config.json。
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mass_ocr_to_excel_rapidocr as ocr  # noqa: E402
+
+
+def _make_inputs(tmp_dir: str, size, fmt: str, count: int):
+    src = None
+    img_dir = os.path.join(ROOT, ocr.IMAGE_DIR)
+    for f in sorted(os.listdir(img_dir)):
+        if f.lower().endswith((".png", ".jpg", ".jpeg")):
+            src = Image.open(os.path.join(img_dir, f)).convert("RGB").resize(size, Image.BICUBIC)
+            break
+    if src is None:
+        src = Image.new("RGB", size, "white")
+    paths = []
+    for i in range(count):
+        p = os.path.join(tmp_dir, f"scan_{i:04d}.{fmt}")
+        if fmt == "jpg":
+            src.save(p, quality=90)
+        else:
+            src.save(p)
+        paths.append(p)
+    return paths
+
+
+def _full_decode(path: str, rois):
+    im = Image.open(path)
+    im.load()
+    crops = [ocr.crop_by_roi(im, r) for r in rois]
+    return im.size[0] * im.size[1] * len(im.getbands()), crops
+
+
+def _region_decode(path: str, rois):
+    im, size = ocr.open_for_rois(path, rois)
+    crops = [ocr.crop_by_roi(im, r, size) for r in rois]
+    return im.size[0] * im.size[1] * len(im.getbands()), crops
+
+
+def _run(name: str, fn, paths, rois, repeat: int):
+    best = None
+    decoded = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        decoded = 0
+        for p in paths:
+            n, _ = fn(p, rois)
+            decoded += n
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    per_img = best / max(1, len(paths)) * 1000
+    mb = decoded / max(1, len(paths)) / (1 << 20)
+    print(f"  {name:<22} {per_img:8.1f} ms/张   解码数据 {mb:7.1f} MB/张")
+    return per_img
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="完整解码 vs ROI 局部解码 基准")
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--size", default="3024x4032", help="合成图片尺寸 宽x高")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--roi-config", default=os.path.join(ROOT, ocr.ROI_CONFIG_PATH))
+    args = parser.parse_args(argv)
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    rois, _ = ocr.load_roi_config(args.roi_config)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ("jpg", "png"):
+            paths = _make_inputs(tmp, size, fmt, args.images)
+            print(f"[{fmt.upper()}] {args.images} 张 {size[0]}x{size[1]}，ROI {len(rois)} 个")
+            ocr.REGION_DECODE, ocr.DECODE_GRAY = False, False
+            base = _run("完整解码", _full_decode, paths, rois, args.repeat)
+            ocr.REGION_DECODE = True
+            region = _run("ROI 局部解码", _region_decode, paths, rois, args.repeat)
+            print(f"  {'加速比':<22} {base / max(region, 1e-9):8.2f}x")
+            if fmt == "jpg":
+                ocr.DECODE_GRAY = True
+                gray = _run("ROI 局部解码 + 灰度", _region_decode, paths, rois, args.repeat)
+                print(f"  {'加速比':<22} {base / max(gray, 1e-9):8.2f}x")
+                ocr.DECODE_GRAY = False
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""导出基准：对比各导出格式（逐行写出器）与 pandas.DataFrame.to_excel 的耗时、峰值内存与文件大小。
+
+用法：
+    python benchmarks/bench_export.py [--rows 100000] [--rois 6] [--formats csv,xlsx,jsonl,parquet,feather]
+
+每种格式在独立子进程中写出同一批合成结果（长数字编号、日期、中文姓名），峰值内存取子进程的 ru_maxrss；
+缺少可选依赖（openpyxl / pyarrow / pandas）的格式标记为跳过。
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 子进程：生成合成行 → 写出 → 输出 JSON（秒、峰值内存 MB）
+_CHILD = r"""
+import sys, json, time, resource
+sys.path.insert(0, {root!r})
+fmt, path, n, n_rois = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+rois = [f"roi_{{i}}" for i in range(n_rois)]
+columns = ["filename", "relative_path"] + rois
+names = ["张伟", "王芳", "李娜", "刘洋", "陈静"]
+
+def rows():
+    for i in range(n):
+        row = {{"filename": f"scan_{{i:07d}}.jpg", "relative_path": f"batch_{{i // 1000:04d}}/scan_{{i:07d}}.jpg"}}
+        for j, c in enumerate(rois):
+            k = j % 3
+            row[c] = f"{{6222020200000000000 + i * 7 + j}}" if k == 0 else (f"2024-{{i % 12 + 1:02d}}-{{j + 1:02d}}" if k == 1 else names[(i + j) % 5])
+        yield row
+
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.perf_counter()
+if fmt == "pandas_xlsx":
+    import pandas as pd
+    df = pd.DataFrame(list(rows()), columns=columns)
+    for c in rois:
+        df[c] = df[c].astype(str)
+    df.to_excel(path, index=False)
+else:
+    from ocr_writers import open_row_writer
+    w = open_row_writer(fmt, path, columns, flush_every=10000)
+    for r in rows():
+        w.write(r)
+    w.close()
+seconds = time.perf_counter() - t0
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+print(json.dumps({{"seconds": seconds, "peak_mb": peak / scale, "delta_mb": (peak - base) / scale}}))
+"""
+
+_EXT = {"pandas_xlsx": ".pandas.xlsx"}
+
+
+def _run(fmt: str, tmp_dir: str, rows: int, rois: int):
+    from ocr_writers import FORMATS
+    path = os.path.join(tmp_dir, "bench" + _EXT.get(fmt, FORMATS.get(fmt, "")))
+    code = _CHILD.format(root=ROOT)
+    proc = subprocess.run([sys.executable, "-c", code, fmt, path, str(rows), str(rois)], cwd=ROOT,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8")
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["失败"]
+        return None, tail[0]
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    out["size_mb"] = os.path.getsize(path) / (1024.0 * 1024.0)
+    return out, ""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出格式基准")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--rois", type=int, default=6, help="每行的 ROI 列数")
+    parser.add_argument("--formats", default="csv,xlsx,jsonl,parquet,feather")
+    parser.add_argument("--no-pandas", dest="pandas", action="store_false", help="不运行 pandas.to_excel 对照")
+    args = parser.parse_args(argv)
+
+    from ocr_writers import parse_formats
+    formats = parse_formats(args.formats) + (["pandas_xlsx"] if args.pandas else [])
+    print(f"{args.rows} 行 × {args.rois + 2} 列", flush=True)
+    print(f"{'格式':<12}{'耗时(s)':>10}{'行/秒':>12}{'峰值内存(MB)':>15}{'增量(MB)':>11}{'文件(MB)':>11}", flush=True)
+    with tempfile.TemporaryDirectory(prefix="bench_export_") as tmp_dir:
+        for fmt in formats:
+            res, err = _run(fmt, tmp_dir, args.rows, args.rois)
+            if res is None:
+                print(f"{fmt:<12}  跳过（{err}）", flush=True)
+                continue
+            rate = args.rows / res["seconds"] if res["seconds"] > 0 else float("inf")
+            print(f"{fmt:<12}{res['seconds']:>10.2f}{rate:>12.0f}{res['peak_mb']:>15.1f}{res['delta_mb']:>11.1f}"
+                  f"{res['size_mb']:>11.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""导入耗时基准：用 python -X importtime 测量各入口模块的冷导入耗时，超出预算或提前导入了重依赖时退出码为 1。
+
+用法：
+    python benchmarks/bench_import.py [--rounds 5] [--scale 1.0] [--top 8]
+
+每个入口取多轮中最快的一次（累计耗时，不含解释器自身启动）；机器较慢时用 --scale 按比例放宽预算。
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 入口模块 → (预算毫秒, 导入阶段不应加载的模块)
+TARGETS = {
+    "mass_ocr_to_excel_rapidocr": (350, ("pandas", "tqdm", "cv2", "rapidocr_onnxruntime", "onnxruntime", "openpyxl")),
+    "roi_configurator": (350, ("cv2", "PIL", "tkinter", "pandas", "rapidocr_onnxruntime")),
+    "ocr_server": (150, ("numpy", "PIL", "pandas", "rapidocr_onnxruntime")),
+    "run_pipeline": (100, ("numpy", "cv2", "PIL", "pandas", "rapidocr_onnxruntime")),
+}
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+
+def measure(module: str):
+    """返回 (目标模块累计微秒, {模块: 累计微秒}, 目标的直接依赖 [(累计微秒, 模块)])"""
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); import {module}"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, encoding="utf-8")
+    if proc.returncode != 0:
+        raise SystemExit(f"导入 {module} 失败：\n{proc.stderr[-2000:]}")
+    loaded, total, children = {}, None, []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        cumulative, depth, name = int(m.group(2)), len(m.group(3)) - 1, m.group(4)
+        loaded.setdefault(name, cumulative)
+        if name == module and depth == 0:
+            total = cumulative
+        elif depth == 2:
+            # 子模块先于父模块输出，这里的缩进 2 即目标（或同级其他模块）的直接依赖
+            children.append((cumulative, name))
+        elif depth == 0 and name != module:
+            children = []
+    return total or 0, loaded, children
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="入口模块冷导入耗时预算检查")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="预算倍数（慢机器可放宽）")
+    parser.add_argument("--top", type=int, default=8, help="列出最重的直接依赖个数")
+    parser.add_argument("--only", nargs="*", default=None, help="只测这些入口")
+    args = parser.parse_args(argv)
+
+    failed = []
+    for module, (budget_ms, forbidden) in TARGETS.items():
+        if args.only and module not in args.only:
+            continue
+        best = None
+        for _ in range(max(1, args.rounds)):
+            run = measure(module)
+            if best is None or run[0] < best[0]:
+                best = run
+        total_us, loaded, children = best
+        budget = budget_ms * args.scale
+        eager = [m for m in forbidden if m in loaded]
+        ok = total_us / 1000.0 <= budget and not eager
+        print(f"{'✅' if ok else '❌'} {module}: {total_us / 1000.0:.1f} ms（预算 {budget:.0f} ms）")
+        for us, name in sorted(children, reverse=True)[:args.top]:
+            print(f"    {us / 1000.0:7.1f} ms  {name}")
+        if eager:
+            print(f"    提前导入了：{', '.join(eager)}")
+        if not ok:
+            failed.append(module)
+    if failed:
+        print(f"❌ 启动耗时回退：{', '.join(failed)}")
+        sys.exit(1)
+    print("✅ 所有入口均在预算内")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""流水线基准：按 roi_config.json 的模板尺寸合成 N 张表单（中文姓名、日期、编号），
+分别用真实 RapidOCR 与确定性的假引擎跑 ocr_image() 或 main()，报告吞吐与延迟。
+
+假引擎不做任何推理、耗时固定（--fake-ms），用于把流水线本身的开销（解码、裁剪、预处理、
+清洗、写出）与模型耗时分开；两者对比即可看出回归来自哪一侧。
+
+用法：
+    python benchmarks/bench_pipeline.py [--images 50] [--engine fake|real|both] [--mode image|main]
+                                        [--fake-ms 0] [--font 字体文件] [--json 结果.json] [--min-ips 0]
+                                        [--repeat 0.3]
+
+报告：images/sec、每张图片与每个 ROI 的 p50/p90/p99 延迟（毫秒）、进程峰值内存（RSS）；
+真实引擎额外报告各列与合成真值的一致率。吞吐低于 --min-ips 时以非零状态退出。
+--repeat 让日期、编号列按该比例取自少量固定值（模拟同一批表单的相同签发日期、网点编号），
+用于观察切图记忆的命中率。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+import zlib
+
+from PIL import Image, ImageDraw, ImageFont
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mass_ocr_to_excel_rapidocr as ocr  # noqa: E402
+
+# 常见系统的中文字体；都找不到时姓名改用拼音绘制（仍可测流水线开销，一致率仅供参考）
+CJK_FONTS = [
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "C:/Windows/Fonts/simsun.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Medium.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+]
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾丛"
+GIVEN = "伟芳娜秀敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英代凤华建国志红"
+PINYIN = ["Wang Wei", "Li Na", "Zhang Min", "Liu Yang", "Chen Jie", "Cong Daifeng"]
+
+
+def _find_font(path=None):
+    for p in ([path] if path else []) + CJK_FONTS:
+        if p and os.path.exists(p):
+            return p
+    return None
+
+
+def _load_font(font_path, size):
+    if font_path:
+        try:
+            return ImageFont.truetype(font_path, size)
+        except Exception:
+            pass
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def _field_value(name: str, rng: random.Random, cjk: bool) -> str:
+    col = name.lower()
+    if any(k in col for k in ocr.NAME_KEYWORDS):
+        if not cjk:
+            return rng.choice(PINYIN)
+        return rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(rng.randint(1, 2)))
+    if "date" in col or "日期" in col:
+        return f"{rng.randint(2015, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    if any(k in col for k in ocr.NUMBER_KEYWORDS) or "code" in col:
+        return "RRFP" + "".join(str(rng.randint(0, 9)) for _ in range(14))
+    return "".join(str(rng.randint(0, 9)) for _ in range(8))
+
+
+def _fit_font(draw, text, font_path, box_w, box_h):
+    size = max(8, int(box_h * 0.8))
+    while size > 8:
+        font = _load_font(font_path, size)
+        l, t, r, b = draw.textbbox((0, 0), text, font=font)
+        if r - l <= box_w * 0.95 and b - t <= box_h * 0.95:
+            return font, (l, t, r, b)
+        size -= 1
+    font = _load_font(font_path, size)
+    return font, draw.textbbox((0, 0), text, font=font)
+
+
+def _repeatable(name: str) -> bool:
+    col = name.lower()
+    return "date" in col or "日期" in col or "code" in col or any(k in col for k in ocr.NUMBER_KEYWORDS)
+
+
+def render_forms(out_dir: str, count: int, size, rois, font_path=None, seed=0, repeat=0.0):
+    """合成表单图片，返回 [(路径, {列名: 真值})]"""
+    rng = random.Random(seed)
+    w, h = size
+    forms = []
+    pools = {}
+    if repeat > 0:
+        pools = {r["name"]: [_field_value(r["name"], rng, font_path is not None) for _ in range(3)]
+                 for r in rois if _repeatable(r["name"])}
+    for i in range(count):
+        im = Image.new("RGB", size, (250, 250, 247))
+        draw = ImageDraw.Draw(im)
+        # 表格线与标题等干扰元素（位于 ROI 外）
+        for k in range(1, 12):
+            y = int(h * k / 12)
+            draw.line([(int(w * 0.05), y), (int(w * 0.95), y)], fill=(180, 180, 180), width=2)
+        draw.rectangle([int(w * 0.05), int(h * 0.03), int(w * 0.95), int(h * 0.97)], outline=(120, 120, 120), width=3)
+        draw.text((int(w * 0.3), int(h * 0.05)), "FORM-%04d" % i, fill=(60, 60, 60), font=_load_font(font_path, max(12, h // 40)))
+        truth = {}
+        for roi in rois:
+            x1, y1, x2, y2 = ocr.roi_pixel_box(size, roi)
+            if roi["w"] <= 0 or roi["h"] <= 0:
+                truth[roi["name"]] = ""
+                continue
+            if roi["name"] in pools and rng.random() < repeat:
+                text, ink = rng.choice(pools[roi["name"]]), 20
+            else:
+                text, ink = _field_value(roi["name"], rng, font_path is not None), rng.randint(0, 40)
+            font, (l, t, r, b) = _fit_font(draw, text, font_path, x2 - x1, y2 - y1)
+            tx = x1 + max(0, ((x2 - x1) - (r - l)) // 2) - l
+            ty = y1 + max(0, ((y2 - y1) - (b - t)) // 2) - t
+            draw.text((tx, ty), text, fill=(ink,) * 3, font=font)
+            truth[roi["name"]] = ocr.clean_for_column(roi["name"], text)
+        path = os.path.join(out_dir, f"form_{i:05d}.jpg")
+        im.save(path, quality=88)
+        forms.append((path, truth))
+    return forms
+
+
+class FakeEngine:
+    """确定性的假识别引擎：接口与 RapidOCR 的调用方式一致，按切图内容返回固定文本"""
+
+    def __init__(self, delay_ms: float = 0.0):
+        self.delay = delay_ms / 1000.0
+        self.calls = 0
+
+    def __call__(self, img, *args, **kwargs):
+        self.calls += 1
+        if self.delay:
+            end = time.perf_counter() + self.delay
+            while time.perf_counter() < end:
+                pass
+        digest = zlib.crc32(img[::8, ::8].tobytes()) if hasattr(img, "tobytes") else 0
+        return [[f"FAKE{digest:08X}", 0.99]], [0.0]
+
+
+def _percentiles(values, ps=(50, 90, 99)):
+    if not values:
+        return {f"p{p}": None for p in ps}
+    s = sorted(values)
+    out = {}
+    for p in ps:
+        k = min(len(s) - 1, max(0, int(round(p / 100.0 * (len(s) - 1)))))
+        out[f"p{p}"] = s[k] * 1000.0
+    return out
+
+
+def peak_rss_mb():
+    """当前进程峰值常驻内存（MB）；不支持的平台返回 None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024.0
+    except Exception:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1 << 20)
+    except Exception:
+        return None
+
+
+def _instrument(mode: str):
+    """包装 ocr_image / read_text，按图片和按列记录耗时。
+
+    main 模式下单进程默认启用读取线程预取，图片不经过 ocr_image()，
+    此时按识别线程上的 recognize_prepared() 计时（不含已提前完成的解码与预处理）。
+    """
+    per_image, per_roi = [], {}
+    image_fn = "ocr_image" if mode == "image" else "recognize_prepared"
+    orig_image, orig_read = getattr(ocr, image_fn), ocr.read_text
+
+    def timed_image(*a, **kw):
+        t0 = time.perf_counter()
+        try:
+            return orig_image(*a, **kw)
+        finally:
+            per_image.append(time.perf_counter() - t0)
+
+    def timed_read(img, column=None, **kw):
+        t0 = time.perf_counter()
+        try:
+            return orig_read(img, column=column, **kw)
+        finally:
+            per_roi.setdefault(column or "", []).append(time.perf_counter() - t0)
+
+    setattr(ocr, image_fn, timed_image)
+    ocr.read_text = timed_read
+    return per_image, per_roi
+
+
+def run_bench(engine: str, mode: str, images: int, fake_ms: float, font=None, workers: int = 1, seed: int = 0,
+              repeat: float = 0.0) -> dict:
+    roi_path = os.path.join(ROOT, ocr.ROI_CONFIG_PATH)
+    with open(roi_path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    ts = cfg.get("template_size") or {}
+    size = (int(ts.get("width", 1064)), int(ts.get("height", 1890)))
+    rois, roi_names = ocr.load_roi_config(roi_path)
+    font_path = _find_font(font)
+    if font_path is None:
+        print("[WARN] 未找到中文字体（可用 --font 指定），姓名列改用拼音绘制。", flush=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        img_dir = os.path.join(tmp, "images")
+        os.makedirs(img_dir)
+        t0 = time.perf_counter()
+        forms = render_forms(img_dir, images, size, rois, font_path, seed, repeat)
+        print(f"🖼️ 已合成 {images} 张 {size[0]}x{size[1]} 表单，耗时 {time.perf_counter() - t0:.1f}s", flush=True)
+
+        t0 = time.perf_counter()
+        if engine == "fake":
+            fake = FakeEngine(fake_ms)
+            ocr.ocr_engine = ocr.det_engine = fake
+            ocr._engine_use_det = False
+            workers = 1
+        else:
+            ocr.init_ocr(ocr.USE_DET)
+        init_s = time.perf_counter() - t0
+
+        per_image, per_roi = _instrument(mode)
+        t0 = time.perf_counter()
+        if mode == "main":
+            ocr.IMAGE_DIR, ocr.OUTPUT_DIR, ocr.ROI_CONFIG_PATH = img_dir, os.path.join(tmp, "output"), roi_path
+            ocr.main(["--no-cache", "--workers", str(workers)])
+            import pandas as pd
+            df = pd.read_csv(os.path.join(ocr.OUTPUT_DIR, ocr.OUTPUT_CSV), dtype=str, keep_default_na=False)
+            rows = df.to_dict("records")
+        else:
+            plan = ocr.compile_roi_plan(rois)
+            rows = [ocr.ocr_image(p, plan, roi_names) for p, _ in forms]
+        wall = time.perf_counter() - t0
+
+    truth = {os.path.basename(p): t for p, t in forms}
+    accuracy = {}
+    if engine == "real":
+        for name in roi_names:
+            hit = sum(1 for r in rows if str(r.get(name, "")) == truth.get(r["filename"], {}).get(name, ""))
+            accuracy[name] = hit / max(1, len(rows))
+    memo = {}
+    if ocr.crop_memo is not None:
+        for name, (h, m) in ocr.crop_memo.stats["by_column"].items():
+            memo[name] = h / max(1, h + m)
+    return {
+        "engine": engine,
+        "mode": mode,
+        "images": images,
+        "init_seconds": init_s,
+        "wall_seconds": wall,
+        "images_per_sec": images / wall if wall > 0 else None,
+        "per_image_ms": _percentiles(per_image),
+        "per_roi_ms": {k: _percentiles(v) for k, v in per_roi.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "accuracy": accuracy,
+        "memo_hit_rate": memo,
+    }
+
+
+def _print_report(res: dict):
+    def fmt(v):
+        return "    n/a" if v is None else f"{v:7.2f}"
+
+    print(f"\n[{res['engine']} / {res['mode']}] {res['images']} 张")
+    print(f"  吞吐          {res['images_per_sec'] or 0:8.2f} 张/秒（总耗时 {res['wall_seconds']:.2f}s，初始化 {res['init_seconds']:.2f}s）")
+    pi = res["per_image_ms"]
+    if pi.get("p50") is not None:
+        print(f"  每张图片      p50 {fmt(pi['p50'])}  p90 {fmt(pi['p90'])}  p99 {fmt(pi['p99'])} ms")
+    for name, p in res["per_roi_ms"].items():
+        print(f"  ROI {name:<10} p50 {fmt(p['p50'])}  p90 {fmt(p['p90'])}  p99 {fmt(p['p99'])} ms")
+    rss = res["peak_rss_mb"]
+    print(f"  峰值内存      {'n/a' if rss is None else f'{rss:.0f} MB'}")
+    for name, acc in res["accuracy"].items():
+        print(f"  一致率 {name:<8} {acc * 100:6.1f}%")
+    for name, rate in res.get("memo_hit_rate", {}).items():
+        print(f"  切图记忆 {name:<6} {rate * 100:6.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成表单流水线基准（真实引擎 / 假引擎）")
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--engine", choices=["fake", "real", "both"], default="both")
+    parser.add_argument("--mode", choices=["image", "main"], default="image",
+                        help="image：直接调用 ocr_image()；main：走完整 main()（含写出）")
+    parser.add_argument("--fake-ms", type=float, default=0.0, help="假引擎每次调用的模拟耗时（毫秒）")
+    parser.add_argument("--workers", type=int, default=1, help="main 模式下真实引擎的进程数")
+    parser.add_argument("--font", default=None, help="中文字体文件路径")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=float, default=0.0, help="日期、编号列取自少量固定值的比例（0~1）")
+    parser.add_argument("--json", default=None, help="把结果写入 JSON 文件")
+    parser.add_argument("--min-ips", type=float, default=0.0, help="吞吐下限（张/秒），低于时以非零状态退出")
+    args = parser.parse_args(argv)
+
+    if args.engine == "both":
+        # 每种引擎在独立进程中运行，峰值内存互不干扰
+        results = []
+        for engine in ("fake", "real"):
+            with tempfile.TemporaryDirectory() as tmp:
+                out = os.path.join(tmp, "res.json")
+                cmd = [sys.executable, os.path.abspath(__file__), "--engine", engine, "--json", out]
+                for k in ("images", "mode", "fake_ms", "workers", "font", "seed", "repeat"):
+                    v = getattr(args, k)
+                    if v is not None:
+                        cmd += ["--" + k.replace("_", "-"), str(v)]
+                proc = subprocess.run(cmd)
+                if proc.returncode != 0 or not os.path.exists(out):
+                    print(f"[WARN] {engine} 基准运行失败（退出码 {proc.returncode}）", flush=True)
+                    continue
+                with open(out, "r", encoding="utf-8") as f:
+                    results.append(json.load(f))
+    else:
+        results = [run_bench(args.engine, args.mode, args.images, args.fake_ms, args.font, args.workers, args.seed,
+                             args.repeat)]
+        for res in results:
+            _print_report(res)
+
+    if args.engine == "both" and len(results) == 2:
+        fake, real = results
+        if fake["images_per_sec"] and real["images_per_sec"]:
+            overhead = 1.0 / fake["images_per_sec"]
+            total = 1.0 / real["images_per_sec"]
+            print(f"\n📊 流水线开销约 {overhead * 1000:.1f} ms/张，占真实引擎总耗时 {overhead / total * 100:.1f}%")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results if len(results) != 1 else results[0], f, ensure_ascii=False, indent=2)
+
+    slow = [r for r in results if args.min_ips and (r["images_per_sec"] or 0) < args.min_ips]
+    if slow:
+        for r in slow:
+            print(f"❌ {r['engine']} 吞吐 {r['images_per_sec'] or 0:.2f} 张/秒 低于下限 {args.min_ips}", flush=True)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
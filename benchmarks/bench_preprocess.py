@@ -0,0 +1,85 @@
+"""预处理基准与一致性校验：对比 PIL 链路（crop → resize → enhance_for_ocr → _to_numpy_rgb）
+与数组实现（enhance_crop_array）的输出差异和耗时。
+
+用法：
+    python benchmarks/bench_preprocess.py [--repeat 50] [--tolerance 0]
+
+输出差异超过 --tolerance（像素灰度级）时以非零状态退出。
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mass_ocr_to_excel_rapidocr as ocr  # noqa: E402
+
+
+def _crops(images, rois):
+    for path in images:
+        im = Image.open(path)
+        im.load()
+        for roi in rois:
+            crop = ocr.crop_by_roi(im, roi)
+            cw, ch = crop.size
+            if ch < ocr.SMALL_ROI_MIN_HEIGHT or cw < ocr.SMALL_ROI_MIN_WIDTH:
+                crop = crop.resize((cw * ocr.SMALL_ROI_UPSCALE, ch * ocr.SMALL_ROI_UPSCALE), Image.LANCZOS)
+            yield f"{os.path.basename(path)}:{roi['name']}", crop
+    # 额外覆盖：纯色、低对比度、灰度/调色板模式等边界情况
+    rng = np.random.default_rng(0)
+    yield "flat", Image.new("RGB", (120, 40), (200, 200, 200))
+    yield "low_contrast", Image.fromarray(rng.integers(100, 110, (48, 320, 3), dtype=np.uint8))
+    yield "noise", Image.fromarray(rng.integers(0, 256, (64, 500, 3), dtype=np.uint8))
+    yield "gray_L", Image.fromarray(rng.integers(30, 220, (40, 200), dtype=np.uint8))
+    yield "palette_P", Image.fromarray(rng.integers(0, 256, (40, 200, 3), dtype=np.uint8)).convert("P")
+
+
+def _pil(crop):
+    return ocr._to_numpy_rgb(ocr.enhance_for_ocr(crop))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="预处理实现一致性与耗时")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--tolerance", type=int, default=0, help="允许的最大像素差")
+    parser.add_argument("--roi-config", default=os.path.join(ROOT, ocr.ROI_CONFIG_PATH))
+    args = parser.parse_args(argv)
+    rois, _ = ocr.load_roi_config(args.roi_config)
+    img_dir = os.path.join(ROOT, ocr.IMAGE_DIR)
+    images = [os.path.join(img_dir, f) for f in sorted(os.listdir(img_dir))
+              if f.lower().endswith((".png", ".jpg", ".jpeg"))]
+    crops = list(_crops(images, rois))
+
+    worst = 0
+    for name, crop in crops:
+        a, b = _pil(crop), ocr.enhance_crop_array(crop)
+        if a.shape != b.shape:
+            print(f"  ✗ {name}: 形状不一致 {a.shape} vs {b.shape}")
+            worst = max(worst, 256)
+            continue
+        diff = int(np.abs(a.astype(np.int16) - b.astype(np.int16)).max()) if a.size else 0
+        worst = max(worst, diff)
+        print(f"  {'✓' if diff <= args.tolerance else '✗'} {name:<40} {str(a.shape):<16} 最大差 {diff}")
+
+    for label, fn in (("PIL 链路", _pil), ("数组实现", ocr.enhance_crop_array)):
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            for _, crop in crops:
+                fn(crop)
+        dt = (time.perf_counter() - t0) / (args.repeat * len(crops)) * 1000
+        print(f"  {label:<10} {dt:7.3f} ms/切图")
+
+    if worst > args.tolerance:
+        print(f"❌ 最大像素差 {worst} 超过容差 {args.tolerance}")
+        return 1
+    print(f"✅ 输出一致（最大像素差 {worst}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""常驻服务基准：对比小任务（默认 10 张）每次冷启动 main() 与请求常驻服务的耗时，并校验两者结果一致。
+
+用法：
+    python benchmarks/bench_server.py [--images 10] [--rounds 3] [--unix]
+
+服务只监听本机随机端口（或临时 Unix 套接字），结束后自动停止。
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ocr_server  # noqa: E402  （只依赖标准库）
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+
+
+def _inputs(tmp: str, count: int):
+    src_dir = os.path.join(ROOT, "images")
+    srcs = [os.path.join(src_dir, f) for f in sorted(os.listdir(src_dir)) if f.lower().endswith(IMAGE_EXTS)]
+    if not srcs:
+        raise SystemExit("images/ 中没有样例图片")
+    img_dir = os.path.join(tmp, "images")
+    os.makedirs(img_dir)
+    paths = []
+    for i in range(count):
+        p = os.path.join(img_dir, f"job_{i:03d}{os.path.splitext(srcs[i % len(srcs)])[1]}")
+        shutil.copyfile(srcs[i % len(srcs)], p)
+        paths.append(p)
+    return img_dir, paths
+
+
+def _cold_run(img_dir: str, out_dir: str) -> float:
+    code = (
+        "import sys; sys.path.insert(0, %r)\n"
+        "import mass_ocr_to_excel_rapidocr as m\n"
+        "m.IMAGE_DIR, m.OUTPUT_DIR = %r, %r\n"
+        "m.main(['--no-cache'])\n"
+    ) % (ROOT, img_dir, out_dir)
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+
+def _start_server(unix_path: str = ""):
+    cmd = [sys.executable, os.path.join(ROOT, "ocr_server.py"), "serve"]
+    cmd += ["--unix", unix_path] if unix_path else ["--port", "0"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8")
+    url = ""
+    for line in proc.stdout:
+        if "识别服务已启动" in line:
+            m = re.search(r"http://[\d.]+:\d+", line)
+            url = m.group(0) if m else ""
+            break
+    else:
+        raise SystemExit("识别服务启动失败")
+    return proc, url, time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="冷启动 main() vs 常驻识别服务")
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--unix", action="store_true", help="通过临时 Unix 套接字连接")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        img_dir, paths = _inputs(tmp, args.images)
+        out_dir = os.path.join(tmp, "output")
+        cold = [_cold_run(img_dir, out_dir) for _ in range(args.rounds)]
+        print(f"冷启动 main()：{min(cold):.2f}s / {args.images} 张（取 {args.rounds} 轮最快）")
+
+        unix_path = os.path.join(tmp, "ocr.sock") if args.unix else ""
+        proc, url, startup = _start_server(unix_path)
+        try:
+            warm, rows = [], []
+            for _ in range(args.rounds):
+                t0 = time.perf_counter()
+                rows = ocr_server.ocr_paths(paths, url=url, unix=unix_path)
+                warm.append(time.perf_counter() - t0)
+            print(f"服务启动（一次性）：{startup:.2f}s")
+            print(f"常驻服务请求：  {min(warm):.2f}s / {args.images} 张，加速 {min(cold) / max(min(warm), 1e-9):.1f}x")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+        import csv
+        with open(os.path.join(out_dir, "ocr_result.csv"), "r", encoding="utf-8") as f:
+            expected = {r["filename"]: r for r in csv.DictReader(f)}
+        diff = [r["filename"] for r in rows
+                if any(str(v) != expected.get(r["filename"], {}).get(k, "") for k, v in r.items())]
+        if diff:
+            print(f"❌ 服务结果与 main() 不一致：{', '.join(diff[:5])}")
+            sys.exit(1)
+        print("✅ 服务结果与 main() 一致")
+
+
+if __name__ == "__main__":
+    main()
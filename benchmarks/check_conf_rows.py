@@ -0,0 +1,70 @@
+"""置信度列一致性校验：关闭 / 开启 CONF_COLUMNS 时，逐张识别、合并批识别与切图记忆命中产出的行应有相同的列。
+
+用法：
+    python benchmarks/check_conf_rows.py [--images 3]
+
+关闭时行中不应出现任何 <列名>_conf；开启时每个 ROI（含被跳过的退化框）都应有得分列。
+任一路径的列与预期不符时以非零状态退出。
+"""
+import os
+import sys
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mass_ocr_to_excel_rapidocr as ocr  # noqa: E402
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+
+
+def _keys(row):
+    # 只比较识别列与得分列；filename、模板名等元数据列不在校验范围内
+    return [k for k in row if k != "filename" and not k.startswith("_")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="置信度列一致性校验")
+    parser.add_argument("--images", type=int, default=3)
+    parser.add_argument("--roi-config", default=os.path.join(ROOT, ocr.ROI_CONFIG_PATH))
+    args = parser.parse_args(argv)
+    rois, _ = ocr.load_roi_config(args.roi_config)
+    roi_names = [r["name"] for r in rois]
+    img_dir = os.path.join(ROOT, ocr.IMAGE_DIR)
+    images = [os.path.join(img_dir, f) for f in sorted(os.listdir(img_dir))
+              if f.lower().endswith(IMAGE_EXTS)][:max(1, args.images)]
+    if not images:
+        raise SystemExit(f"{img_dir} 中没有样例图片")
+    ocr.init_ocr()
+
+    failed = False
+    for conf in (False, True):
+        ocr.CONF_COLUMNS = conf
+        ocr.crop_memo = None  # 每轮重新建立切图记忆：第一遍为新识别，第二遍全部命中
+        plan = ocr.compile_roi_plan(rois)
+        expected = ocr.with_conf(roi_names)
+        runs = (
+            ("逐张", [ocr.ocr_image(p, plan, roi_names) for p in images]),
+            ("合并批", ocr.ocr_images_batched(images, plan, roi_names)),
+            ("记忆命中/逐张", [ocr.ocr_image(p, plan, roi_names) for p in images]),
+            ("记忆命中/合并批", ocr.ocr_images_batched(images, plan, roi_names)),
+        )
+        for label, rows in runs:
+            for row in rows:
+                keys = _keys(row)
+                ok = keys == expected
+                failed |= not ok
+                extra = sorted(set(keys) - set(expected))
+                missing = sorted(set(expected) - set(keys))
+                detail = "" if ok else f"  多出 {extra} 缺少 {missing}"
+                print(f"  {'✓' if ok else '✗'} conf={'开' if conf else '关'} {label:<12} {row['filename']}{detail}")
+
+    if failed:
+        print("❌ 行的列与 CONF_COLUMNS 设置不一致")
+        return 1
+    print("✅ 各识别路径的列一致")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,20 +2,47 @@ import os
 import sys
 import json
 import re
+import time
+import argparse
 import warnings
-from typing import List
+import functools
+import threading
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 import numpy as np
 from PIL import Image, ImageOps
-import pandas as pd
-from tqdm import tqdm
+
+from ocr_profile import PROFILER
+from ocr_pages import PageRef, load_page, page_digest, source_name
 
 # 过滤不关键的性能类警告
 warnings.filterwarnings("ignore", message=r".*'pin_memory'.*")
 
-try:
-    from rapidocr_onnxruntime import RapidOCR
-except Exception as e:
-    raise RuntimeError("未安装 rapidocr-onnxruntime，请先安装：pip install rapidocr-onnxruntime")
+# 较重的依赖按阶段延迟导入，缩短启动时间（打包为 exe 后尤其明显）：
+# RapidOCR/ONNXRuntime 在初始化引擎时、OpenCV 在首次预处理切图时、tqdm 在开始识别时、
+# 导出不经过 pandas：各格式都逐行写出（ocr_writers），openpyxl / pyarrow 只在选用对应格式时导入。
+# 导入耗时基准：python benchmarks/bench_import.py
+
+
+@functools.lru_cache(maxsize=None)
+def _cv2():
+    """OpenCV 可选：未安装时返回 None，预处理走纯 numpy 路径"""
+    try:
+        import cv2
+        return cv2
+    except Exception:
+        return None
+
+
+def _rapidocr_class():
+    try:
+        from rapidocr_onnxruntime import RapidOCR
+    except Exception:
+        raise RuntimeError("未安装 rapidocr-onnxruntime，请先安装：pip install rapidocr-onnxruntime")
+    return RapidOCR
 
 # ========== 配置区域 ==========
 IMAGE_DIR = "images"                 # 图片文件夹
@@ -23,6 +50,7 @@ ROI_CONFIG_PATH = "roi_config.json"   # ROI 配置文件
 OUTPUT_DIR = "output"
 OUTPUT_CSV = "ocr_result.csv"
 OUTPUT_XLSX = "ocr_result.xlsx"
+OUTPUT_FORMATS = "csv,xlsx"           # 导出格式（逗号分隔）：csv / xlsx / jsonl / parquet / feather（后两者需要 pyarrow）
 STRICT_ROI = True                     # 严格使用 ROI，不扩边
 SMALL_ROI_MIN_HEIGHT = 40             # ROI高度小于该值时先放大
 SMALL_ROI_MIN_WIDTH = 80              # ROI宽度小于该值时先放大
@@ -30,6 +58,62 @@ SMALL_ROI_UPSCALE = 3                 # 小ROI放大倍数
 SAVE_DEBUG_CROPS = False              # 是否保存调试切图（默认关闭）
 DEBUG_DIR = "debug_crops_rapid"        # 调试切图目录
 USE_DET = False                       # 是否启用检测模型（严格ROI下建议关闭以提速）
+REGION_DECODE = True                  # 只解码 ROI 覆盖的区域（JPEG/PNG 只解码到 ROI 最下沿，分块 TIFF 只解码相交块）
+PREPROCESS = "numpy"                  # 切图预处理实现：numpy（查表+OpenCV，少拷贝）/ pil（逐步 PIL 链路），输出一致
+DECODE_GRAY = False                   # JPEG 直接按灰度解码（更快，但与 RGB→灰度 结果有 ±1~2 级差异）
+DET_FALLBACK = "never"                # 识别为空时的检测回退：never / always / 逗号分隔的列名（空白格也会整格检测一遍，按需开启）
+DET_FALLBACK_WARN_RATE = 0.5          # 某列回退比例超过该值时提示模板可能未对齐
+CONF_COLUMNS = False                  # 输出置信度列 <列名>_conf（识别得分 0~1，多个文本框时取最低分）
+RECHECK_THRESHOLD = 0.0               # 低置信度二次识别：得分低于该值的非空结果换用更强的设置再识别一次（0 关闭，建议 0.8~0.9）
+RECHECK_COLUMNS = "always"            # 参与二次识别的列：always / never / 逗号分隔的列名
+RECHECK_UPSCALE = 2.0                 # 二次识别时切图再放大的倍数
+RECHECK_PAD = 0.2                     # 二次识别时四周补白的宽度（相对切图高度），紧贴文字的 ROI 补白后更易识别
+RECHECK_DET = True                    # 二次识别使用检测+识别引擎（先定位文本行再识别）；False 仍用纯识别
+ALIGN = False                         # 模板对齐：按 template_image 估计每张图片的平移/缩放，ROI 随之移动后再裁剪
+ALIGN_WIDTH = 256                     # 对齐时图片与模板缩放到的宽度（像素；越大越准、越慢）
+ALIGN_SCALES = (0.97, 1.0, 1.03)      # 对齐时搜索的缩放比例
+ALIGN_MIN_QUALITY = 0.05              # 相关峰值低于该值视为对齐失败，按原 ROI 裁剪
+ALIGN_MAX_SHIFT = 0.1                 # 偏移超过图片宽/高的该比例视为误配，按原 ROI 裁剪
+ALIGN_REPORT = "align_report.csv"     # 每张图片的对齐结果与耗时（位于输出目录）
+BATCH_SIZE = 0                        # 跨图片批量识别：每次送入识别模型的切图数（0 关闭，建议 64~256）
+REC_BUCKET_RATIO = 1.5                # 同一批内宽高比最大/最小之比，超过则另起一桶
+CROP_MEMO = "always"                  # 切图记忆：预处理后像素相同的切图直接复用识别结果（always / never / 逗号分隔的列名）
+CROP_MEMO_SIZE = 4096                 # 切图记忆容量（条，超出按最近最少使用淘汰）
+CROP_MEMO_DB = ""                     # 切图记忆持久化文件（位于输出目录，如 ocr_crops.sqlite；空为只在内存中）
+USE_CACHE = True                      # 是否启用识别结果缓存（重跑时只识别新增/变化的图片）
+CACHE_DB = "ocr_cache.sqlite"         # 缓存数据库（位于输出目录）
+STREAM_OUTPUT = False                 # 流式输出：每张识别完即追加写入 CSV/XLSX（内存占用恒定）
+STREAM_FLUSH_EVERY = 100              # 流式输出时每写多少行刷新一次 CSV
+RECURSIVE = True                      # 递归扫描图片目录下的子目录（边扫描边识别，无需先列出全部文件）
+INCLUDE_GLOBS = []                    # 只处理匹配的文件，如 ["*.jpg", "2024-*/*"]（不含 / 时匹配文件名）
+EXCLUDE_GLOBS = []                    # 跳过匹配的文件或目录，如 ["tmp", "*/废弃/*"]
+FILE_LIST = ""                        # 文件清单（.txt/.csv/.jsonl），设置后按清单处理而不扫描目录
+PDF_DPI = 200                         # PDF 按页渲染的分辨率（需要 pypdfium2；未安装时用 pypdf 取扫描件页面内嵌的图片）
+RELPATH_COLUMN = "relative_path"      # 输出中相对图片目录的路径列
+TEMPLATE_COLUMN = "template"          # 多模板配置：输出中记录每张图片所用模板的列
+LAYOUT_MIN_SCORE = 0.5                # 多模板：与参考缩略图的相关系数低于该值视为不属于任何模板
+LAYOUT_ASPECT_TOL = 0.05              # 多模板：宽高比与模板相差超过约该比例时不参与缩略图比较
+LAYOUT_SHEETS = True                  # 多模板：XLSX 按模板分工作表（CSV 始终为各模板列的并集）
+WATCH_SETTLE_SECONDS = 2.0            # 监控模式：文件大小/修改时间稳定这么久才视为写入完成
+WATCH_DEBOUNCE_SECONDS = 1.0          # 监控模式：最后一个文件到达后再等这么久，把一阵到达的文件合并成一批
+WATCH_BATCH = 64                      # 监控模式：每批最多识别的图片数
+WATCH_POLL_SECONDS = 2.0              # 监控模式：轮询间隔（无 inotify 时，如 Windows、网络共享）
+WATCH_XLSX = True                     # 监控模式：停止时由 CSV 重新生成 XLSX（逐行写出，不逐批整体读写）
+WATCH_STATE_DB = "ocr_watch.sqlite"   # 监控模式：已处理文件登记（位于输出目录）
+ENGINE_THREADS = "auto"               # ONNXRuntime 每个会话的线程数：auto（按 CPU 核数与进程数分配）/ 整数 / -1（由 ONNXRuntime 决定）
+ENGINE_INTER_THREADS = "auto"         # 会话间并行线程数（仅 parallel 执行模式有效）：auto / 整数
+ENGINE_GRAPH_OPT = "all"              # 图优化级别：all / extended / basic / disable
+ENGINE_MEM_ARENA = False              # CPU 内存池（减少反复分配，常驻内存更高）
+ENGINE_EXEC_MODE = "sequential"       # 执行模式：sequential / parallel
+TUNE_IMAGES = 8                       # --tune 校准使用的样例图片数（roi_config.json 的 engine 段会覆盖以上 ENGINE_*）
+WORKERS = 1                           # 并行识别进程数（1 为单进程；0 表示按 CPU 核数自动）
+PREFETCH_THREADS = 2                  # 单进程时提前读取/解码/预处理后续图片的线程数（0 关闭，与识别串行）
+PREFETCH_DEPTH = 8                    # 最多提前准备多少张图片（限制内存占用）
+POOL_CHUNK = 4                        # 多进程时输入为惰性迭代器（长度未知）每次分发给子进程的图片数
+WRITE_QUEUE_DEPTH = 64                # 流式输出时后台写出队列长度（0 表示在识别线程中直接写出）
+PROFILE = False                       # 分阶段计时（解码/裁剪/放大/增强/识别/回退/导出），结束时写出报告
+PROFILE_JSON = "ocr_profile.json"     # 计时报告（位于输出目录）
+PROFILE_PROM = ""                     # 额外写出 Prometheus textfile（node_exporter 采集目录中的 .prom 路径，空为不写）
 # ============================
 
 # 兼容打包后运行（PyInstaller 一文件模式）：优先使用可执行文件所在目录
@@ -38,14 +122,38 @@ if getattr(sys, "frozen", False):
 else:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ocr_engine = None
+det_engine = None          # 检测回退引擎（按需创建，进程内复用）
+_engine_use_det = USE_DET
+_engine_options = {}
+crop_memo = None           # 切图记忆（首次使用时按 CROP_MEMO_* 创建，每个进程一份）
+_aligners = {}             # 模板对齐器（按模板与 ALIGN_* 参数缓存，每个进程一份）
+ENGINE_SETTINGS = {}       # roi_config.json 的 engine 段与命令行参数（覆盖 ENGINE_* 常量）
 
 
-def load_roi_config(path: str):
+def _new_fallback_stats() -> dict:
+    # recheck_* 为低置信度二次识别的统计：参与判断的格数、二次识别次数、得分提高次数、耗时
+    return {"images": 0, "calls": 0, "hits": 0, "seconds": 0.0, "by_column": {},
+            "recheck_cells": 0, "recheck_calls": 0, "recheck_improved": 0, "recheck_seconds": 0.0}
+
+
+fallback_stats = _new_fallback_stats()
+
+
+def _read_config(path: str) -> dict:
     if not os.path.exists(path):
         raise FileNotFoundError(f"未找到 ROI 配置文件: {path}")
     with open(path, "r", encoding="utf-8") as f:
-        cfg = json.load(f)
-    rois = cfg.get("rois", [])
+        return json.load(f)
+
+
+def load_roi_config(path: str):
+    cfg = _read_config(path)
+    if cfg.get("templates") and not cfg.get("rois"):
+        raise ValueError(f"{path} 为多模板配置，请使用 load_layouts()")
+    return _parse_rois(cfg.get("rois", []))
+
+
+def _parse_rois(rois: list):
     if not rois:
         raise ValueError("ROI 配置为空或格式错误")
     ordered_names = []
@@ -68,9 +176,44 @@ def load_roi_config(path: str):
     return filtered, ordered_names
 
 
-def crop_by_roi(pil_img: Image.Image, roi: dict):
-    """严格按归一化 ROI 裁剪，不扩边"""
-    w, h = pil_img.size
+def load_layouts(path: str, image_dir: Optional[str] = None) -> List[dict]:
+    """读取 ROI 配置中的全部模板，返回 [{name, rois, roi_names, size, template, thumbnail}]。
+
+    单模板格式（顶层 template_image / template_size / rois）视为只有一个模板；多模板格式为
+    {"templates": [{"name": ..., "template_image": ..., "template_size": {...}, "thumbnail": ..., "rois": [...]}, ...]}，
+    thumbnail 为版式分类用的参考图片（可省略，默认用 template_image）。图片按配置文件目录、图片目录查找。
+    """
+    from ocr_align import resolve_template
+
+    cfg = _read_config(path)
+    specs = cfg["templates"] if isinstance(cfg.get("templates"), list) and not cfg.get("rois") else [cfg]
+    layouts = []
+    for i, spec in enumerate(specs):
+        rois, roi_names = _parse_rois(spec.get("rois", []))
+        name = str(spec.get("name") or os.path.splitext(spec.get("template_image") or "")[0] or f"template_{i + 1}")
+        if any(l["name"] == name for l in layouts):
+            raise ValueError(f"模板名称重复：{name}")
+        ts = spec.get("template_size") or {}
+        template = resolve_template(spec, path, image_dir)
+        layouts.append({
+            "name": name,
+            "rois": rois,
+            "roi_names": roi_names,
+            "size": (int(ts["width"]), int(ts["height"])) if ts.get("width") and ts.get("height") else None,
+            "template": template,
+            "thumbnail": resolve_template(spec, path, image_dir, key="thumbnail") or template,
+        })
+    return layouts
+
+
+def layout_columns(layouts: List[dict]) -> List[str]:
+    """各模板 ROI 列名的并集（按首次出现的顺序）"""
+    return list(dict.fromkeys(n for l in layouts for n in l["roi_names"]))
+
+
+def roi_pixel_box(size, roi: dict):
+    """归一化 ROI → 像素框 (x1, y1, x2, y2)，严格不扩边且至少 1 像素"""
+    w, h = size
     nx = max(0.0, min(1.0, float(roi.get("x", 0))))
     ny = max(0.0, min(1.0, float(roi.get("y", 0))))
     nw = max(0.0, min(1.0, float(roi.get("w", 0))))
@@ -85,7 +228,101 @@ def crop_by_roi(pil_img: Image.Image, roi: dict):
     y = max(0, min(y, h - 1))
     rw = max(1, min(rw, w - x))
     rh = max(1, min(rh, h - y))
-    return pil_img.crop((x, y, x + rw, y + rh))
+    return x, y, x + rw, y + rh
+
+
+def crop_by_roi(pil_img: Image.Image, roi: dict, size=None):
+    """严格按归一化 ROI 裁剪，不扩边；size 为原图尺寸（局部解码时图像可能只含原图上部）"""
+    return pil_img.crop(roi_pixel_box(size or pil_img.size, roi))
+
+
+# 逐行顺序解码、可在中途停止的编码器（JPEG 基线、PNG 非隔行、未压缩 TIFF 条带）
+_ROW_TRUNCATABLE_CODECS = ("jpeg", "zip", "raw")
+
+
+def _decode_top_rows(im: Image.Image, bottom: int) -> Image.Image:
+    """只解码图像的前 bottom 行（其后的扫描行不再解码），像素与完整解码一致"""
+    from PIL import ImageFile
+
+    tile = im.tile[0]
+    w = im.size[0]
+    read = im.fp.read
+    if im.format == "PNG":
+        # PNG 需先建立 IDAT 分块读取状态，load_read 负责跨块读取
+        im.load_prepare()
+    if hasattr(im, "load_read"):
+        read = im.load_read
+    core = Image.core.new(im.mode, (w, bottom))
+    decoder = Image._getdecoder(im.mode, tile[0], tile[3], getattr(im, "decoderconfig", ()))
+    try:
+        decoder.setimage(core, (0, 0, w, bottom))
+        im.fp.seek(tile[2])
+        data = b""
+        while True:
+            chunk = read(getattr(im, "decodermaxblock", ImageFile.MAXBLOCK))
+            if not chunk and not data:
+                break
+            data += chunk
+            n, _ = decoder.decode(data)
+            if n < 0 or not chunk:
+                break
+            data = data[n:]
+    finally:
+        decoder.cleanup()
+    return im._new(core)
+
+
+def open_for_rois(image_path: str, rois, align=None):
+    """按 ROI 需要解码图片，返回 (图像, 原图尺寸)；返回的图像只保证覆盖 ROI 所在区域。
+
+    - JPEG/PNG 等顺序解码格式：只解码到所有 ROI 的最下沿；
+    - 分块/分条存储的 TIFF：只解码与 ROI 区域相交的块；
+    - DECODE_GRAY 时 JPEG 直接输出亮度通道，跳过色度解码与颜色转换；
+    - align 为模板对齐结果时按对齐后的 ROI 计算解码范围。
+
+    返回前源文件句柄已关闭（或由调用方 close() 返回的图像关闭），长时间运行不会累积打开的文件。
+    image_path 为已解码的页面（多页 TIFF/PDF 的一页）时原样返回。
+    """
+    if isinstance(image_path, Image.Image):
+        return image_path, image_path.size
+    im = Image.open(image_path)
+    size = im.size
+    try:
+        bounds = as_plan(rois).for_size(size, align)[1] if rois else None
+        if not REGION_DECODE or bounds is None:
+            if DECODE_GRAY and im.format == "JPEG":
+                im.draft("L", size)
+            im.load()
+            return im, size
+    except Exception:
+        im.close()
+        raise
+    x0, y0, x1, y1 = bounds
+    try:
+        if DECODE_GRAY and im.format == "JPEG":
+            im.draft("L", size)
+        tiles = list(im.tile)
+        sequential = not (im.info.get("progressive") or im.info.get("progression") or im.info.get("interlace"))
+        if (len(tiles) == 1 and sequential and tiles[0][0] in _ROW_TRUNCATABLE_CODECS
+                and tuple(tiles[0][1]) == (0, 0) + tuple(size) and y1 < size[1]):
+            try:
+                return _decode_top_rows(im, y1), size
+            finally:
+                im.close()
+        if len(tiles) > 1:
+            im.tile = [t for t in tiles if t[1][0] < x1 and t[1][2] > x0 and t[1][1] < y1 and t[1][3] > y0]
+    except Exception:
+        # 局部解码失败时回退为完整解码
+        im.close()
+        if hasattr(image_path, "seek"):
+            image_path.seek(0)
+        im = Image.open(image_path)
+    try:
+        im.load()
+    except Exception:
+        im.close()
+        raise
+    return im, size
 
 
 def enhance_for_ocr(img: Image.Image) -> Image.Image:
@@ -95,90 +332,365 @@ def enhance_for_ocr(img: Image.Image) -> Image.Image:
     return g.convert("RGB")
 
 
-def _to_numpy_rgb(img: Image.Image) -> np.ndarray:
+@functools.lru_cache(maxsize=4096)
+def _autocontrast_lut(lo: int, hi: int) -> np.ndarray:
+    # 与 ImageOps.autocontrast(cutoff=0) 相同的映射：int(i * scale + offset) 后截断到 0~255
+    scale = 255.0 / (hi - lo)
+    offset = -lo * scale
+    return np.clip((np.arange(256) * scale + offset).astype(np.int64), 0, 255).astype(np.uint8)
+
+
+def enhance_crop_array(crop: Image.Image) -> np.ndarray:
+    """数组版 enhance_for_ocr + _to_numpy_rgb：灰度后一次查表完成对比度拉伸，直接输出识别所需的 RGB 数组。
+
+    只合并了对比度拉伸与通道扩展：裁剪、小框放大与灰度化仍走 PIL，cv2 的缩放/灰度与 PIL 差 1~2 个灰度级，
+    会破坏与 enhance_for_ocr 的逐像素一致。返回的数组会被批量识别暂存，每次都新分配，不复用缓冲区。
+    """
+    gray = np.asarray(ImageOps.grayscale(crop))
+    cv2 = _cv2()
+    if cv2 is not None:
+        lo, hi, _, _ = cv2.minMaxLoc(gray)
+        lo, hi = int(lo), int(hi)
+        if hi > lo:
+            gray = cv2.LUT(gray, _autocontrast_lut(lo, hi))
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
+    lo, hi = int(gray.min()), int(gray.max())
+    if hi > lo:
+        gray = _autocontrast_lut(lo, hi)[gray]
+    return np.repeat(gray[:, :, None], 3, axis=2)
+
+
+def _to_numpy_rgb(img) -> np.ndarray:
+    if isinstance(img, np.ndarray):
+        return img
     if img.mode != "RGB":
         img = img.convert("RGB")
     return np.array(img)
 
 
-def init_ocr(use_det: bool = USE_DET):
-    global ocr_engine
-    print("🚀 正在初始化 RapidOCR（CPU，ONNXRuntime）…", flush=True)
+def load_engine_config(path: str) -> dict:
+    """读取 ROI 配置文件中的 engine 段（ONNXRuntime 会话参数）；没有时返回空字典"""
     try:
-        ocr_engine = RapidOCR(use_det=use_det)
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    except Exception:
+        return {}
+    engine = cfg.get("engine") if isinstance(cfg, dict) else None
+    return engine if isinstance(engine, dict) else {}
+
+
+def engine_options(workers: int = 1, overrides: Optional[dict] = None) -> dict:
+    """合并 ENGINE_* 常量、ENGINE_SETTINGS 与 overrides，并按进程数换算 auto 线程数"""
+    from ocr_session import merge_options, resolve_options
+
+    base = {
+        "intra_op_num_threads": ENGINE_THREADS,
+        "inter_op_num_threads": ENGINE_INTER_THREADS,
+        "graph_optimization_level": ENGINE_GRAPH_OPT,
+        "cpu_mem_arena": ENGINE_MEM_ARENA,
+        "execution_mode": ENGINE_EXEC_MODE,
+    }
+    return resolve_options(merge_options(base, ENGINE_SETTINGS, overrides), workers)
+
+
+def _new_engine(**kwargs):
+    """按 _engine_options 创建 RapidOCR；RapidOCR 版本不支持替换会话参数时只透传线程数"""
+    from ocr_session import session_options
+
+    RapidOCR = _rapidocr_class()
+    with session_options(_engine_options) as applied:
+        if not applied and _engine_options:
+            for key in ("intra_op_num_threads", "inter_op_num_threads"):
+                if _engine_options.get(key, -1) > 0:
+                    kwargs.setdefault(key, _engine_options[key])
+        return RapidOCR(**kwargs)
+
+
+def init_ocr(use_det: bool = USE_DET, intra_threads: int = -1, verbose: bool = True,
+             options: Optional[dict] = None):
+    """初始化全局识别引擎。options 为已换算的会话参数（默认 engine_options()），
+    intra_threads>0 时覆盖其中每个会话的线程数"""
+    global ocr_engine, det_engine, _engine_use_det, _engine_options
+    options = dict(engine_options() if options is None else options)
+    if intra_threads and intra_threads > 0:
+        options.update(intra_op_num_threads=int(intra_threads), inter_op_num_threads=1)
+        for m in ("det", "cls", "rec"):
+            options.pop(m, None)
+    if verbose:
+        from ocr_session import describe
+        print(f"🚀 正在初始化 RapidOCR（CPU，ONNXRuntime；{describe(options)}）…", flush=True)
+    _engine_options = options
+    _engine_use_det = use_det
+    det_engine = None
+    try:
+        ocr_engine = _new_engine(use_det=use_det)
     except TypeError:
-        # 某些版本不支持 use_det 参数，回退为默认
-        ocr_engine = RapidOCR()
-        if use_det is False:
+        # 某些版本不支持 use_det 参数，回退为默认（不替换会话参数，但同样等其他线程的引擎创建完成）
+        from ocr_session import session_options
+        with session_options(None):
+            ocr_engine = _rapidocr_class()()
+        _engine_options = {}
+        if use_det is False and verbose:
             print("ℹ️ 当前 RapidOCR 版本不支持禁用检测参数，已回退到默认初始化。", flush=True)
-    print("✅ RapidOCR 初始化完成", flush=True)
+    if verbose:
+        print("✅ RapidOCR 初始化完成", flush=True)
+
+
+def resolve_workers(workers: int) -> int:
+    """解析进程数：0 或负数表示按 CPU 核数自动"""
+    if workers is None or workers <= 0:
+        return max(1, os.cpu_count() or 1)
+    return int(workers)
+
+
+def _collect_scored(result) -> List[Tuple[str, float]]:
+    # 兼容多种返回结构，返回 [(文本, 得分)]：
+    # - [bbox, text, score]
+    # - [text, score]
+    # - {"text": str, "score": float, ...}
+    out = []
+    for item in (result or []):
+        try:
+            if isinstance(item, dict):
+                txt = item.get("text", "")
+                if txt:
+                    out.append((str(txt), _as_score(item.get("score"))))
+                    continue
+            if isinstance(item, (list, tuple)):
+                # 优先使用字符串元素作为文本，其后的数值为得分
+                if len(item) >= 2:
+                    if isinstance(item[1], str):
+                        out.append((item[1], _as_score(item[2] if len(item) > 2 else None)))
+                        continue
+                    if isinstance(item[0], str):
+                        out.append((item[0], _as_score(item[1])))
+                        continue
+                # 回退：扫描所有字符串字段
+                for elem in item:
+                    if isinstance(elem, str):
+                        out.append((elem, 0.0))
+                        break
+        except Exception:
+            pass
+    return out
+
+
+def _as_score(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _join_scored(pairs: List[Tuple[str, float]]) -> Tuple[str, float]:
+    """多个文本框拼接为一个结果；得分取最低分（任一片段不可靠即视为不可靠），无文本时为 ("", 0.0)"""
+    pairs = [(t.strip(), s) for t, s in pairs if t and t.strip()]
+    if not pairs:
+        return "", 0.0
+    return "".join(t for t, _ in pairs), min(s for _, s in pairs)
+
+
+def get_det_engine():
+    """检测回退引擎：每个进程首次需要时才创建，之后复用"""
+    global det_engine
+    if det_engine is None:
+        det_engine = _new_engine(use_det=True)
+    return det_engine
+
+
+def det_fallback_enabled(column: Optional[str], policy=None) -> bool:
+    """检测回退策略：'always' / 'never' / 列名列表（仅对这些列回退）"""
+    return column_enabled(column, DET_FALLBACK if policy is None else policy)
 
 
-def read_text(img: Image.Image) -> str:
+def column_enabled(column: Optional[str], policy) -> bool:
+    """按列开关：'always' / 'never' / 逗号分隔的列名或列名列表"""
+    if isinstance(policy, str):
+        p = policy.strip().lower()
+        if p == "always":
+            return True
+        if p == "never":
+            return False
+        policy = [x.strip() for x in policy.split(",") if x.strip()]
+    return column is not None and column in set(policy)
+
+
+def _record_fallback(column: Optional[str], seconds: float, hit: bool):
+    key = column or ""
+    col = fallback_stats["by_column"].setdefault(key, {"calls": 0, "hits": 0, "seconds": 0.0})
+    for d in (fallback_stats, col):
+        d["calls"] += 1
+        d["hits"] += 1 if hit else 0
+        d["seconds"] += seconds
+
+
+def take_fallback_stats() -> dict:
+    """取出并清零本进程的检测回退统计（多进程时由主进程汇总）"""
+    global fallback_stats
+    snap = fallback_stats
+    fallback_stats = _new_fallback_stats()
+    return snap
+
+
+def merge_fallback_stats(delta: dict):
+    fallback_stats["images"] += delta.get("images", 0)
+    for k in ("calls", "hits", "seconds", "recheck_cells", "recheck_calls", "recheck_improved", "recheck_seconds"):
+        fallback_stats[k] += delta.get(k, 0)
+    for name, d in delta.get("by_column", {}).items():
+        col = fallback_stats["by_column"].setdefault(name, {"calls": 0, "hits": 0, "seconds": 0.0})
+        for k in ("calls", "hits", "seconds"):
+            col[k] += d.get(k, 0)
+
+
+def report_fallback_stats(stats: Optional[dict] = None):
+    stats = fallback_stats if stats is None else stats
+    if not stats["calls"]:
+        return
+    print(
+        f"🔁 检测回退 {stats['calls']} 次（其中 {stats['hits']} 次得到文本），累计耗时 {stats['seconds']:.2f}s",
+        flush=True,
+    )
+    images = max(1, stats["images"])
+    for name, d in sorted(stats["by_column"].items(), key=lambda kv: -kv[1]["seconds"]):
+        rate = d["calls"] / images
+        warn = "  ⚠️ 回退比例过高，请检查模板/ROI 是否对齐" if rate >= DET_FALLBACK_WARN_RATE else ""
+        print(f"   - {name or '(未命名)'}: {d['calls']} 次 / {images} 张，耗时 {d['seconds']:.2f}s{warn}", flush=True)
+
+
+def det_fallback_text(np_img: np.ndarray, column: Optional[str] = None) -> Tuple[str, float]:
+    """纯识别为空时用检测引擎再识别一次，并计入回退统计；返回 (文本, 得分)"""
+    if _engine_use_det:
+        return "", 0.0
+    try:
+        det = get_det_engine()
+    except Exception:
+        return "", 0.0
+    t0 = time.perf_counter()
+    try:
+        result, _ = det(np_img)
+        text, score = _join_scored(_collect_scored(result))
+    except Exception:
+        text, score = "", 0.0
+    dt = time.perf_counter() - t0
+    _record_fallback(column, dt, bool(text))
+    PROFILER.add("det_fallback", dt, column)
+    return text, score
+
+
+def _recheck_tag() -> str:
+    # 二次识别参数计入切图记忆的键：参数变化后不复用旧结果
+    return f"recheck={RECHECK_THRESHOLD}/{RECHECK_UPSCALE}/{RECHECK_PAD}/{int(bool(RECHECK_DET))}"
+
+
+def _recheck_image(np_img: np.ndarray) -> np.ndarray:
+    """二次识别用的切图：四周补白后再放大"""
+    pad = int(round(np_img.shape[0] * max(0.0, RECHECK_PAD)))
+    img = np_img
+    if pad > 0:
+        img = np.pad(img, ((pad, pad), (pad, pad), (0, 0)), mode="constant", constant_values=255)
+    if RECHECK_UPSCALE and RECHECK_UPSCALE != 1:
+        size = (max(1, int(round(img.shape[1] * RECHECK_UPSCALE))), max(1, int(round(img.shape[0] * RECHECK_UPSCALE))))
+        cv2 = _cv2()
+        if cv2 is not None:
+            img = cv2.resize(img, size, interpolation=cv2.INTER_CUBIC)
+        else:
+            img = np.asarray(Image.fromarray(img).resize(size, Image.LANCZOS))
+    return np.ascontiguousarray(img)
+
+
+def recheck_text(np_img: np.ndarray, column: Optional[str], text: str, score: Optional[float]) -> Tuple[str, float]:
+    """低置信度二次识别：得分低于 RECHECK_THRESHOLD 的非空结果补白、放大后
+    （RECHECK_DET 时用检测+识别引擎）再识别一次，保留得分更高的结果；其余结果原样返回"""
+    fallback_stats["recheck_cells"] += 1
+    if not text or text.startswith("[ERROR]") or score is None or score >= RECHECK_THRESHOLD:
+        return text, score
+    t0 = time.perf_counter()
+    try:
+        img = _recheck_image(np_img)
+        engine = get_det_engine() if RECHECK_DET and not _engine_use_det else ocr_engine
+        result, _ = engine(img)
+        new_text, new_score = _join_scored(_collect_scored(result))
+    except Exception:
+        new_text, new_score = "", 0.0
+    dt = time.perf_counter() - t0
+    improved = bool(new_text) and new_score > score
+    fallback_stats["recheck_calls"] += 1
+    fallback_stats["recheck_improved"] += 1 if improved else 0
+    fallback_stats["recheck_seconds"] += dt
+    PROFILER.add("recheck", dt, column)
+    return (new_text, new_score) if improved else (text, score)
+
+
+def report_recheck_stats(stats: Optional[dict] = None):
+    stats = fallback_stats if stats is None else stats
+    if not stats["recheck_cells"]:
+        return
+    calls, cells = stats["recheck_calls"], stats["recheck_cells"]
+    print(f"🔍 低置信度二次识别 {calls}/{cells} 格（{calls / cells:.1%}，阈值 {RECHECK_THRESHOLD}），"
+          f"其中 {stats['recheck_improved']} 格得分提高，累计耗时 {stats['recheck_seconds']:.2f}s", flush=True)
+
+
+def get_crop_memo():
+    global crop_memo
+    if crop_memo is None:
+        from ocr_memo import CropMemo
+        crop_memo = CropMemo(CROP_MEMO_SIZE, CROP_MEMO_DB, namespace=f"{_engine_version()}|det={USE_DET}")
+    return crop_memo
+
+
+def report_memo_stats():
+    if crop_memo is None:
+        return
+    st = crop_memo.stats
+    total = st["hits"] + st["misses"]
+    if not total:
+        return
+    size = f"，当前 {len(crop_memo)} 条" if len(crop_memo) else ""
+    print(f"🧠 切图记忆命中 {st['hits']}/{total}（{st['hits'] / total:.0%}）{size}，淘汰 {st['evictions']} 条", flush=True)
+    for name, (h, m) in sorted(st["by_column"].items()):
+        print(f"   - {name or '(未命名)'}: {h}/{h + m}（{h / max(1, h + m):.0%}）", flush=True)
+
+
+def read_text(img, column: Optional[str] = None, det_fallback: bool = True, memo: bool = False,
+              recheck: bool = False) -> Tuple[str, Optional[float]]:
+    """识别一块切图，返回 (文本, 得分)；memo=True 时先查切图记忆，像素相同的切图不再推理；
+    recheck=True 时低置信度的结果再做一次二次识别（切图记忆保存的是最终结果）"""
     np_img = _to_numpy_rgb(img)
+    if not memo:
+        return _read_checked(np_img, column, det_fallback, recheck)
+    from ocr_memo import crop_key
+    with PROFILER.stage("memo_lookup", column):
+        key = crop_key(np_img, det_fallback, _recheck_tag() if recheck else "")
+        hit = get_crop_memo().get(key, column)
+    if hit is not None:
+        PROFILER.count("memo_hits")
+        return hit
+    text, score = _read_checked(np_img, column, det_fallback, recheck)
+    if not text.startswith("[ERROR]"):
+        crop_memo.put(key, text, score)
+    return text, score
+
+
+def _read_checked(np_img: np.ndarray, column: Optional[str], det_fallback: bool, recheck: bool):
+    text, score = _read_text(np_img, column, det_fallback)
+    if recheck:
+        text, score = recheck_text(np_img, column, text, score)
+    return text, score
+
+
+def _read_text(np_img: np.ndarray, column: Optional[str] = None, det_fallback: bool = True) -> Tuple[str, float]:
     try:
-        result, _ = ocr_engine(np_img)
-        # 兼容多种返回结构：
-        # - [bbox, text, score]
-        # - [text, score]
-        # - {"text": str, "score": float, ...}
+        with PROFILER.stage("recognize", column):
+            result, _ = ocr_engine(np_img)
+        text, score = "", 0.0
         if isinstance(result, list) and result:
-            texts = []
-            for item in result:
-                try:
-                    if isinstance(item, dict):
-                        txt = item.get("text", "")
-                        if txt:
-                            texts.append(str(txt))
-                            continue
-                    if isinstance(item, (list, tuple)):
-                        # 优先使用字符串元素作为文本
-                        if len(item) >= 2:
-                            if isinstance(item[1], str):
-                                texts.append(item[1])
-                                continue
-                            if isinstance(item[0], str):
-                                texts.append(item[0])
-                                continue
-                        # 回退：扫描所有字符串字段
-                        for elem in item:
-                            if isinstance(elem, str):
-                                texts.append(elem)
-                                break
-                except Exception:
-                    pass
-            return "".join(t.strip() for t in texts)
-        # 回退：若空且当前禁用检测，可临时启用检测再识别
-        try:
-            det_ocr = RapidOCR(use_det=True)
-            result2, _ = det_ocr(np_img)
-            texts2 = []
-            for it in (result2 or []):
-                try:
-                    if isinstance(it, dict):
-                        txt = it.get("text", "")
-                        if txt:
-                            texts2.append(str(txt))
-                            continue
-                    if isinstance(it, (list, tuple)):
-                        if len(it) >= 2:
-                            if isinstance(it[1], str):
-                                texts2.append(it[1])
-                                continue
-                            if isinstance(it[0], str):
-                                texts2.append(it[0])
-                                continue
-                        for elem in it:
-                            if isinstance(elem, str):
-                                texts2.append(elem)
-                                break
-                except Exception:
-                    pass
-            return "".join(t.strip() for t in texts2)
-        except Exception:
-            return ""
+            text, score = _join_scored(_collect_scored(result))
+        # 回退：若空且当前禁用检测，使用缓存的检测引擎再识别一次
+        if text or not det_fallback:
+            return text, score
+        return det_fallback_text(np_img, column)
     except Exception as e:
-        return f"[ERROR] {e}"
+        return f"[ERROR] {e}", 0.0
 
 
 def clean_number(text: str) -> str:
@@ -196,87 +708,1259 @@ def clean_name(text: str) -> str:
     return re.sub(r"[\s\r\n]+", "", text.strip())
 
 
-def ocr_image(image_path: str, rois: List[dict], roi_names: List[str]) -> dict:
-    fname = os.path.basename(image_path)
-    row = {"filename": fname}
-    try:
-        pil_img = Image.open(image_path)
-        if SAVE_DEBUG_CROPS:
-            os.makedirs(os.path.join(BASE_DIR, DEBUG_DIR), exist_ok=True)
+NUMBER_KEYWORDS = ["number", "num", "编号", "号码", "id", "证号", "编码", "工号"]
+NAME_KEYWORDS = ["name", "姓名", "cname", "名称", "名字"]
+
+
+def clean_for_column(column: str, text: str) -> str:
+    """按列名选择清洗规则（编号类 / 姓名类）"""
+    cleaner = cleaner_for_column(column)
+    return cleaner(text) if cleaner is not None else text
+
+
+def cleaner_for_column(column: str):
+    """按列名选择清洗函数（编号类 / 姓名类），无需清洗时返回 None"""
+    name = column.lower()
+    if any(k in name for k in NUMBER_KEYWORDS):
+        return clean_number
+    if any(k in name for k in NAME_KEYWORDS):
+        return clean_name
+    return None
+
+
+class RoiPlan:
+    """ROI 执行计划：列名、清洗函数、检测回退策略、是否退化框只解析一次；
+    像素框与放大尺寸按图片尺寸编译并缓存，逐张识别时只需查表执行。
+    template 为对齐用的模板图片路径（未配置时为 None）。"""
+
+    def __init__(self, rois: List[dict], template: Optional[str] = None):
+        self.rois = rois
+        self.template = template
+        self.entries = []
         for roi in rois:
-            name = roi["name"].lower()
-            crop = crop_by_roi(pil_img, roi)
-            cw, ch = crop.size
+            self.entries.append({
+                "name": roi["name"],
+                "roi": roi,
+                "cleaner": cleaner_for_column(roi["name"]),
+                "det_fallback": det_fallback_enabled(roi["name"]),
+                "memo": column_enabled(roi["name"], CROP_MEMO),
+                "recheck": RECHECK_THRESHOLD > 0 and column_enabled(roi["name"], RECHECK_COLUMNS),
+                # 宽或高为 0 的框（如画框时误点）不裁剪、不识别，直接输出空值
+                "skip": float(roi.get("w", 0)) <= 0 or float(roi.get("h", 0)) <= 0,
+            })
+        self._by_size = {}
+
+    def __getstate__(self):
+        # 传给子进程时不带尺寸缓存
+        return {"rois": self.rois, "template": self.template, "entries": self.entries, "_by_size": {}}
+
+    def for_size(self, size, align=None):
+        """返回 ([(entry, 像素框, 放大后尺寸或 None)], 所有框的外接矩形或 None)；
+        align 为非恒等的对齐结果时按变换后的 ROI 编译（每张图片不同，不缓存）"""
+        if align is not None and not align.identity:
+            return self._compile(size, align)
+        compiled = self._by_size.get(size)
+        if compiled is not None:
+            return compiled
+        if len(self._by_size) >= 256:
+            self._by_size.clear()
+        compiled = self._by_size[size] = self._compile(size)
+        return compiled
+
+    def _compile(self, size, align=None):
+        w, h = size
+        steps = []
+        for e in self.entries:
+            if e["skip"]:
+                continue
+            roi = e["roi"] if align is None else align.apply(e["roi"])
+            # 换算后不足 1 像素的框同样视为退化框
+            if int(max(0.0, min(1.0, roi["w"])) * w) < 1 or int(max(0.0, min(1.0, roi["h"])) * h) < 1:
+                continue
+            box = roi_pixel_box(size, roi)
+            cw, ch = box[2] - box[0], box[3] - box[1]
+            upscale = None
             if ch < SMALL_ROI_MIN_HEIGHT or cw < SMALL_ROI_MIN_WIDTH:
-                crop = crop.resize((cw * SMALL_ROI_UPSCALE, ch * SMALL_ROI_UPSCALE), Image.LANCZOS)
-            if SAVE_DEBUG_CROPS:
-                try:
-                    crop.save(os.path.join(BASE_DIR, DEBUG_DIR, f"{os.path.splitext(fname)[0]}_{roi['name']}_raw.png"))
-                except Exception:
-                    pass
-            prep = enhance_for_ocr(crop)
-            if SAVE_DEBUG_CROPS:
-                try:
-                    prep.save(os.path.join(BASE_DIR, DEBUG_DIR, f"{os.path.splitext(fname)[0]}_{roi['name']}_prep.png"))
-                except Exception:
-                    pass
-            text = read_text(prep)
-            if any(k in name for k in ["number", "num", "编号", "号码", "id", "证号", "编码", "工号"]):
-                text = clean_number(text)
-            elif any(k in name for k in ["name", "姓名", "cname", "名称", "名字"]):
-                text = clean_name(text)
-            row[roi["name"]] = text
-        for nm in roi_names:
-            if nm not in row:
-                row[nm] = ""
+                upscale = (cw * SMALL_ROI_UPSCALE, ch * SMALL_ROI_UPSCALE)
+            steps.append((e, box, upscale))
+        bounds = None
+        if steps:
+            bounds = (min(b[0] for _, b, _ in steps), min(b[1] for _, b, _ in steps),
+                      max(b[2] for _, b, _ in steps), max(b[3] for _, b, _ in steps))
+        return steps, bounds
+
+
+_plan_cache = {}
+
+
+def compile_roi_plan(rois: List[dict], template: Optional[str] = None) -> RoiPlan:
+    """把 load_roi_config() 的结果编译为执行计划（相同 ROI 列表复用同一计划）"""
+    # 按列的检测回退、切图记忆与二次识别开关在编译时解析，策略变化时重新编译
+    key = (DET_FALLBACK, CROP_MEMO, RECHECK_THRESHOLD, RECHECK_COLUMNS, template) + tuple((r["name"], r["x"], r["y"], r["w"], r["h"]) for r in rois)
+    plan = _plan_cache.get(key)
+    if plan is None:
+        if len(_plan_cache) >= 16:
+            _plan_cache.clear()
+        plan = _plan_cache[key] = RoiPlan(rois, template)
+    return plan
+
+
+class LayoutPlan:
+    """多模板执行计划：先做版式分类，再交给对应模板的 RoiPlan"""
+
+    def __init__(self, names: List[str], plans: List[RoiPlan], classifier):
+        self.names = names
+        self.plans = plans
+        self.classifier = classifier
+        # 跨图片批量识别时按 ROI 最多的模板估算每组图片数
+        self.entries = max((p.entries for p in plans), key=len)
+
+    def route(self, src):
+        """返回 (模板名, RoiPlan)；不属于任何模板时为 ("", None)"""
+        match = self.classifier.classify(src)
+        if match.index is None:
+            return "", None
+        return self.names[match.index], self.plans[match.index]
+
+
+def compile_layouts(layouts: List[dict]):
+    """load_layouts() 的结果 → 执行计划：单模板为 RoiPlan，多模板为 LayoutPlan"""
+    plans = [compile_roi_plan(l["rois"], l["template"] if ALIGN else None) for l in layouts]
+    if len(plans) == 1:
+        return plans[0]
+    from ocr_layout import LayoutClassifier
+    classifier = LayoutClassifier([(l["size"], l["thumbnail"]) for l in layouts], LAYOUT_MIN_SCORE, LAYOUT_ASPECT_TOL)
+    return LayoutPlan([l["name"] for l in layouts], plans, classifier)
+
+
+def as_plan(rois):
+    return rois if isinstance(rois, (RoiPlan, LayoutPlan)) else compile_roi_plan(rois)
+
+
+def get_aligner(template: str):
+    """按模板与当前 ALIGN_* 参数取对齐器（预先计算模板频谱，进程内复用）；模板无法读取时为 None"""
+    key = (template, ALIGN_WIDTH, tuple(ALIGN_SCALES), ALIGN_MIN_QUALITY, ALIGN_MAX_SHIFT)
+    if key not in _aligners:
+        from ocr_align import TemplateAligner
+        try:
+            _aligners[key] = TemplateAligner(template, ALIGN_WIDTH, ALIGN_SCALES, ALIGN_MIN_QUALITY, ALIGN_MAX_SHIFT)
+        except Exception as e:
+            print(f"[WARN] 模板图片无法读取: {template}（{e}），不做对齐", flush=True)
+            _aligners[key] = None
+    return _aligners[key]
+
+
+class PreparedCrops(list):
+    """prepare_rois 的结果：[(计划项, 预处理切图)]，另带本张图片的对齐结果、原图尺寸与所用模板"""
+    align = None
+    size = None
+    layout = None
+
+
+def prepare_rois(image_path, rois, name: Optional[str] = None) -> List[tuple]:
+    """解码图片并按计划裁剪、放大、增强，返回 [(计划项, 预处理切图 RGB 数组)]；退化框不在其中。
+
+    image_path 也可以是已打开的二进制文件对象（如 BytesIO），此时用 name 作为调试切图的文件名；
+    为多页文件的一页（PageRef）时先只解码这一页，后续分类、对齐、裁剪都在这一页上进行。
+    多模板计划先做版式分类，不属于任何模板的图片不裁剪（返回空列表）；
+    ALIGN 且计划带有模板时，先与模板对齐（每张图片一次），所有 ROI 按同一变换移动后再裁剪。
+    """
+    plan = as_plan(rois)
+    fname = name or source_name(image_path)
+    if isinstance(image_path, PageRef):
+        # 调试切图按页区分：scan_p2_<列>_raw.png
+        fname = name or f"{os.path.splitext(os.path.basename(image_path.path))[0]}_p{image_path.page}"
+        with PROFILER.stage("decode"):
+            image_path = load_page(image_path, PDF_DPI)
+    layout = None
+    if isinstance(plan, LayoutPlan):
+        with PROFILER.stage("classify"):
+            layout, plan = plan.route(image_path)
+        if plan is None:
+            if isinstance(image_path, Image.Image):
+                image_path.close()
+            out = PreparedCrops()
+            out.layout = layout
+            return out
+    align = None
+    if ALIGN and plan.template:
+        aligner = get_aligner(plan.template)
+        if aligner is not None:
+            with PROFILER.stage("align"):
+                align = aligner.align(image_path)
+    with PROFILER.stage("decode"):
+        pil_img, size = open_for_rois(image_path, plan, align)
+    try:
+        out = PreparedCrops(_prepare_crops(pil_img, size, plan, fname, align))
+        out.align, out.size, out.layout = align, size, layout
+        return out
+    finally:
+        pil_img.close()
+
+
+def _prepare_crops(pil_img: Image.Image, size, plan: RoiPlan, fname: str, align=None) -> List[tuple]:
+    steps, _ = plan.for_size(size, align)
+    if SAVE_DEBUG_CROPS:
+        os.makedirs(os.path.join(BASE_DIR, DEBUG_DIR), exist_ok=True)
+    out = []
+    for entry, box, upscale in steps:
+        name = entry["name"]
+        with PROFILER.stage("crop", name):
+            crop = pil_img.crop(box)
+        if upscale is not None:
+            with PROFILER.stage("upscale", name):
+                crop = crop.resize(upscale, Image.LANCZOS)
+        if SAVE_DEBUG_CROPS:
+            try:
+                crop.save(os.path.join(BASE_DIR, DEBUG_DIR, f"{os.path.splitext(fname)[0]}_{entry['name']}_raw.png"))
+            except Exception:
+                pass
+        with PROFILER.stage("enhance", name):
+            if PREPROCESS == "numpy":
+                prep = enhance_crop_array(crop)
+            else:
+                prep = _to_numpy_rgb(enhance_for_ocr(crop))
+        if SAVE_DEBUG_CROPS:
+            try:
+                Image.fromarray(prep).save(os.path.join(BASE_DIR, DEBUG_DIR, f"{os.path.splitext(fname)[0]}_{entry['name']}_prep.png"))
+            except Exception:
+                pass
+        out.append((entry, prep))
+    return out
+
+
+def finish_text(entry: dict, text: str) -> str:
+    cleaner = entry["cleaner"]
+    return cleaner(text) if cleaner is not None else text
+
+
+CONF_SUFFIX = "_conf"
+
+
+def conf_column(name: str) -> str:
+    return name + CONF_SUFFIX
+
+
+def with_conf(roi_names: List[str]) -> List[str]:
+    """CONF_COLUMNS 时在 ROI 列之后追加各列的得分列（原有列的位置不变）"""
+    return list(roi_names) + ([conf_column(n) for n in roi_names] if CONF_COLUMNS else [])
+
+
+def _set_cell(row: dict, entry: dict, text: str, score: Optional[float]):
+    """写入一格识别结果；CONF_COLUMNS 时同时写得分（<列名>_conf，保留 4 位小数；空文本、出错或得分未知时为空）"""
+    row[entry["name"]] = finish_text(entry, text)
+    if CONF_COLUMNS:
+        ok = text and score is not None and not text.startswith("[ERROR]")
+        row[conf_column(entry["name"])] = round(float(score), 4) if ok else ""
+
+
+def _attach_meta(row: dict, prepared):
+    layout = getattr(prepared, "layout", None)
+    if layout is not None:
+        row[TEMPLATE_COLUMN] = layout
+    # 对齐结果随行返回（多进程时一并传回主进程），由 iter_rows 取出写入对齐报告，不进入输出列
+    align = getattr(prepared, "align", None)
+    if align is not None:
+        row["_align"] = align.as_dict(prepared.size)
+
+
+def _prepare_safe(image_path: str, plan: RoiPlan) -> tuple:
+    """prepare_rois 的不抛异常版本：返回 (路径, 预处理结果, 异常或 None)"""
+    try:
+        return image_path, prepare_rois(image_path, plan), None
+    except Exception as e:
+        return image_path, [], e
+
+
+def recognize_prepared(image_path: str, prepared: List[tuple], roi_names: List[str], error=None, t0=None) -> dict:
+    """识别已预处理的切图并组装一行结果；error 为预处理阶段的异常"""
+    row = {"filename": source_name(image_path)}
+    # 先按列顺序占位（退化框保持空值），识别结果随后填入
+    row.update(dict.fromkeys(with_conf(roi_names), ""))
+    fallback_stats["images"] += 1
+    PROFILER.count("images")
+    t0 = time.perf_counter() if t0 is None else t0
+    _attach_meta(row, prepared)
+    try:
+        if error is not None:
+            raise error
+        for entry, prep in prepared:
+            text, score = read_text(prep, column=entry["name"], det_fallback=entry["det_fallback"], memo=entry["memo"],
+                                    recheck=entry["recheck"])
+            _set_cell(row, entry, text, score)
         return row
     except Exception as e:
+        PROFILER.count("errors")
         for nm in roi_names:
             row[nm] = f"[ERROR] {e}"
+        # 出错前已写入的得分一并清空，与整行出错的列一致
+        row.update(dict.fromkeys(with_conf(roi_names)[len(roi_names):], ""))
         return row
+    finally:
+        # 识别线程上每张图片的耗时（预取时不含已在读取线程完成的解码与预处理）
+        PROFILER.add("image", time.perf_counter() - t0)
+
+
+def ocr_image(image_path: str, rois, roi_names: List[str]) -> dict:
+    t0 = time.perf_counter()
+    _, prepared, error = _prepare_safe(image_path, as_plan(rois))
+    return recognize_prepared(image_path, prepared, roi_names, error, t0)
+
+
+def prefetch_prepared(image_paths, plan: RoiPlan, threads: int = PREFETCH_THREADS, depth: int = PREFETCH_DEPTH):
+    """读取线程提前打开、解码并预处理后续图片，按输入顺序产出 (路径, 预处理结果, 异常)。
+
+    最多有 depth 张图片处于“已提交/已完成但未被取走”状态，内存占用有上限；
+    image_paths 可以是惰性迭代器，只在需要时才取下一条路径。
+    """
+    depth = max(1, int(depth))
+    paths = iter(image_paths)
+    pool = ThreadPoolExecutor(max_workers=max(1, int(threads)), thread_name_prefix="ocr-prefetch")
+    window = deque()
+    try:
+        for path in itertools.islice(paths, depth):
+            window.append(pool.submit(_prepare_safe, path, plan))
+        while window:
+            fut = window.popleft()
+            for path in itertools.islice(paths, 1):
+                window.append(pool.submit(_prepare_safe, path, plan))
+            if not fut.done():
+                with PROFILER.stage("prefetch_wait"):
+                    item = fut.result()
+            else:
+                item = fut.result()
+            yield item
+    finally:
+        # 提前结束（出错或中断）时丢弃尚未开始的任务
+        for fut in window:
+            fut.cancel()
+        pool.shutdown(wait=True)
+
+
+# ---------- 跨图片批量识别：多张图片的 ROI 切图合并后按宽高比分桶送入识别模型 ----------
+def _aspect_buckets(imgs: List[np.ndarray], max_batch: int, min_ratio: float) -> List[List[int]]:
+    """按宽高比排序分桶；同桶内宽高比相近，补齐到统一高度时浪费最少"""
+    ratios = [max(min_ratio, a.shape[1] / float(max(1, a.shape[0]))) for a in imgs]
+    order = sorted(range(len(imgs)), key=lambda i: ratios[i])
+    buckets, cur, base = [], [], 0.0
+    for i in order:
+        if cur and (len(cur) >= max_batch or ratios[i] > base * REC_BUCKET_RATIO):
+            buckets.append(cur)
+            cur = []
+        if not cur:
+            base = ratios[i]
+        cur.append(i)
+    if cur:
+        buckets.append(cur)
+    return buckets
+
+
+def recognize_batch(np_imgs: List[np.ndarray], max_batch: int = 0) -> List[Tuple[str, float]]:
+    """一次识别多张切图（纯识别路径），返回与输入一一对应的 (文本, 得分)"""
+    if not np_imgs:
+        return []
+    max_batch = max_batch or BATCH_SIZE or len(np_imgs)
+    eng = ocr_engine
+    rec, cls = eng.text_rec, eng.text_cls
+    # 与 RapidOCR.__call__ 的纯识别路径保持一致：边长限制 → 方向分类 → 识别
+    imgs = [eng.preprocess(eng.load_img(a))[0] for a in np_imgs]
+    old_cls_batch, old_rec_batch = cls.cls_batch_num, rec.rec_batch_num
+    try:
+        if eng.use_cls:
+            cls.cls_batch_num = max_batch
+            imgs, _, _ = cls(imgs)
+        _, img_h, img_w = rec.rec_image_shape[:3]
+        out = [("", 0.0)] * len(imgs)
+        for bucket in _aspect_buckets(imgs, max_batch, img_w / float(img_h)):
+            rec.rec_batch_num = len(bucket)
+            res, _ = rec([imgs[i] for i in bucket])
+            for i, r in zip(bucket, res):
+                if r and isinstance(r[0], str):
+                    out[i] = _join_scored([(r[0], _as_score(r[1] if len(r) > 1 else None))])
+    finally:
+        cls.cls_batch_num, rec.rec_batch_num = old_cls_batch, old_rec_batch
+    return out
+
+
+def ocr_images_batched(image_paths: List[str], rois, roi_names: List[str]) -> List[dict]:
+    """批量版 ocr_image：收集多张图片的切图一起识别，再按 (文件, 列) 回填"""
+    plan = as_plan(rois)
+    return recognize_prepared_batch([_prepare_safe(p, plan) for p in image_paths], roi_names)
+
+
+def recognize_prepared_batch(items: List[tuple], roi_names: List[str]) -> List[dict]:
+    """items 为 [(路径, 预处理结果, 异常)]，所有切图合并为一批识别；切图记忆命中的不进入批次"""
+    from ocr_memo import crop_key
+
+    rows, cells, crops = [], [], []
+    queued = {}  # 本批内已排队的切图记忆键 → 切图下标（同批重复的切图只识别一次）
+    for path, prepared, error in items:
+        row = {"filename": source_name(path)}
+        row.update(dict.fromkeys(with_conf(roi_names), ""))
+        fallback_stats["images"] += 1
+        PROFILER.count("images")
+        _attach_meta(row, prepared)
+        if error is not None:
+            PROFILER.count("errors")
+            for nm in roi_names:
+                row[nm] = f"[ERROR] {error}"
+        for entry, prep in prepared:
+            key = None
+            if entry["memo"]:
+                with PROFILER.stage("memo_lookup", entry["name"]):
+                    key = crop_key(prep, entry["det_fallback"], _recheck_tag() if entry["recheck"] else "")
+                    memo = get_crop_memo()
+                    hit = None if key in queued else memo.get(key, entry["name"])
+                if key in queued:
+                    memo.record(entry["name"], True)
+                    PROFILER.count("memo_hits")
+                    cells.append((len(rows), entry, None, queued[key]))
+                    continue
+                if hit is not None:
+                    PROFILER.count("memo_hits")
+                    _set_cell(row, entry, *hit)
+                    continue
+                queued[key] = len(crops)
+            cells.append((len(rows), entry, key, len(crops)))
+            crops.append(prep)
+        rows.append(row)
+    try:
+        with PROFILER.stage("recognize_batch"):
+            results = recognize_batch(crops)
+    except Exception:
+        # 批量识别失败（如引擎版本不兼容）时逐张识别
+        results = [None] * len(crops)
+    done = {}
+    for ri, entry, key, ci in cells:
+        name = entry["name"]
+        hit = done.get(ci)
+        if hit is None:
+            np_img, hit = crops[ci], results[ci]
+            if hit is None:
+                hit = _read_text(np_img, column=name, det_fallback=entry["det_fallback"])
+            elif not hit[0] and entry["det_fallback"]:
+                hit = det_fallback_text(np_img, name)
+            if entry["recheck"]:
+                hit = recheck_text(np_img, name, *hit)
+            done[ci] = hit
+            if key is not None and not hit[0].startswith("[ERROR]"):
+                crop_memo.put(key, *hit)
+        _set_cell(rows[ri], entry, *hit)
+    return rows
+
+
+def _group_size(n_rois: int, batch_size: int) -> int:
+    return max(1, batch_size // max(1, n_rois))
+
+
+# ---------- 多进程识别：每个子进程持有自己的 RapidOCR ----------
+_worker_plan: Optional[RoiPlan] = None
+_worker_roi_names: List[str] = []
+
+
+# 主进程中可能被命令行覆盖、需要同步到子进程的配置项
+_WORKER_SETTINGS = ("PROFILE", "DET_FALLBACK", "BATCH_SIZE", "PREPROCESS", "REGION_DECODE", "DECODE_GRAY",
+                    "ENGINE_SETTINGS", "CROP_MEMO", "CROP_MEMO_SIZE", "CROP_MEMO_DB",
+                    "RECHECK_THRESHOLD", "RECHECK_COLUMNS", "RECHECK_UPSCALE", "RECHECK_PAD", "RECHECK_DET", "PDF_DPI",
+                    "CONF_COLUMNS",
+                    "ALIGN", "ALIGN_WIDTH", "ALIGN_SCALES", "ALIGN_MIN_QUALITY", "ALIGN_MAX_SHIFT")
+
+
+def _runtime_settings() -> dict:
+    return {k: globals()[k] for k in _WORKER_SETTINGS}
+
+
+def _worker_init(use_det: bool, options: dict, plan: RoiPlan, roi_names: List[str], settings: dict):
+    global _worker_plan, _worker_roi_names, crop_memo
+    warnings.filterwarnings("ignore", message=r".*'pin_memory'.*")
+    _worker_plan = plan
+    _worker_roi_names = roi_names
+    globals().update({k: v for k, v in settings.items() if k in _WORKER_SETTINGS})
+    # fork 启动时不沿用父进程的切图记忆（含 SQLite 连接），按同步过来的设置重新创建
+    crop_memo = None
+    PROFILER.enabled = PROFILE
+    init_ocr(use_det, verbose=False, options=options)
+
+
+def _take_worker_stats():
+    memo = None
+    if crop_memo is not None:
+        crop_memo.flush()
+        memo = crop_memo.take_stats()
+    return take_fallback_stats(), (PROFILER.take() if PROFILER.enabled else None), memo
+
+
+def _merge_worker_stats(stats):
+    fallback, profile, memo = stats
+    merge_fallback_stats(fallback)
+    PROFILER.merge(profile)
+    if memo:
+        get_crop_memo().merge_stats(memo)
+
+
+def _worker_ocr_chunk(image_paths: List[str]):
+    rows = [ocr_image(p, _worker_plan, _worker_roi_names) for p in image_paths]
+    return rows, _take_worker_stats()
+
+
+def _worker_ocr_group(image_paths: List[str]):
+    rows = ocr_images_batched(image_paths, _worker_plan, _worker_roi_names)
+    return rows, _take_worker_stats()
+
+
+def run_ocr(all_images, rois, roi_names: List[str], workers: int = 1, batch_size: int = 0):
+    """按输入顺序逐张产出行结果；workers>1 时使用进程池并行识别，batch_size>0 时跨图片批量识别。
+
+    all_images 可以是列表，也可以是惰性迭代器（边扫描边识别），只在需要时才取下一条路径。
+    """
+    known = len(all_images) if isinstance(all_images, (list, tuple)) else None
+    paths = iter(all_images)
+    first = next(paths, None)
+    if first is None:
+        return
+    all_images = itertools.chain([first], paths)
+    # 启用检测模型时识别对象是检测框而非整块 ROI，批量路径不适用
+    batched = batch_size > 0 and not USE_DET
+    plan = as_plan(rois)
+    if workers <= 1:
+        if ocr_engine is None:
+            init_ocr(USE_DET)
+        # 读取线程预取：解码/预处理与识别重叠执行（PIL 解码与 ONNXRuntime 推理均会释放 GIL）
+        if PREFETCH_THREADS > 0:
+            items = prefetch_prepared(all_images, plan, PREFETCH_THREADS, PREFETCH_DEPTH)
+        else:
+            items = (_prepare_safe(p, plan) for p in all_images)
+        try:
+            if batched:
+                per_group = _group_size(len(plan.entries), batch_size)
+                while True:
+                    group = list(itertools.islice(items, per_group))
+                    if not group:
+                        break
+                    for row in recognize_prepared_batch(group, roi_names):
+                        yield row
+                return
+            for path, prepared, error in items:
+                yield recognize_prepared(path, prepared, roi_names, error)
+        finally:
+            items.close()
+        return
+    from ocr_session import describe
+    options = engine_options(workers)
+    print(f"🚀 启动 {workers} 个识别进程（每进程 ONNXRuntime：{describe(options)}）…", flush=True)
+    with multiprocessing.Pool(
+        processes=workers,
+        initializer=_worker_init,
+        initargs=(USE_DET, options, plan, roi_names, dict(_runtime_settings(), BATCH_SIZE=batch_size)),
+    ) as pool:
+        if batched:
+            size, fn = _group_size(len(plan.entries), batch_size), _worker_ocr_group
+        else:
+            # 小块分发：既减少进程间通信开销，又保证进度条平滑
+            size = max(1, min(16, known // (workers * 8) or 1)) if known else POOL_CHUNK
+            fn = _worker_ocr_chunk
+        # 主线程惰性取路径、按块提交，最多 workers*4 个块在途；按提交顺序取结果，输出行顺序与输入一致
+        window = deque()
+
+        def submit() -> bool:
+            chunk = list(itertools.islice(all_images, size))
+            if chunk:
+                window.append(pool.apply_async(fn, (chunk,)))
+            return bool(chunk)
+
+        for _ in range(workers * 4):
+            if not submit():
+                break
+        while window:
+            rows, stats = window.popleft().get()
+            submit()
+            _merge_worker_stats(stats)
+            for row in rows:
+                yield row
+
+
+def _engine_version() -> str:
+    try:
+        from importlib.metadata import version
+        return version("rapidocr_onnxruntime")
+    except Exception:
+        return ""
+
 
+def cache_settings(rois: List[dict], template=None, layout: Optional[list] = None) -> dict:
+    """参与缓存键的配置：ROI 与影响识别结果的引擎参数；启用模板对齐、二次识别时相应参数也计入。
 
-def main():
+    多模板时 rois 为各模板的 {name, rois}，template 为各模板图片路径，layout 为版式分类参数。"""
+    engine_version = _engine_version()
+    settings = {
+        "rois": rois,
+        "STRICT_ROI": STRICT_ROI,
+        "SMALL_ROI_MIN_HEIGHT": SMALL_ROI_MIN_HEIGHT,
+        "SMALL_ROI_MIN_WIDTH": SMALL_ROI_MIN_WIDTH,
+        "SMALL_ROI_UPSCALE": SMALL_ROI_UPSCALE,
+        "USE_DET": USE_DET,
+        "DECODE_GRAY": DECODE_GRAY,
+        "DET_FALLBACK": DET_FALLBACK,
+        "engine": engine_version,
+    }
+    if ALIGN and template:
+        names = os.path.basename(template) if isinstance(template, str) else [os.path.basename(t) for t in template]
+        settings["ALIGN"] = [names, ALIGN_WIDTH, list(ALIGN_SCALES), ALIGN_MIN_QUALITY, ALIGN_MAX_SHIFT]
+    if layout is not None:
+        settings["LAYOUT"] = layout
+    if RECHECK_THRESHOLD > 0:
+        settings["RECHECK"] = [RECHECK_THRESHOLD, RECHECK_COLUMNS, RECHECK_UPSCALE, RECHECK_PAD, RECHECK_DET]
+    # 置信度列随行缓存；开启前缓存的行没有得分，开启后不复用
+    if CONF_COLUMNS:
+        settings["CONF"] = True
+    return settings
+
+
+def _parse_args(argv: List[str]):
+    parser = argparse.ArgumentParser(description="按 ROI 批量识别图片并导出 CSV/XLSX（RapidOCR）")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="并行识别进程数（1 为单进程；0 表示按 CPU 核数自动）")
+    parser.add_argument("--det-fallback", default=DET_FALLBACK,
+                        help="识别为空时的检测回退：never（默认）/ always / 逗号分隔的列名")
+    parser.add_argument("--conf", action="store_true", default=CONF_COLUMNS,
+                        help="输出各列的识别得分 <列名>_conf（0~1）")
+    parser.add_argument("--recheck", type=float, default=RECHECK_THRESHOLD, metavar="THRESHOLD",
+                        help="得分低于该值的结果补白、放大并用检测+识别引擎再识别一次（0 关闭，建议 0.8~0.9）")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="跨图片批量识别的切图数（0 关闭，建议 64~256）")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false", default=USE_CACHE,
+                        help="不使用识别结果缓存，全部重新识别")
+    parser.add_argument("--stream", action="store_true", default=STREAM_OUTPUT,
+                        help="流式输出：逐行写入 CSV/XLSX，内存占用不随图片数增长")
+    parser.add_argument("--formats", default=OUTPUT_FORMATS,
+                        help="导出格式，逗号分隔：csv / xlsx / jsonl / parquet / feather（如 csv,parquet）")
+    parser.add_argument("--preprocess", choices=["numpy", "pil"], default=PREPROCESS,
+                        help="切图预处理实现（两者输出一致，numpy 更快）")
+    parser.add_argument("--input", default=None,
+                        help=f"图片目录（默认 {IMAGE_DIR}，递归扫描子目录）")
+    parser.add_argument("--include", action="append", default=list(INCLUDE_GLOBS),
+                        help="只处理匹配的文件（可多次指定；不含 / 时匹配文件名，否则匹配相对路径）")
+    parser.add_argument("--exclude", action="append", default=list(EXCLUDE_GLOBS),
+                        help="跳过匹配的文件或目录（可多次指定）")
+    parser.add_argument("--no-recursive", dest="recursive", action="store_false", default=RECURSIVE,
+                        help="只扫描图片目录本身，不进入子目录")
+    parser.add_argument("--file-list", default=FILE_LIST,
+                        help="从清单读取待处理文件（.txt 每行一个路径 / .csv 的 path 列 / .jsonl 的 path 字段）")
+    parser.add_argument("--shard", default="",
+                        help="多机分片 i/N（如 1/4）：按相对路径的稳定哈希只处理第 i 片，结果写入 ocr_result.shard-i-of-N.csv")
+    parser.add_argument("--merge", nargs="*", default=None, metavar="CSV",
+                        help="把分片 CSV 按相对路径排序合并为最终 CSV/XLSX 后退出（不指定文件时合并输出目录中的全部分片）")
+    parser.add_argument("--watch", action="store_true",
+                        help="监控模式：常驻运行，新到达的图片识别后追加到 CSV/XLSX")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH_THREADS,
+                        help="单进程时提前读取/解码/预处理图片的线程数（0 关闭）")
+    parser.add_argument("--prefetch-depth", type=int, default=PREFETCH_DEPTH,
+                        help="最多提前准备的图片数（限制内存占用）")
+    parser.add_argument("--align", action="store_true", default=ALIGN,
+                        help=f"按 ROI 配置的 template_image 对齐每张图片后再裁剪，明细写入输出目录的 {ALIGN_REPORT}")
+    parser.add_argument("--crop-memo", default=CROP_MEMO,
+                        help="切图记忆：像素相同的切图复用识别结果（always / never / 逗号分隔的列名）")
+    parser.add_argument("--crop-memo-db", default=CROP_MEMO_DB,
+                        help="切图记忆持久化文件（相对输出目录；空为只在内存中）")
+    parser.add_argument("--threads", default=None,
+                        help="ONNXRuntime 每个会话的线程数：auto / 整数 / -1（默认取 roi_config.json 的 engine 段或 ENGINE_THREADS）")
+    parser.add_argument("--inter-threads", default=None, help="会话间并行线程数（parallel 执行模式）：auto / 整数")
+    parser.add_argument("--graph-opt", choices=["all", "extended", "basic", "disable"], default=None,
+                        help="ONNXRuntime 图优化级别")
+    parser.add_argument("--mem-arena", choices=["on", "off"], default=None, help="ONNXRuntime CPU 内存池")
+    parser.add_argument("--exec-mode", choices=["sequential", "parallel"], default=None, help="ONNXRuntime 执行模式")
+    parser.add_argument("--tune", action="store_true",
+                        help="用样例图片校准会话参数，把最快的一组写回 roi_config.json 的 engine 段后退出")
+    parser.add_argument("--tune-images", type=int, default=TUNE_IMAGES, help="校准使用的样例图片数")
+    parser.add_argument("--profile", action="store_true", default=PROFILE,
+                        help=f"分阶段计时，结束时在输出目录写出 {PROFILE_JSON}")
+    parser.add_argument("--profile-prom", default=PROFILE_PROM,
+                        help="同时写出 Prometheus textfile 到该路径（需配合 --profile）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    global DET_FALLBACK, BATCH_SIZE, PREPROCESS, PROFILE, PREFETCH_THREADS, PREFETCH_DEPTH, ENGINE_SETTINGS
+    global CROP_MEMO, CROP_MEMO_DB, crop_memo, ALIGN, CONF_COLUMNS, RECHECK_THRESHOLD
+    args = _parse_args([] if argv is None else argv)
+    PREFETCH_THREADS, PREFETCH_DEPTH = max(0, args.prefetch), max(1, args.prefetch_depth)
+    PROFILE = PROFILER.enabled = bool(args.profile)
+    PROFILER.reset()
+    run_t0 = time.perf_counter()
+    DET_FALLBACK = args.det_fallback
+    ALIGN = bool(args.align)
+    CONF_COLUMNS = bool(args.conf)
+    RECHECK_THRESHOLD = max(0.0, float(args.recheck))
+    PREPROCESS = args.preprocess
+    BATCH_SIZE = max(0, args.batch_size)
+    workers = resolve_workers(args.workers)
     roi_path = ROI_CONFIG_PATH if os.path.isabs(ROI_CONFIG_PATH) else os.path.join(BASE_DIR, ROI_CONFIG_PATH)
-    images_dir = IMAGE_DIR if os.path.isabs(IMAGE_DIR) else os.path.join(BASE_DIR, IMAGE_DIR)
+    image_dir = args.input or IMAGE_DIR
+    images_dir = image_dir if os.path.isabs(image_dir) else os.path.join(BASE_DIR, image_dir)
     out_dir = OUTPUT_DIR if os.path.isabs(OUTPUT_DIR) else os.path.join(BASE_DIR, OUTPUT_DIR)
     os.makedirs(out_dir, exist_ok=True)
+    shard = None
+    if args.shard:
+        from ocr_shard import parse_shard
+        shard = parse_shard(args.shard)
+        if args.watch:
+            raise ValueError("监控模式不支持 --shard")
+    CROP_MEMO = args.crop_memo
+    memo_db = args.crop_memo_db
+    CROP_MEMO_DB = memo_db if not memo_db or os.path.isabs(memo_db) else os.path.join(out_dir, memo_db)
+    if crop_memo is not None:
+        crop_memo.close()
+    crop_memo = None
     out_csv = os.path.join(out_dir, OUTPUT_CSV) if not os.path.isabs(OUTPUT_CSV) else OUTPUT_CSV
     out_xlsx = os.path.join(out_dir, OUTPUT_XLSX) if not os.path.isabs(OUTPUT_XLSX) else OUTPUT_XLSX
+    cache_db = os.path.join(out_dir, CACHE_DB)
+    align_path = os.path.join(out_dir, ALIGN_REPORT)
+    profile_json = PROFILE_JSON if os.path.isabs(PROFILE_JSON) else os.path.join(out_dir, PROFILE_JSON)
+    from ocr_writers import parse_formats
+    outputs = output_paths(out_csv, out_xlsx, parse_formats(args.formats))
+    if shard is not None:
+        # 各分片只写出自己的 CSV（输出目录可能是多台机器共享的网络目录），其他格式由合并命令统一生成
+        from ocr_shard import shard_path
+        out_csv, cache_db, align_path, profile_json = (shard_path(p, shard) for p in (out_csv, cache_db, align_path, profile_json))
+        CROP_MEMO_DB = shard_path(CROP_MEMO_DB, shard)
+        out_xlsx = ""
+        outputs = {"csv": out_csv}
+
+    layouts = load_layouts(roi_path, images_dir)
+    multi = len(layouts) > 1
+    roi_names = layout_columns(layouts)
+    # 会话参数：ENGINE_* 常量 < roi_config.json 的 engine 段 < 命令行
+    cli_engine = {
+        "intra_op_num_threads": args.threads,
+        "inter_op_num_threads": args.inter_threads,
+        "graph_optimization_level": args.graph_opt,
+        "cpu_mem_arena": None if args.mem_arena is None else args.mem_arena == "on",
+        "execution_mode": args.exec_mode,
+    }
+    ENGINE_SETTINGS = dict(load_engine_config(roi_path), **{k: v for k, v in cli_engine.items() if v is not None})
+    columns = ["filename", RELPATH_COLUMN] + ([TEMPLATE_COLUMN] if multi else []) + with_conf(roi_names)
+    # 多模板时 XLSX 每个模板一个工作表，只含该模板的列
+    sheets = ({l["name"]: ["filename", RELPATH_COLUMN] + with_conf(l["roi_names"]) for l in layouts}
+              if multi and LAYOUT_SHEETS else None)
+    if args.merge is not None:
+        merge_outputs(args.merge, out_csv, outputs, columns, sheets)
+        return
+    if not args.file_list and not os.path.isdir(images_dir):
+        raise FileNotFoundError(f"图片目录不存在：{images_dir}")
+    if ALIGN:
+        for l in layouts:
+            if l["template"] is None:
+                print(f"[WARN] 未找到模板 {l['name']} 的 template_image 图片，该模板不做对齐", flush=True)
+            elif get_aligner(l["template"]) is not None:
+                print(f"📐 模板对齐：{l['template']}", flush=True)
+            else:
+                l["template"] = None
+    cache = None
+    if args.use_cache:
+        from ocr_cache import ResultCache, config_digest
+        if multi:
+            settings = cache_settings([{"name": l["name"], "rois": l["rois"]} for l in layouts],
+                                      [l["template"] for l in layouts if l["template"]],
+                                      [LAYOUT_MIN_SCORE, LAYOUT_ASPECT_TOL,
+                                       [os.path.basename(l["thumbnail"] or "") for l in layouts]])
+        else:
+            settings = cache_settings(layouts[0]["rois"], layouts[0]["template"])
+        cache = ResultCache(cache_db, config_digest(settings))
+    plan = compile_layouts(layouts)
+    if multi:
+        print(f"🗂️ 多模板：{', '.join(l['name'] for l in layouts)}（按版式分类路由，输出为各模板列的并集）", flush=True)
+    if args.tune:
+        from ocr_discovery import discover_images
+        samples = expand_inputs(discover_images(images_dir, file_list=args.file_list, include=args.include,
+                                                exclude=args.exclude, recursive=args.recursive))
+        tune_engine(samples, plan, roi_names, roi_path, workers, args.tune_images)
+        if cache is not None:
+            cache.close()
+        return
+    if args.watch:
+        try:
+            watch_folder(images_dir, plan, roi_names, columns, out_dir, out_csv, outputs, args, cache, sheets)
+        finally:
+            if cache is not None:
+                cache.close()
+        return
+
+    from ocr_discovery import discover_images
+    found = discover_images(
+        images_dir, file_list=args.file_list, include=args.include, exclude=args.exclude,
+        recursive=args.recursive, on_error=lambda e: print(f"[WARN] 无法读取目录: {e}", flush=True),
+    )
+    if shard is not None:
+        from ocr_shard import select_shard
+        found = select_shard(found, shard)
+        print(f"🧩 分片 {shard[0]}/{shard[1]}：只处理相对路径哈希落在本分片的图片，结果写入 {out_csv}", flush=True)
+    # 按文件分片后再展开多页文件：同一文件的各页由同一台机器处理
+    found = expand_inputs(found)
+    total = None
+    if args.file_list:
+        # 文件清单的条目数事先可知：展开为列表（只读多页文件的页数），进度条显示总数；
+        # 扫描目录时边扫描边识别，总数未知，进度条只计数
+        found = list(found)
+        total = len(found)
+    source = args.file_list or images_dir
+    print(f"📸 开始扫描 {source}（边扫描边识别）。ROIs: {', '.join(roi_names)}", flush=True)
+    counts = {"images": 0, "hits": 0}
+
+    writers = open_stream_writers(outputs, columns, sheets) if args.stream else []
+    sink = None
+    if writers and WRITE_QUEUE_DEPTH > 0:
+        from ocr_writers import BackgroundRowWriter
+        sink = BackgroundRowWriter(writers, WRITE_QUEUE_DEPTH)
+    results = []
+    rows = None
+    align_report = None
+    layout_counts = {}
+    if ALIGN and any(l["template"] for l in layouts):
+        from ocr_align import AlignReport
+        align_report = AlignReport(align_path, ["filename", RELPATH_COLUMN])
+    from tqdm import tqdm
+    progress = tqdm(total=total, desc="Processing", unit="张")
+
+    def emit(row):
+        progress.update(1)
+        if multi and row.get(TEMPLATE_COLUMN) is not None:
+            layout_counts[row[TEMPLATE_COLUMN]] = layout_counts.get(row[TEMPLATE_COLUMN], 0) + 1
+        if sink is not None:
+            with PROFILER.stage("write_stream"):
+                sink.write(row)
+        elif writers:
+            with PROFILER.stage("write_stream"):
+                for w in writers:
+                    w.write(row)
+        else:
+            results.append(row)
+
+    try:
+        rows = iter_rows(_timed_iter(found, "scan"), plan, roi_names, cache, workers, BATCH_SIZE,
+                         counts, align_report=align_report)
+        for row in rows:
+            emit(row)
+    finally:
+        progress.close()
+        if rows is not None:
+            rows.close()
+        if align_report is not None:
+            align_report.close()
+        if cache is not None:
+            PROFILER.count("cache_hits", cache.hits)
+            PROFILER.count("cache_misses", cache.misses)
+            cache.close()
+        if sink is not None:
+            try:
+                sink.join()
+            except Exception as e:
+                print(f"[WARN] 流式写出失败: {e}", flush=True)
+        if writers:
+            with PROFILER.stage("close_writers"):
+                close_stream_writers(writers)
+    print(f"📸 共 {counts['images']} 张图片", flush=True)
+    if cache is not None:
+        print(f"♻️ 缓存命中 {counts['hits']} 张，新识别 {counts['images'] - counts['hits']} 张", flush=True)
+    if layout_counts:
+        report_layouts(layout_counts, [l["name"] for l in layouts])
+    report_fallback_stats()
+    report_recheck_stats()
+    report_memo_stats()
+    if crop_memo is not None:
+        PROFILER.count("memo_lookups", crop_memo.stats["hits"] + crop_memo.stats["misses"])
+        crop_memo.close()
+    if not args.stream:
+        save_results(results, columns, outputs, sheets)
+    if PROFILER.enabled:
+        PROFILER.add("run", time.perf_counter() - run_t0)
+        write_profile_report(out_dir, args.profile_prom, json_path=profile_json, workers=workers,
+                             images=counts["images"])
+    if shard is not None:
+        print(f"🧩 全部 {shard[1]} 个分片完成后，用 --merge 合并为最终结果", flush=True)
+
+
+def expand_inputs(found):
+    """多页 TIFF/PDF 按页展开（惰性），每页输出一行，文件名为“文件名#页码”"""
+    from ocr_pages import expand_pages
+    return expand_pages(found, on_error=lambda path, e: print(f"[WARN] 无法读取页数: {path}（{e}）", flush=True))
+
+
+def report_layouts(counts: dict, names: List[str]):
+    parts = [f"{n} {counts[n]} 张" for n in names if counts.get(n)]
+    print(f"🗂️ 版式分类：{'，'.join(parts) or '无'}", flush=True)
+    if counts.get(""):
+        print(f"[WARN] {counts['']} 张图片不属于任何模板（{TEMPLATE_COLUMN} 列为空），"
+              f"可检查模板缩略图或调低 LAYOUT_MIN_SCORE", flush=True)
 
-    init_ocr(USE_DET)
 
-    rois, roi_names = load_roi_config(roi_path)
-    columns = ["filename"] + roi_names
+def iter_rows(found, plan: RoiPlan, roi_names: List[str], cache=None, workers: int = 1, batch_size: int = 0,
+              counts: Optional[dict] = None, align_report=None):
+    """对 (路径, 相对路径) 序列按输入顺序产出行（含相对路径列）：
+    缓存命中的直接取缓存，未命中的路径惰性交给 run_ocr 识别，识别结果写回缓存；
+    新识别图片的对齐结果写入 align_report（缓存命中的图片未重新对齐，不在其中）。"""
+    counts = {"images": 0, "hits": 0} if counts is None else counts
+    # 按输入顺序排队的条目：(路径, 相对路径, 内容哈希, 是否命中缓存)；run_ocr 按未命中条目的顺序产出行
+    queue = deque()
+
+    def pending_paths():
+        for path, rel in found:
+            counts["images"] += 1
+            digest, hit = None, False
+            if cache is not None:
+                with PROFILER.stage("cache_lookup"):
+                    try:
+                        if isinstance(path, PageRef):
+                            digest = page_digest(cache.content_hash(path.path), path, PDF_DPI)
+                        else:
+                            digest = cache.content_hash(path)
+                        hit = cache.contains(digest)
+                    except OSError:
+                        pass
+            queue.append((path, rel, digest, hit))
+            if hit:
+                counts["hits"] += 1
+            else:
+                yield path
+
+    def cached_rows():
+        # 队首连续的缓存命中条目
+        while queue and queue[0][3]:
+            path, rel, digest, _ = queue.popleft()
+            row = {"filename": source_name(path)}
+            row.update(cache.get(digest) or {})
+            if not CONF_COLUMNS:
+                # 旧版本不论是否开启都会缓存得分，未开启时去掉，行的列与新识别的一致
+                for name in roi_names:
+                    row.pop(conf_column(name), None)
+            row[RELPATH_COLUMN] = rel
+            yield row
+
+    rows = run_ocr(pending_paths(), plan, roi_names, workers, batch_size)
+    try:
+        for row in rows:
+            for cached in cached_rows():
+                yield cached
+            path, rel, digest, _ = queue.popleft()
+            align = row.pop("_align", None)
+            if align is not None and align_report is not None:
+                align_report.add({"filename": row["filename"], RELPATH_COLUMN: rel}, align)
+            if cache is not None and digest:
+                cache.put(digest, row)
+            row[RELPATH_COLUMN] = rel
+            yield row
+        for cached in cached_rows():
+            yield cached
+    finally:
+        rows.close()
+
+
+def watch_folder(images_dir: str, plan: RoiPlan, roi_names: List[str], columns: List[str], out_dir: str,
+                 out_csv: str, outputs: dict, args, cache=None, sheets: Optional[dict] = None):
+    """监控模式：常驻进程、引擎只初始化一次；新到达且写入完成的图片按批识别并追加到 CSV（每批落盘）。
+
+    XLSX 等其他格式不逐批整体读写（文件越大每批越慢），停止时由完整的 CSV 流式重新生成一次；
+    sheets 为 {模板名: 列} 时 XLSX 按 TEMPLATE_COLUMN 分工作表，与批量模式相同。
+    已处理的文件登记在 WATCH_STATE_DB 中，并与输出 CSV 已有的相对路径合并，重启后不会重复处理。
+    """
+    import signal
+    from ocr_watch import FolderWatcher, WatchLedger, output_relpaths
+    from ocr_writers import CsvRowWriter
+
     if not os.path.isdir(images_dir):
         raise FileNotFoundError(f"图片目录不存在：{images_dir}")
-    all_images = [
-        os.path.join(images_dir, f)
-        for f in os.listdir(images_dir)
-        if f.lower().endswith((".png", ".jpg", ".jpeg"))
+    ledger = WatchLedger(os.path.join(out_dir, WATCH_STATE_DB))
+    processed = ledger.paths() | output_relpaths(out_csv, RELPATH_COLUMN)
+    watcher = FolderWatcher(images_dir, include=args.include, exclude=args.exclude, recursive=args.recursive,
+                            settle=WATCH_SETTLE_SECONDS, poll_interval=WATCH_POLL_SECONDS, skip=processed)
+    csv_writer = CsvRowWriter(out_csv, columns, flush_every=1, append=True)
+    exports = {fmt: p for fmt, p in outputs.items() if fmt != "csv" and (fmt != "xlsx" or WATCH_XLSX)}
+    align_report = None
+    if ALIGN and any(p.template for p in getattr(plan, "plans", [plan])):
+        from ocr_align import AlignReport
+        align_report = AlignReport(os.path.join(out_dir, ALIGN_REPORT), ["filename", RELPATH_COLUMN], append=True)
+    init_ocr(USE_DET)
+    print(f"👀 监控 {images_dir}（{watcher.mode}），已处理 {len(processed)} 张；Ctrl+C 停止", flush=True)
+
+    def _stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _stop)
+    pending, last_arrival, total = [], 0.0, 0
+    try:
+        while True:
+            for path, rel in watcher.poll(timeout=WATCH_DEBOUNCE_SECONDS):
+                if rel in processed:
+                    continue
+                processed.add(rel)
+                pending.append((path, rel))
+                last_arrival = time.monotonic()
+            # 去抖：一阵集中到达的文件等安静下来（或攒满一批）后一起识别
+            if not pending or (len(pending) < WATCH_BATCH and time.monotonic() - last_arrival < WATCH_DEBOUNCE_SECONDS):
+                continue
+            batch, pending = pending[:WATCH_BATCH], pending[WATCH_BATCH:]
+            t0 = time.perf_counter()
+            rows = list(iter_rows(expand_inputs(batch), plan, roi_names, cache, 1, BATCH_SIZE, align_report=align_report))
+            for row in rows:
+                csv_writer.write(row)
+            csv_writer.flush()
+            ledger.mark(batch)
+            if cache is not None:
+                cache.commit()
+            if crop_memo is not None:
+                crop_memo.flush()
+            if align_report is not None:
+                align_report.flush()
+            total += len(rows)
+            print(f"📥 新增 {len(rows)} 张，用时 {time.perf_counter() - t0:.1f}s（本次累计 {total} 张，"
+                  f"等待写入完成 {watcher.waiting} 张）", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        csv_writer.close()
+        if exports and (total or not all(os.path.exists(p) for p in exports.values())):
+            try:
+                export_from_csv(out_csv, exports, columns, sheets)
+            except Exception as e:
+                print(f"[WARN] 由 CSV 生成 {', '.join(exports)} 失败: {e}（CSV 已写入 {out_csv}）", flush=True)
+        if align_report is not None:
+            align_report.close()
+        ledger.close()
+        report_fallback_stats()
+        report_recheck_stats()
+        report_memo_stats()
+        if crop_memo is not None:
+            crop_memo.close()
+        print(f"👋 监控已停止，本次共追加 {total} 张", flush=True)
+
+
+def tune_engine(found, plan: RoiPlan, roi_names: List[str], roi_path: str, workers: int = 1,
+                images: int = TUNE_IMAGES, rounds: int = 3) -> Optional[dict]:
+    """短时校准：在样例图片的切图上逐项比较会话参数（线程数 → 图优化级别 → 内存池 → 执行模式），
+    每项保留最快的取值，最后把结果写回 ROI 配置文件的 engine 段。多进程时线程数上限为每进程分得的核数。"""
+    from ocr_session import auto_threads, describe
+
+    samples = []
+    for path, _ in itertools.islice(found, max(1, images)):
+        _, prepared, error = _prepare_safe(path, plan)
+        if error is None:
+            # 校准时不用切图记忆，否则第二轮起全部命中
+            samples.append((path, [(dict(e, memo=False), p) for e, p in prepared], None))
+    if not samples:
+        print("[WARN] 没有可用于校准的图片", flush=True)
+        return None
+    batched = BATCH_SIZE > 0 and not USE_DET
+
+    def run_once():
+        if batched:
+            recognize_prepared_batch(samples, roi_names)
+        else:
+            for path, prepared, _ in samples:
+                recognize_prepared(path, prepared, roi_names)
+
+    measured = {}
+
+    def measure(opts: dict) -> float:
+        key = json.dumps(opts, sort_keys=True)
+        if key not in measured:
+            init_ocr(USE_DET, verbose=False, options=opts)
+            run_once()  # 预热（含首次推理与检测回退引擎的创建）
+            best = float("inf")
+            for _ in range(max(1, rounds)):
+                t0 = time.perf_counter()
+                run_once()
+                best = min(best, time.perf_counter() - t0)
+            measured[key] = best / len(samples)
+            print(f"   {measured[key] * 1000:8.1f} ms/张  {describe(opts)}", flush=True)
+        return measured[key]
+
+    per_worker = max(1, (os.cpu_count() or 1) // max(1, workers))
+    threads = [auto_threads(workers)] + sorted({t for t in (1, 2, 4, 8, 16, per_worker) if t <= per_worker})
+    stages = [
+        [{"intra_op_num_threads": t} for t in dict.fromkeys(threads)],
+        [{"graph_optimization_level": g} for g in ("all", "extended", "basic")],
+        [{"cpu_mem_arena": a} for a in (False, True)],
+        [{"execution_mode": "sequential", "inter_op_num_threads": 1 if workers > 1 else -1},
+         {"execution_mode": "parallel", "inter_op_num_threads": 2}],
     ]
-    print(f"📸 Found {len(all_images)} images. ROIs: {', '.join(roi_names)}", flush=True)
-    results = []
-    for img in tqdm(all_images, total=len(all_images), desc="Processing"):
-        results.append(ocr_image(img, rois, roi_names))
-    df = pd.DataFrame(results, columns=columns)
-    # 显式将 ROI 字段转为字符串，避免 Excel 将长数字转换为科学计数法
-    for col in roi_names:
-        try:
-            df[col] = df[col].astype(str)
-        except Exception:
-            pass
-    # 保存输出：先 CSV，后 Excel；Excel 失败时给出提示
+    print(f"🔧 校准 ONNXRuntime 会话参数：{len(samples)} 张样例图片，每组取 {rounds} 轮最快…", flush=True)
+    best = {k: v for k, v in engine_options(workers).items() if k not in ("det", "cls", "rec")}
+    try:
+        for candidates in stages:
+            current = measure(best)
+            for c in candidates:
+                trial = dict(best, **c)
+                # 至少快 3% 才换，避免计时噪声把参数带偏
+                if measure(trial) < current * 0.97:
+                    best, current = trial, measure(trial)
+    finally:
+        take_fallback_stats()
+        init_ocr(USE_DET, verbose=False)
+
+    result = dict(best)
+    # 与自动分配一致时保存为 auto，换进程数或机器后仍能自动适配
+    if result["intra_op_num_threads"] == auto_threads(workers):
+        result["intra_op_num_threads"] = "auto"
+    if result["inter_op_num_threads"] == (1 if workers > 1 else -1):
+        result["inter_op_num_threads"] = "auto"
     try:
-        df.to_csv(out_csv, index=False)
+        with open(roi_path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        engine = dict(cfg.get("engine") or {})
+        engine.update(result)
+        cfg["engine"] = engine
+        tmp = roi_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cfg, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, roi_path)
+        print(f"✅ 最快：{describe(best)}（{measure(best) * 1000:.1f} ms/张），已写入 {roi_path} 的 engine 段", flush=True)
     except Exception as e:
-        print(f"[WARN] CSV 保存失败: {e}", flush=True)
+        print(f"[WARN] 写回配置失败: {e}；最快参数：{json.dumps(result, ensure_ascii=False)}", flush=True)
+    return result
+
+
+def _timed_iter(items, stage: str):
+    """逐条计时地遍历迭代器（惰性扫描的耗时分摊在每张图片上）"""
+    it = iter(items)
+    while True:
+        with PROFILER.stage(stage):
+            item = next(it, None)
+        if item is None:
+            return
+        yield item
+
+
+def write_profile_report(out_dir: str, prom_path: str = "", json_path: str = "", **extra):
+    """写出分阶段计时报告（JSON，可选 Prometheus textfile），并打印耗时最多的几个阶段"""
+    from ocr_profile import write_json, write_prometheus
+    report = PROFILER.report(dict(extra, det_fallback=fallback_stats))
+    if not json_path:
+        json_path = PROFILE_JSON if os.path.isabs(PROFILE_JSON) else os.path.join(out_dir, PROFILE_JSON)
     try:
-        df.to_excel(out_xlsx, index=False)
-        print(f"\n🎉 All done! Results saved to {out_xlsx}", flush=True)
+        write_json(report, json_path)
+        print(f"⏱️ 分阶段计时报告：{json_path}", flush=True)
     except Exception as e:
-        print(f"[WARN] Excel 保存失败: {e}. 已生成 CSV: {out_csv}。如需 Excel，请安装 openpyxl 或检查路径权限。", flush=True)
+        print(f"[WARN] 计时报告保存失败: {e}", flush=True)
+    if prom_path:
+        try:
+            write_prometheus(report, prom_path)
+        except Exception as e:
+            print(f"[WARN] Prometheus textfile 保存失败: {e}", flush=True)
+    stages = [(k, v) for k, v in report["stages"].items() if k not in ("run", "image")]
+    for name, st in sorted(stages, key=lambda kv: -kv[1]["total"])[:6]:
+        p50 = (st["p50"] or 0) * 1000
+        print(f"   - {name}: 合计 {st['total']:.2f}s / {st['count']} 次，p50 {p50:.1f}ms", flush=True)
+
+
+def output_paths(out_csv: str, out_xlsx: str, formats: List[str]) -> dict:
+    """{格式: 路径}：csv / xlsx 为 OUTPUT_CSV / OUTPUT_XLSX，其余格式与 CSV 同名、换扩展名"""
+    from ocr_writers import FORMATS
+    stem = os.path.splitext(out_csv)[0]
+    paths = {}
+    for fmt in formats:
+        if fmt == "csv":
+            paths[fmt] = out_csv
+        elif fmt == "xlsx":
+            if out_xlsx:
+                paths[fmt] = out_xlsx
+        else:
+            paths[fmt] = stem + FORMATS[fmt]
+    return paths
+
+
+# 可选依赖缺失时的提示
+_FORMAT_HINTS = {
+    "xlsx": "如需 Excel，请安装 openpyxl。",
+    "parquet": "请安装 pyarrow：pip install pyarrow",
+    "feather": "请安装 pyarrow：pip install pyarrow",
+}
+
+
+def open_stream_writers(outputs: dict, columns: List[str], sheets: Optional[dict] = None) -> list:
+    """流式输出：按 {格式: 路径} 打开逐行写出器，内存占用不随图片数增长；
+    sheets 为 {模板名: 列} 时 XLSX 按模板分工作表。CSV 打不开时直接报错，其他格式给出提示后跳过"""
+    from ocr_writers import open_row_writer
+    writers = []
+    for fmt, path in outputs.items():
+        try:
+            writers.append(open_row_writer(fmt, path, columns, sheets=sheets, sheet_key=TEMPLATE_COLUMN,
+                                           flush_every=STREAM_FLUSH_EVERY))
+        except Exception as e:
+            if fmt == "csv":
+                raise
+            print(f"[WARN] {fmt} 写出不可用: {e}. 跳过 {path}。{_FORMAT_HINTS.get(fmt, '')}", flush=True)
+    if not writers:
+        raise RuntimeError(f"没有可用的导出格式：{', '.join(outputs)}")
+    return writers
+
+
+def close_stream_writers(writers: list):
+    saved = []
+    for w in writers:
+        try:
+            w.close()
+            saved.append(w.path)
+        except Exception as e:
+            print(f"[WARN] 保存 {w.path} 失败: {e}", flush=True)
+    if saved:
+        print(f"\n🎉 All done! Results saved to {', '.join(saved)}", flush=True)
+
+
+def merge_outputs(paths: List[str], out_csv: str, outputs: dict, columns: List[str], sheets: Optional[dict] = None):
+    """把各机器的分片 CSV 按相对路径排序合并为最终结果（外部排序后流式写出，不整体载入内存）"""
+    from ocr_shard import find_shards, merge_shards
+
+    paths = list(paths) if paths else find_shards(out_csv)
+    targets = {os.path.abspath(p) for p in outputs.values()}
+    if any(os.path.abspath(p) in targets for p in paths):
+        raise ValueError(f"合并输入中包含输出文件本身：{', '.join(outputs.values())}")
+    print(f"🧩 合并 {len(paths)} 个分片 → {', '.join(outputs.values())}", flush=True)
+    writers = open_stream_writers(outputs, columns, sheets)
+    n = 0
+    try:
+        for row in merge_shards(paths, RELPATH_COLUMN):
+            for w in writers:
+                w.write(row)
+            n += 1
+    finally:
+        close_stream_writers(writers)
+    print(f"📸 共 {n} 行", flush=True)
+
+
+def export_from_csv(csv_path: str, outputs: dict, columns: List[str], sheets: Optional[dict] = None):
+    """由结果 CSV 流式生成其他格式（监控模式停止时使用），耗时与内存只取决于总行数、与追加的批数无关"""
+    from ocr_writers import iter_csv_rows
+    print(f"📝 由 {csv_path} 生成 {', '.join(outputs.values())}", flush=True)
+    writers = open_stream_writers(outputs, columns, sheets)
+    try:
+        for row in iter_csv_rows(csv_path):
+            for w in writers:
+                w.write(row)
+    finally:
+        close_stream_writers(writers)
+
+
+def save_results(results: List[dict], columns: List[str], outputs: dict, sheets: Optional[dict] = None):
+    """非流式：识别结束后依次写出各格式（均逐行写出、所有列为文本，不经 pandas）；某一格式失败不影响其他格式"""
+    from ocr_writers import open_row_writer
+    saved = []
+    for fmt, path in outputs.items():
+        try:
+            with PROFILER.stage(f"export_{fmt}"):
+                writer = open_row_writer(fmt, path, columns, sheets=sheets, sheet_key=TEMPLATE_COLUMN,
+                                         flush_every=10000)
+                try:
+                    for row in results:
+                        writer.write(row)
+                finally:
+                    writer.close()
+            saved.append(path)
+        except Exception as e:
+            print(f"[WARN] {fmt} 保存失败: {e}. {_FORMAT_HINTS.get(fmt, '请检查路径权限。')}", flush=True)
+    if saved:
+        print(f"\n🎉 All done! Results saved to {', '.join(saved)}", flush=True)
 
 
 if __name__ == "__main__":
-    main()
+    multiprocessing.freeze_support()
+    main(sys.argv[1:])
@@ -0,0 +1,204 @@
+import os
+import time
+from collections import Counter
+from typing import Optional, Sequence
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from ocr_pages import open_source
+
+# 模板对齐：把每张图片与 roi_config.json 中 template_image 记录的模板做一次相位相关，
+# 估计平移与少量缩放，ROI 按该变换平移/缩放后再裁剪，避免轻微偏移的扫描件切不到文字而落入检测回退。
+# 全部在归一化坐标（0~1）下进行：图片与模板都缩放到同一个小网格（宽 ALIGN_WIDTH），
+# 因此与原图分辨率无关；JPEG 用 draft 直接按 1/2~1/8 解码，对齐本身只需几毫秒。
+
+
+class Alignment:
+    """模板归一化坐标 p → 图片归一化坐标：scale * (p - 0.5) + 0.5 + (dx, dy)"""
+
+    __slots__ = ("scale", "dx", "dy", "quality", "seconds", "status")
+
+    def __init__(self, scale=1.0, dx=0.0, dy=0.0, quality=0.0, seconds=0.0, status="ok"):
+        self.scale, self.dx, self.dy = scale, dx, dy
+        self.quality, self.seconds, self.status = quality, seconds, status
+
+    @property
+    def identity(self) -> bool:
+        return self.status != "ok" or (self.scale == 1.0 and self.dx == 0.0 and self.dy == 0.0)
+
+    def key(self):
+        return (round(self.scale, 4), round(self.dx, 5), round(self.dy, 5))
+
+    def apply(self, roi: dict) -> dict:
+        """变换归一化 ROI，并裁到图片范围内"""
+        if self.identity:
+            return roi
+        s = self.scale
+        x1 = s * (float(roi["x"]) - 0.5) + 0.5 + self.dx
+        y1 = s * (float(roi["y"]) - 0.5) + 0.5 + self.dy
+        x2, y2 = x1 + s * float(roi["w"]), y1 + s * float(roi["h"])
+        x1, y1 = max(0.0, min(1.0, x1)), max(0.0, min(1.0, y1))
+        x2, y2 = max(x1, min(1.0, x2)), max(y1, min(1.0, y2))
+        return dict(roi, x=x1, y=y1, w=x2 - x1, h=y2 - y1)
+
+    def as_dict(self, size=None) -> dict:
+        out = {
+            "align_status": self.status,
+            "align_quality": round(float(self.quality), 4),
+            "align_scale": round(float(self.scale), 4),
+            "align_dx": round(float(self.dx), 5),
+            "align_dy": round(float(self.dy), 5),
+            "align_ms": round(self.seconds * 1000.0, 2),
+        }
+        if size is not None:
+            out["align_dx_px"] = round(float(self.dx) * size[0], 1)
+            out["align_dy_px"] = round(float(self.dy) * size[1], 1)
+        return out
+
+
+def _small_gray(src, grid) -> np.ndarray:
+    """打开图片并缩放为 grid 大小的灰度图（JPEG 按最接近的 1/2^n 直接解码）；src 也可以是已解码的页面"""
+    with open_source(src) as im:
+        if im.format == "JPEG":
+            im.draft("L", grid)
+        g = im.convert("L")
+        if g.size != tuple(grid):
+            g = g.resize(grid, Image.BILINEAR, reducing_gap=2.0)
+    return g
+
+
+def _highpass(g: Image.Image, radius: float) -> np.ndarray:
+    # 去掉光照与底色的缓慢变化，只保留表格线与文字等结构
+    a = np.asarray(g, dtype=np.float32)
+    b = np.asarray(g.filter(ImageFilter.GaussianBlur(radius)), dtype=np.float32)
+    return a - b
+
+
+class TemplateAligner:
+    """预先计算模板在各个缩放比例下的频谱；align() 对每张图片只做一次 FFT"""
+
+    def __init__(self, template_path: str, width: int = 256, scales: Sequence[float] = (1.0,),
+                 min_quality: float = 0.05, max_shift: float = 0.1):
+        self.path = template_path
+        with Image.open(template_path) as im:
+            tw, th = im.size
+        width = max(32, int(width))
+        self.grid = (width, max(32, int(round(th * width / float(tw)))))
+        self.min_quality = min_quality
+        self.max_shift = max_shift
+        self._radius = max(2.0, width / 64.0)
+        self._window = np.outer(np.hanning(self.grid[1]), np.hanning(self.grid[0])).astype(np.float32)
+        base = _small_gray(template_path, self.grid)
+        fill = int(np.median(np.asarray(base)))
+        cx, cy = self.grid[0] / 2.0, self.grid[1] / 2.0
+        self.spectra = []
+        for s in sorted(set(float(x) for x in scales) | {1.0}):
+            if s == 1.0:
+                scaled = base
+            else:
+                # 内容以中心为基准缩放 s 倍：输出 (x, y) 取自模板 ((x - cx) / s + cx, (y - cy) / s + cy)
+                scaled = base.transform(self.grid, Image.AFFINE, (1 / s, 0, cx - cx / s, 0, 1 / s, cy - cy / s),
+                                        resample=Image.BILINEAR, fillcolor=fill)
+            self.spectra.append((s, np.conj(np.fft.rfft2(_highpass(scaled, self._radius) * self._window))))
+
+    def align(self, src) -> Alignment:
+        """src 为路径、二进制文件对象（读取后回到开头）或已解码的页面；读取失败时返回 status="error"（按原 ROI 裁剪）"""
+        t0 = time.perf_counter()
+        try:
+            g = _small_gray(src, self.grid)
+        except Exception:
+            return Alignment(status="error", seconds=time.perf_counter() - t0)
+        finally:
+            if hasattr(src, "seek"):
+                src.seek(0)
+        f = np.fft.rfft2(_highpass(g, self._radius) * self._window)
+        gw, gh = self.grid
+        best = None
+        for s, t in self.spectra:
+            r = f * t
+            r /= np.abs(r) + 1e-9
+            corr = np.fft.irfft2(r, s=(gh, gw))
+            iy, ix = np.unravel_index(int(np.argmax(corr)), corr.shape)
+            peak = float(corr[iy, ix])
+            if best is None or peak > best[0]:
+                best = (peak, s, corr, iy, ix)
+        peak, s, corr, iy, ix = best
+        # 抛物线插值得到亚像素峰值位置
+        dy = iy + _subpixel(corr[(iy - 1) % gh, ix], peak, corr[(iy + 1) % gh, ix])
+        dx = ix + _subpixel(corr[iy, (ix - 1) % gw], peak, corr[iy, (ix + 1) % gw])
+        dx = (dx + gw / 2.0) % gw - gw / 2.0
+        dy = (dy + gh / 2.0) % gh - gh / 2.0
+        # 不足 1/4 网格像素的偏移在噪声范围内，视为未偏移（与模板一致的图片保持原 ROI）
+        dx = 0.0 if abs(dx) < 0.25 else dx
+        dy = 0.0 if abs(dy) < 0.25 else dy
+        a = Alignment(s, dx / gw, dy / gh, peak)
+        if peak < self.min_quality:
+            a.status = "low_quality"
+        elif abs(a.dx) > self.max_shift or abs(a.dy) > self.max_shift:
+            a.status = "too_far"
+        a.seconds = time.perf_counter() - t0
+        return a
+
+
+def _subpixel(left: float, center: float, right: float) -> float:
+    denom = left - 2.0 * center + right
+    if denom >= 0:
+        return 0.0
+    return max(-0.5, min(0.5, 0.5 * (left - right) / denom))
+
+
+def resolve_template(cfg: dict, cfg_path: str, image_dir: Optional[str] = None,
+                     key: str = "template_image") -> Optional[str]:
+    """按 cfg[key]（默认 template_image）查找图片：绝对路径 → 配置文件所在目录 → 图片目录"""
+    name = cfg.get(key) if isinstance(cfg, dict) else None
+    if not name:
+        return None
+    candidates = [name] if os.path.isabs(name) else []
+    candidates.append(os.path.join(os.path.dirname(os.path.abspath(cfg_path)), name))
+    if image_dir:
+        candidates.append(os.path.join(image_dir, name))
+    for p in candidates:
+        if os.path.isfile(p):
+            return os.path.abspath(p)
+    return None
+
+
+REPORT_FIELDS = ("align_status", "align_quality", "align_scale", "align_dx_px", "align_dy_px", "align_ms")
+
+
+class AlignReport:
+    """逐张写出对齐结果（CSV），结束时打印耗时与质量汇总"""
+
+    def __init__(self, path: str, key_columns: Sequence[str] = ("filename",), append: bool = False):
+        from ocr_writers import CsvRowWriter
+
+        self.path = path
+        self.key_columns = list(key_columns)
+        self._w = CsvRowWriter(path, self.key_columns + list(REPORT_FIELDS), append=append)
+        self.ms = []
+        self.status = Counter()
+        self.poor = []
+
+    def add(self, keys: dict, info: dict):
+        self._w.write(dict(keys, **info))
+        self.ms.append(info.get("align_ms", 0.0))
+        self.status[info.get("align_status")] += 1
+        if info.get("align_status") != "ok" and len(self.poor) < 5:
+            self.poor.append(str(keys.get(self.key_columns[0], "")))
+
+    def flush(self):
+        self._w.flush()
+
+    def close(self):
+        self._w.close()
+        if not self.ms:
+            return
+        ms = sorted(self.ms)
+        p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+        print(f"📐 模板对齐 {len(ms)} 张：平均 {sum(ms) / len(ms):.1f} ms，p95 {p95:.1f} ms；明细 {self.path}", flush=True)
+        failed = len(ms) - self.status["ok"]
+        if failed:
+            detail = "，".join(f"{k} {v}" for k, v in self.status.items() if k != "ok")
+            print(f"[WARN] {failed} 张未能对齐（{detail}），按原 ROI 裁剪：{', '.join(self.poor)}"
+                  f"{' 等' if failed > len(self.poor) else ''}", flush=True)
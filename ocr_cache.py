@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Optional
+
+# 识别结果缓存（SQLite）：以“图片内容哈希 + 配置哈希”为键保存每张图片的识别行。
+# - 重跑时只识别新增或内容有变化的图片，其余直接从缓存取；
+# - 每识别若干张即提交一次，进程崩溃后重跑可从最后一次提交处继续。
+
+HASH_CHUNK = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    """图片内容哈希（与文件名、修改时间无关）"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def config_digest(settings: dict) -> str:
+    """配置哈希：ROI 与引擎参数任一变化都会使旧缓存失效"""
+    raw = json.dumps(settings, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, db_path: str, config_hash: str, commit_every: int = 32, commit_seconds: float = 2.0):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.config_hash = config_hash
+        self.commit_every = max(1, int(commit_every))
+        self.commit_seconds = commit_seconds
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " content_hash TEXT NOT NULL, config_hash TEXT NOT NULL, row_json TEXT NOT NULL,"
+            " created REAL NOT NULL, PRIMARY KEY (content_hash, config_hash))"
+        )
+        # 路径 → (大小, 修改时间, 内容哈希)：未改动的文件无需重新读取计算哈希
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, content_hash TEXT NOT NULL)"
+        )
+        self.conn.commit()
+
+    def content_hash(self, path: str) -> str:
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        cur = self.conn.execute("SELECT size, mtime_ns, content_hash FROM files WHERE path=?", (key,)).fetchone()
+        if cur and cur[0] == st.st_size and cur[1] == st.st_mtime_ns:
+            return cur[2]
+        digest = file_digest(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+            (key, st.st_size, st.st_mtime_ns, digest),
+        )
+        self._tick()
+        return digest
+
+    def contains(self, content_hash: str) -> bool:
+        cur = self.conn.execute(
+            "SELECT 1 FROM results WHERE content_hash=? AND config_hash=?",
+            (content_hash, self.config_hash),
+        ).fetchone()
+        if cur is None:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def get(self, content_hash: str) -> Optional[dict]:
+        cur = self.conn.execute(
+            "SELECT row_json FROM results WHERE content_hash=? AND config_hash=?",
+            (content_hash, self.config_hash),
+        ).fetchone()
+        if cur is None:
+            return None
+        try:
+            return json.loads(cur[0])
+        except Exception:
+            return None
+
+    def put(self, content_hash: str, row: dict):
+        """保存一行识别结果（不含 filename；同一内容不同文件名共用）；含错误的行不缓存，便于下次重试"""
+        data = {k: v for k, v in row.items() if k != "filename"}
+        if any(str(v).startswith("[ERROR]") for v in data.values()):
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (content_hash, config_hash, row_json, created) VALUES (?, ?, ?, ?)",
+            (content_hash, self.config_hash, json.dumps(data, ensure_ascii=False), time.time()),
+        )
+        self._tick()
+
+    def _tick(self):
+        self._pending += 1
+        if self._pending >= self.commit_every or time.monotonic() - self._last_commit >= self.commit_seconds:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def close(self):
+        try:
+            self.commit()
+        finally:
+            self.conn.close()
@@ -0,0 +1,144 @@
+import os
+import csv
+import json
+import fnmatch
+from typing import Iterator, List, Optional, Tuple
+
+# 输入发现：递归扫描图片目录（os.scandir，边扫边产出），或读取显式文件清单。
+# 产出 (绝对路径, 相对路径)；相对路径统一用 "/" 分隔，用于输出列、过滤规则与分片。
+
+# 多页 TIFF 与 PDF 由 ocr_pages 按页展开
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".pdf")
+
+
+def _match(rel: str, patterns: List[str]) -> bool:
+    """不含 "/" 的模式只匹配文件名，含 "/" 的模式匹配相对路径（fnmatch 规则，* 可跨目录）"""
+    name = rel.rsplit("/", 1)[-1]
+    for pat in patterns:
+        target = rel if "/" in pat else name
+        if fnmatch.fnmatch(target, pat) or fnmatch.fnmatch(target.lower(), pat.lower()):
+            return True
+    return False
+
+
+def dir_excluded(rel_dir: str, exclude: List[str]) -> bool:
+    # 目录名本身命中（如 "tmp"），或目录下任意文件都会命中（如 "*/tmp/*"）时，整个目录不再进入
+    return _match(rel_dir, exclude) or _match(rel_dir + "/\0", [p for p in exclude if "/" in p])
+
+
+def wanted(rel: str, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+           exts: Tuple[str, ...] = IMAGE_EXTS) -> bool:
+    if exts and not rel.lower().endswith(exts):
+        return False
+    if include and not _match(rel, include):
+        return False
+    if exclude and _match(rel, exclude):
+        return False
+    return True
+
+
+def scan_images(root: str, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                recursive: bool = True, exts: Tuple[str, ...] = IMAGE_EXTS, on_error=None) -> Iterator[Tuple[str, str]]:
+    """逐个产出 root 下的图片，不预先列出整棵目录树；目录按扫描顺序深度优先，被排除的目录不会进入"""
+    include, exclude = list(include or []), list(exclude or [])
+    root = os.path.abspath(root)
+    stack = [(root, "")]
+    while stack:
+        path, rel_dir = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive and not (exclude and dir_excluded(rel, exclude)):
+                                subdirs.append((entry.path, rel))
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    if wanted(rel, include, exclude, exts):
+                        yield entry.path, rel
+        except OSError as e:
+            if on_error is not None:
+                on_error(e)
+            continue
+        # 逆序压栈，使子目录按扫描顺序处理
+        stack.extend(reversed(subdirs))
+
+
+def _manifest_paths(manifest: str) -> Iterator[str]:
+    ext = os.path.splitext(manifest)[1].lower()
+    with open(manifest, "r", encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            lowered = [h.strip().lower() for h in header]
+            col = None
+            for key in ("path", "relative_path", "file", "filename"):
+                if key in lowered:
+                    col = lowered.index(key)
+                    break
+            if col is None:
+                # 无表头：第一行也是数据
+                col = 0
+                if header and header[0].strip():
+                    yield header[0].strip()
+            for rec in reader:
+                if len(rec) > col and rec[col].strip():
+                    yield rec[col].strip()
+            return
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if ext in (".jsonl", ".ndjson"):
+                try:
+                    obj = json.loads(line)
+                except Exception:
+                    continue
+                p = obj.get("path") if isinstance(obj, dict) else obj
+                if p:
+                    yield str(p)
+            else:
+                yield line
+
+
+def read_file_list(manifest: str, root: str, include: Optional[List[str]] = None,
+                   exclude: Optional[List[str]] = None) -> Iterator[Tuple[str, str]]:
+    """按清单顺序产出图片：支持 .txt（每行一个路径，# 开头为注释）、.csv（path 列或第一列）、.jsonl（path 字段）。
+    相对路径以 root 为基准；清单中的文件不按扩展名过滤。"""
+    root = os.path.abspath(root)
+    for p in _manifest_paths(manifest):
+        full = p if os.path.isabs(p) else os.path.join(root, p)
+        full = os.path.normpath(full)
+        try:
+            rel = os.path.relpath(full, root)
+        except ValueError:
+            # Windows 下不同盘符无法求相对路径
+            rel = full
+        if rel.startswith(".."):
+            rel = full
+        rel = rel.replace(os.sep, "/")
+        if wanted(rel, include, exclude, exts=()):
+            yield full, rel
+
+
+def discover_images(root: str, file_list: str = "", include: Optional[List[str]] = None,
+                    exclude: Optional[List[str]] = None, recursive: bool = True,
+                    on_error=None) -> Iterator[Tuple[str, str]]:
+    if file_list:
+        return read_file_list(file_list, root, include, exclude)
+    return scan_images(root, include, exclude, recursive, on_error=on_error)
+
+
+def first_image(root: str, **kwargs) -> Optional[str]:
+    """只找第一张图片（找到即停），用于判断目录是否为空"""
+    for path, _ in discover_images(root, **kwargs):
+        return path
+    return None
+
@@ -0,0 +1,97 @@
+import math
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ocr_pages import open_source
+
+# 版式分类：多模板配置下把每张图片路由到对应模板的 ROI 计划。
+# 先只读文件头取尺寸，按宽高比排除明显不符的模板；仍有多个候选时，
+# 再把图片解码为很小的灰度缩略图（JPEG 用 draft 按 1/8 直接解码），与各模板缩略图做归一化相关。
+# 每张图片只需几毫秒，相对识别可以忽略。
+
+THUMB_GRID = (32, 32)
+
+
+def thumb_signature(src, grid: Tuple[int, int] = THUMB_GRID) -> Tuple[Tuple[int, int], np.ndarray]:
+    """返回 (原图尺寸, 零均值单位长度的缩略图向量)；src 为路径、二进制文件对象或已解码的页面"""
+    with open_source(src) as im:
+        size = im.size
+        if im.format == "JPEG":
+            im.draft("L", (grid[0] * 4, grid[1] * 4))
+        g = im.convert("L").resize(grid, Image.BILINEAR, reducing_gap=2.0)
+    v = np.asarray(g, dtype=np.float32).ravel()
+    v = v - v.mean()
+    n = float(np.linalg.norm(v))
+    return size, (v / n if n > 0 else v)
+
+
+class LayoutMatch:
+    __slots__ = ("index", "score", "method", "seconds")
+
+    def __init__(self, index: Optional[int], score: float, method: str, seconds: float = 0.0):
+        self.index, self.score, self.method, self.seconds = index, score, method, seconds
+
+
+class LayoutClassifier:
+    """refs 为各模板的 (template_size 或 None, 参考缩略图路径或 None)，顺序即模板序号"""
+
+    def __init__(self, refs: Sequence[tuple], min_score: float = 0.5, aspect_tol: float = 0.05,
+                 grid: Tuple[int, int] = THUMB_GRID):
+        self.min_score = min_score
+        self.aspect_tol = aspect_tol
+        self.grid = tuple(grid)
+        self.sizes: List[Optional[Tuple[int, int]]] = []
+        self.signatures: List[Optional[np.ndarray]] = []
+        for size, thumb in refs:
+            sig = None
+            if thumb:
+                try:
+                    thumb_size, sig = thumb_signature(thumb, self.grid)
+                    size = size or thumb_size
+                except Exception as e:
+                    print(f"[WARN] 参考缩略图无法读取: {thumb}（{e}）", flush=True)
+            self.sizes.append(tuple(size) if size else None)
+            self.signatures.append(sig)
+
+    def _aspect_candidates(self, size) -> List[int]:
+        aspect = size[0] / float(max(1, size[1]))
+        out = []
+        for i, ref in enumerate(self.sizes):
+            if ref is None or abs(math.log(aspect / (ref[0] / float(max(1, ref[1]))))) <= self.aspect_tol:
+                out.append(i)
+        return out
+
+    def classify(self, src) -> LayoutMatch:
+        """index 为匹配的模板序号，缩略图相关系数低于 min_score 时为 None（不属于任何模板）"""
+        t0 = time.perf_counter()
+        try:
+            match = self._classify(src)
+        finally:
+            if hasattr(src, "seek"):
+                src.seek(0)
+        match.seconds = time.perf_counter() - t0
+        return match
+
+    def _classify(self, src) -> LayoutMatch:
+        if len(self.sizes) == 1:
+            return LayoutMatch(0, 1.0, "single")
+        with open_source(src) as im:
+            size = im.size
+        if hasattr(src, "seek"):
+            src.seek(0)
+        cands = self._aspect_candidates(size) or list(range(len(self.sizes)))
+        if len(cands) == 1:
+            return LayoutMatch(cands[0], 1.0, "aspect")
+        with_sig = [i for i in cands if self.signatures[i] is not None]
+        if with_sig:
+            _, sig = thumb_signature(src, self.grid)
+            score, best = max((float(np.dot(sig, self.signatures[i])), i) for i in with_sig)
+            return LayoutMatch(best if score >= self.min_score else None, score, "thumbnail")
+        # 没有参考缩略图：取面积最接近的模板
+        area = math.log(max(1, size[0] * size[1]))
+        best = min(cands, key=lambda i: abs(area - math.log(max(1, self.sizes[i][0] * self.sizes[i][1])))
+                   if self.sizes[i] else float("inf"))
+        return LayoutMatch(best, 0.0, "size")
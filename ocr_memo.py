@@ -0,0 +1,132 @@
+import os
+import time
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# 切图记忆：同一张表单上重复出现的内容（相同的日期、网点编号、空白框）预处理后像素完全相同，
+# 以预处理后切图像素的哈希为键缓存识别文本与得分，命中时跳过 ONNX 推理。
+# 进程内为有上限的 LRU；可选持久化到 SQLite，下次运行时预先载入最近使用的条目。
+
+
+def crop_key(np_img, det_fallback: bool = False, variant: str = "") -> bytes:
+    """切图像素（含形状与类型）的 128 位 BLAKE2b 摘要；是否允许检测回退、二次识别参数（variant）会影响结果，也计入键"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{np_img.shape}|{np_img.dtype}|{int(bool(det_fallback))}".encode())
+    if variant:
+        h.update(f"|{variant}".encode())
+    h.update(np_img.data if np_img.flags.c_contiguous else np_img.tobytes())
+    return h.digest()
+
+
+def _new_stats() -> dict:
+    return {"hits": 0, "misses": 0, "evictions": 0, "by_column": {}}
+
+
+class CropMemo:
+    """有上限的 LRU：键为 crop_key()，值为 (识别文本, 得分)；namespace 不同（引擎或模型变化）的持久化条目不会载入"""
+
+    def __init__(self, capacity: int = 4096, db_path: str = "", namespace: str = ""):
+        self.capacity = max(1, int(capacity))
+        self.namespace = namespace
+        self._data: "OrderedDict[bytes, Tuple[str, Optional[float]]]" = OrderedDict()
+        self._pending: Dict[bytes, Tuple[str, Optional[float]]] = {}
+        self.stats = _new_stats()
+        self.conn = None
+        if db_path:
+            try:
+                self._open(db_path)
+            except Exception as e:
+                print(f"[WARN] 切图记忆持久化不可用: {e}（仅在内存中缓存）", flush=True)
+                self.conn = None
+
+    def _open(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS crops ("
+            " key BLOB NOT NULL, namespace TEXT NOT NULL, text TEXT NOT NULL, used REAL NOT NULL,"
+            " score REAL, PRIMARY KEY (key, namespace))"
+        )
+        # 旧版文件没有得分列：补上后旧条目的得分为空
+        if "score" not in {r[1] for r in self.conn.execute("PRAGMA table_info(crops)")}:
+            self.conn.execute("ALTER TABLE crops ADD COLUMN score REAL")
+        self.conn.commit()
+        rows = self.conn.execute(
+            "SELECT key, text, score FROM crops WHERE namespace = ? ORDER BY used DESC LIMIT ?",
+            (self.namespace, self.capacity),
+        ).fetchall()
+        # 最近使用的放在 LRU 末尾
+        for key, text, score in reversed(rows):
+            self._data[bytes(key)] = (text, score)
+
+    def record(self, column: Optional[str], hit: bool):
+        self.stats["hits" if hit else "misses"] += 1
+        col = self.stats["by_column"].setdefault(column or "", [0, 0])
+        col[0 if hit else 1] += 1
+
+    def get(self, key: bytes, column: Optional[str] = None) -> Optional[Tuple[str, Optional[float]]]:
+        """命中时返回 (文本, 得分)，旧版持久化条目的得分为 None"""
+        hit = self._data.get(key)
+        if hit is None:
+            self.record(column, False)
+            return None
+        self._data.move_to_end(key)
+        self.record(column, True)
+        return hit
+
+    def put(self, key: bytes, text: str, score: Optional[float] = None):
+        self._data[key] = (text, score)
+        self._data.move_to_end(key)
+        while len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+            self.stats["evictions"] += 1
+        if self.conn is not None:
+            self._pending[key] = (text, score)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def flush(self):
+        """把新增条目写入持久化文件（每处理完一批调用一次）"""
+        if self.conn is None or not self._pending:
+            return
+        now = time.time()
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO crops (key, namespace, text, score, used) VALUES (?, ?, ?, ?, ?)",
+                    [(k, self.namespace, t, s, now) for k, (t, s) in self._pending.items()],
+                )
+                # 持久化文件同样有上限：只保留最近使用的条目
+                self.conn.execute(
+                    "DELETE FROM crops WHERE namespace = ? AND key NOT IN "
+                    "(SELECT key FROM crops WHERE namespace = ? ORDER BY used DESC LIMIT ?)",
+                    (self.namespace, self.namespace, self.capacity),
+                )
+        except sqlite3.Error as e:
+            print(f"[WARN] 切图记忆写入失败: {e}", flush=True)
+        self._pending.clear()
+
+    def take_stats(self) -> dict:
+        """取出并清零命中统计（多进程时由主进程汇总）"""
+        snap, self.stats = self.stats, _new_stats()
+        return snap
+
+    def merge_stats(self, snap: Optional[dict]):
+        if not snap:
+            return
+        for k in ("hits", "misses", "evictions"):
+            self.stats[k] += snap.get(k, 0)
+        for name, (h, m) in snap.get("by_column", {}).items():
+            col = self.stats["by_column"].setdefault(name, [0, 0])
+            col[0] += h
+            col[1] += m
+
+    def close(self):
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,150 @@
+import os
+import contextlib
+from typing import Iterator, Optional, Tuple
+
+from PIL import Image
+
+# 多页输入：多页 TIFF 与 PDF 按页惰性展开，每页作为一条输入送入 ROI 识别流程，
+# 输出行的文件名为 "文件名#页码"（页码从 1 开始）。不再需要先拆成临时 JPEG；
+# 只在识别到某一页时才解码该页，任一时刻每个识别线程只有一页在内存中。
+# PDF 优先用 pypdfium2 按 PDF_DPI 渲染；未安装时用纯 Python 的 pypdf 取出页面内嵌的扫描图片（适用于扫描件 PDF）。
+
+PAGE_SEP = "#"
+MULTIPAGE_EXTS = (".tif", ".tiff", ".pdf")
+
+
+class PageRef:
+    """多页文件中的一页：path 为文件路径，page 为页码（从 1 开始）；可传给子进程"""
+
+    __slots__ = ("path", "page")
+
+    def __init__(self, path: str, page: int):
+        self.path, self.page = path, int(page)
+
+    @property
+    def name(self) -> str:
+        return f"{os.path.basename(self.path)}{PAGE_SEP}{self.page}"
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.path.lower().endswith(".pdf")
+
+    def __repr__(self):
+        return f"PageRef({self.path!r}, {self.page})"
+
+
+def source_name(src) -> str:
+    """输出行的文件名：多页文件的一页为 "文件名#页码"，其余为文件名"""
+    return src.name if isinstance(src, PageRef) else os.path.basename(src)
+
+
+def open_source(src):
+    """代替 Image.open：src 为已解码的页面（PIL 图像）时直接使用、退出时不关闭，否则按路径或文件对象打开"""
+    return contextlib.nullcontext(src) if isinstance(src, Image.Image) else Image.open(src)
+
+
+def _pdfium():
+    try:
+        import pypdfium2
+        return pypdfium2
+    except Exception:
+        return None
+
+
+def _pypdf():
+    try:
+        import pypdf
+        return pypdf
+    except Exception:
+        return None
+
+
+def page_count(path: str) -> int:
+    """页数：TIFF 只读各页的文件头（不解码像素），PDF 只解析页目录"""
+    if not path.lower().endswith(".pdf"):
+        with Image.open(path) as im:
+            return int(getattr(im, "n_frames", 1) or 1)
+    pdfium = _pdfium()
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    pypdf = _pypdf()
+    if pypdf is not None:
+        return len(pypdf.PdfReader(path).pages)
+    raise RuntimeError("读取 PDF 需要安装 pypdfium2（pip install pypdfium2）或 pypdf（仅扫描件，pip install pypdf）")
+
+
+def _as_pipeline_mode(im: Image.Image) -> Image.Image:
+    # 转为独立的 L/RGB 图像（与文件脱离，可随即关闭文件）；1 位黑白页转 L，放大小 ROI 时才能用高质量插值
+    if im.mode in ("1", "L", "I", "I;16", "F"):
+        return im.convert("L")
+    return im.convert("RGB")
+
+
+def _render_pdf(path: str, page: int, dpi: int) -> Image.Image:
+    pdfium = _pdfium()
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            p = pdf[page - 1]
+            try:
+                bitmap = p.render(scale=dpi / 72.0)
+                try:
+                    return _as_pipeline_mode(bitmap.to_pil())
+                finally:
+                    bitmap.close()
+            finally:
+                p.close()
+        finally:
+            pdf.close()
+    pypdf = _pypdf()
+    if pypdf is None:
+        raise RuntimeError("读取 PDF 需要安装 pypdfium2（pip install pypdfium2）或 pypdf（仅扫描件，pip install pypdf）")
+    # 纯 Python：取页面中面积最大的内嵌图片（扫描件每页通常就是一张整页图片）
+    images = list(pypdf.PdfReader(path).pages[page - 1].images)
+    if not images:
+        raise RuntimeError(f"第 {page} 页没有内嵌图片，渲染矢量页面需要安装 pypdfium2")
+    best = max(images, key=lambda i: i.image.size[0] * i.image.size[1])
+    return _as_pipeline_mode(best.image)
+
+
+def load_page(ref: PageRef, dpi: int = 200) -> Image.Image:
+    """解码一页，返回与文件脱离的 L/RGB 图像"""
+    if ref.is_pdf:
+        return _render_pdf(ref.path, ref.page, dpi)
+    with Image.open(ref.path) as im:
+        im.seek(ref.page - 1)
+        return _as_pipeline_mode(im)
+
+
+def expand_pages(found, on_error=None) -> Iterator[Tuple[object, str]]:
+    """(路径, 相对路径) 序列中的多页 TIFF 与 PDF 展开为 (PageRef, "相对路径#页码")，其余原样产出（惰性）。
+
+    单页 TIFF 仍按普通图片处理（可局部解码）；页数读取失败时原样产出，由识别流程记为出错行。
+    """
+    for path, rel in found:
+        if not rel.lower().endswith(MULTIPAGE_EXTS):
+            yield path, rel
+            continue
+        try:
+            n = page_count(path)
+        except Exception as e:
+            if on_error is not None:
+                on_error(path, e)
+            yield path, rel
+            continue
+        if n <= 1 and not path.lower().endswith(".pdf"):
+            yield path, rel
+            continue
+        for page in range(1, n + 1):
+            yield PageRef(path, page), f"{rel}{PAGE_SEP}{page}"
+
+
+def page_digest(content_hash: str, ref: Optional[PageRef], dpi: int = 200) -> str:
+    """缓存键：文件内容哈希 + 页码（PDF 另含渲染分辨率）"""
+    if ref is None:
+        return content_hash
+    return f"{content_hash}{PAGE_SEP}{ref.page}" + (f"@{dpi}" if ref.is_pdf else "")
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import contextlib
+from typing import Optional
+
+# 分阶段计时：解码、裁剪、放大、增强、识别、检测回退、导出等各阶段的耗时与次数。
+# 关闭时 stage() 直接返回空上下文，热路径上几乎没有额外开销。
+
+QUANTILES = (50, 95, 99)
+_NULL = contextlib.nullcontext()
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def _summary(values) -> dict:
+    s = sorted(values)
+    out = {"count": len(s), "total": sum(s)}
+    for p in QUANTILES:
+        out[f"p{p}"] = _percentile(s, p)
+    return out
+
+
+class _Timer:
+    __slots__ = ("prof", "name", "column", "t0")
+
+    def __init__(self, prof, name, column):
+        self.prof, self.name, self.column = prof, name, column
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.prof.add(self.name, time.perf_counter() - self.t0, self.column)
+        return False
+
+
+class StageProfiler:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.stages = {}       # 阶段 → [耗时秒]
+        self.columns = {}      # 列名 → {阶段 → [耗时秒]}
+        self.counters = {}
+
+    def stage(self, name: str, column: Optional[str] = None):
+        """with PROFILER.stage("decode"): ...；未启用时为空操作"""
+        if not self.enabled:
+            return _NULL
+        return _Timer(self, name, column)
+
+    def add(self, name: str, seconds: float, column: Optional[str] = None):
+        if not self.enabled:
+            return
+        self.stages.setdefault(name, []).append(seconds)
+        if column is not None:
+            self.columns.setdefault(column, {}).setdefault(name, []).append(seconds)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def take(self) -> dict:
+        """取出并清零本进程的计时数据（多进程时由主进程汇总）"""
+        snap = {"stages": self.stages, "columns": self.columns, "counters": self.counters}
+        self.reset()
+        return snap
+
+    def merge(self, snap: Optional[dict]):
+        if not snap:
+            return
+        for name, values in snap.get("stages", {}).items():
+            self.stages.setdefault(name, []).extend(values)
+        for col, stages in snap.get("columns", {}).items():
+            dst = self.columns.setdefault(col, {})
+            for name, values in stages.items():
+                dst.setdefault(name, []).extend(values)
+        for name, n in snap.get("counters", {}).items():
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self, extra: Optional[dict] = None) -> dict:
+        data = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "stages": {k: _summary(v) for k, v in self.stages.items()},
+            "columns": {c: {k: _summary(v) for k, v in st.items()} for c, st in self.columns.items()},
+            "counters": dict(self.counters),
+        }
+        if extra:
+            data.update(extra)
+        return data
+
+
+def write_json(report: dict, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def write_prometheus(report: dict, path: str, prefix: str = "ocr"):
+    """写出 node_exporter textfile 采集器格式（先写临时文件再替换，避免采集到半个文件）"""
+    lines = [
+        f"# HELP {prefix}_stage_seconds Per-stage latency of the OCR pipeline.",
+        f"# TYPE {prefix}_stage_seconds summary",
+    ]
+    for stage, s in sorted(report.get("stages", {}).items()):
+        for p in QUANTILES:
+            if s.get(f"p{p}") is not None:
+                lines.append(f'{prefix}_stage_seconds{{stage="{_label(stage)}",quantile="{p / 100:g}"}} {s[f"p{p}"]:.6f}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{_label(stage)}"}} {s["total"]:.6f}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{_label(stage)}"}} {s["count"]}')
+    lines += [
+        f"# HELP {prefix}_column_stage_seconds_sum Per-column time spent in each stage.",
+        f"# TYPE {prefix}_column_stage_seconds_sum gauge",
+    ]
+    for col, stages in sorted(report.get("columns", {}).items()):
+        for stage, s in sorted(stages.items()):
+            lines.append(
+                f'{prefix}_column_stage_seconds_sum{{column="{_label(col)}",stage="{_label(stage)}"}} {s["total"]:.6f}'
+            )
+    lines += [f"# TYPE {prefix}_events_total counter"]
+    for name, n in sorted(report.get("counters", {}).items()):
+        lines.append(f'{prefix}_events_total{{event="{_label(name)}"}} {n}')
+    fb = report.get("det_fallback") or {}
+    if fb:
+        lines += [f"# TYPE {prefix}_det_fallback_total counter"]
+        for col, d in sorted(fb.get("by_column", {}).items()):
+            lines.append(f'{prefix}_det_fallback_total{{column="{_label(col)}",result="text"}} {d["hits"]}')
+            lines.append(f'{prefix}_det_fallback_total{{column="{_label(col)}",result="empty"}} {d["calls"] - d["hits"]}')
+    tmp = path + ".tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+PROFILER = StageProfiler()
@@ -0,0 +1,365 @@
+import os
+import io
+import sys
+import csv
+import json
+import time
+import signal
+import socket
+import base64
+import argparse
+import threading
+import http.client
+import socketserver
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 常驻识别服务：启动时加载一次识别引擎（及检测回退引擎），之后每个请求只做解码与识别，
+# 适合大量 5~20 张的小任务。仅监听本机（127.0.0.1 或 Unix 套接字）。
+#
+#   启动服务： python ocr_server.py serve [--port 8765] [--unix /tmp/ocr.sock] [--config 名称=路径 ...]
+#   客户端：   python ocr_server.py ocr 图片1 图片2 ... [--config 名称] [--upload] [--csv 结果.csv]
+#   健康检查： python ocr_server.py health
+#
+# 客户端只依赖标准库，不会导入 pandas / onnxruntime，启动开销可忽略。
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CONFIG = "default"
+MAX_BODY = 64 << 20          # 单个请求体上限（字节）
+
+
+class ConfigRegistry:
+    """ROI 配置 id → 编译好的执行计划；配置文件修改后下次请求自动重新加载"""
+
+    def __init__(self, ocr, paths: dict):
+        self.ocr = ocr
+        self.paths = dict(paths)
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def ids(self):
+        return sorted(self.paths)
+
+    def get(self, config_id: str):
+        path = self.paths.get(config_id)
+        if path is None:
+            raise KeyError(f"未知的 ROI 配置：{config_id}（可用：{', '.join(self.ids())}）")
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cur = self._loaded.get(config_id)
+            if cur is None or cur[0] != mtime:
+                # 多模板配置按版式分类路由，行中带模板列，ROI 列为各模板的并集
+                layouts = self.ocr.load_layouts(path)
+                plan = self.ocr.compile_layouts(layouts)
+                cur = self._loaded[config_id] = (mtime, plan, self.ocr.layout_columns(layouts))
+        return cur[1], cur[2]
+
+
+class OcrService:
+    def __init__(self, ocr, registry: ConfigRegistry):
+        self.ocr = ocr
+        self.registry = registry
+        self.started = time.time()
+        self.requests = 0
+        # 解码与预处理可在请求线程中并行，识别引擎同一时刻只服务一个请求
+        self._engine_lock = threading.Lock()
+
+    def recognize(self, src, name: str, config_id: str) -> dict:
+        plan, roi_names = self.registry.get(config_id)
+        try:
+            prepared, error = self.ocr.prepare_rois(src, plan, name=name), None
+        except Exception as e:
+            prepared, error = [], e
+        with self._engine_lock:
+            row = self.ocr.recognize_prepared(name, prepared, roi_names, error)
+        # 启用模板对齐时，对齐结果作为 align_* 字段附在行后
+        row.update(row.pop("_align", None) or {})
+        return row
+
+    def _expand(self, path: str) -> list:
+        """路径 → [(输入, 行文件名)]：多页 TIFF/PDF 与批量命令行一样按页展开，文件名为 "文件名#页码" """
+        return [(src, self.ocr.source_name(src)) for src, _ in self.ocr.expand_inputs([(path, os.path.basename(path))])]
+
+    @staticmethod
+    def _check_upload(data: bytes, filename: str):
+        """上传的字节只支持单页图片：PDF 与多页 TIFF 需按路径提交（服务端按页展开）"""
+        if data[:5] == b"%PDF-":
+            raise ValueError(f"{filename}：PDF 请按路径提交（path/paths），服务端按页识别")
+        if data[:4] in (b"II*\x00", b"MM\x00*"):
+            from PIL import Image
+            try:
+                with Image.open(io.BytesIO(data)) as im:
+                    n = int(getattr(im, "n_frames", 1) or 1)
+            except Exception:
+                return
+            if n > 1:
+                raise ValueError(f"{filename}：多页 TIFF（{n} 页）请按路径提交（path/paths），服务端按页识别")
+
+    def handle(self, payload: dict):
+        """payload: {"path": ...} / {"paths": [...]} / {"image_b64": ..., "filename": ...}，可带 "config"。
+
+        "paths" 返回行列表，多页文件每页一行；"path" 为单页图片时返回一行，为多页文件时返回该文件各页的行列表。
+        """
+        self.requests += 1
+        config_id = payload.get("config") or DEFAULT_CONFIG
+        if "paths" in payload:
+            return [self.recognize(src, name, config_id) for p in payload["paths"] for src, name in self._expand(p)]
+        if "path" in payload:
+            p = payload["path"]
+            pages = self._expand(p)
+            if len(pages) == 1 and not isinstance(pages[0][0], self.ocr.PageRef):
+                return self.recognize(p, os.path.basename(p), config_id)
+            return [self.recognize(src, name, config_id) for src, name in pages]
+        if "image_b64" in payload or "image_bytes" in payload:
+            data = payload.get("image_bytes") or base64.b64decode(payload["image_b64"])
+            filename = payload.get("filename") or "upload"
+            self._check_upload(data, filename)
+            return self.recognize(io.BytesIO(data), filename, config_id)
+        raise ValueError("请求需包含 path、paths 或 image_b64")
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "configs": self.registry.ids(),
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: OcrService = None
+    verbose = False
+
+    def address_string(self):
+        # Unix 套接字的 client_address 为空字符串
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, fmt, *args):
+        if self.verbose:
+            super().log_message(fmt, *args)
+
+    def _send(self, code: int, obj, elapsed=None):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if elapsed is not None:
+            self.send_header("X-Elapsed-Ms", f"{elapsed * 1000:.1f}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path == "/health":
+            self._send(200, self.service.health())
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/ocr":
+            self._send(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            self._send(413, {"error": f"请求体超过 {MAX_BODY} 字节"})
+            return
+        body = self.rfile.read(length)
+        t0 = time.perf_counter()
+        try:
+            ctype = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+            if ctype == "application/json":
+                payload = json.loads(body.decode("utf-8") or "{}")
+            else:
+                # 直接上传图片字节：配置与文件名放在查询参数中
+                query = dict(urllib.parse.parse_qsl(url.query))
+                payload = {"image_bytes": body, "filename": query.get("filename"), "config": query.get("config")}
+            result = self.service.handle(payload)
+        except KeyError as e:
+            self._send(404, {"error": str(e.args[0] if e.args else e)})
+            return
+        except (ValueError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+            return
+        self._send(200, result, time.perf_counter() - t0)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _parse_configs(items, default_path: str) -> dict:
+    configs = {DEFAULT_CONFIG: default_path}
+    for item in items or []:
+        name, sep, path = item.partition("=")
+        if not sep:
+            name, path = os.path.splitext(os.path.basename(item))[0], item
+        configs[name.strip()] = os.path.abspath(path.strip())
+    return configs
+
+
+def serve(args):
+    import mass_ocr_to_excel_rapidocr as ocr
+
+    ocr.DET_FALLBACK = args.det_fallback or ocr.DET_FALLBACK
+    ocr.PREPROCESS = args.preprocess or ocr.PREPROCESS
+    ocr.ALIGN = args.align or ocr.ALIGN
+    ocr.RECHECK_THRESHOLD = ocr.RECHECK_THRESHOLD if args.recheck is None else max(0.0, args.recheck)
+    default_cfg = ocr.ROI_CONFIG_PATH if os.path.isabs(ocr.ROI_CONFIG_PATH) else os.path.join(ocr.BASE_DIR, ocr.ROI_CONFIG_PATH)
+    registry = ConfigRegistry(ocr, _parse_configs(args.config, default_cfg))
+    # 引擎在各配置间共享，会话参数取默认配置的 engine 段
+    ocr.ENGINE_SETTINGS = ocr.load_engine_config(default_cfg)
+    ocr.init_ocr(ocr.USE_DET, intra_threads=args.threads)
+    # 预热：首次推理有额外的初始化开销，检测回退引擎也提前创建
+    try:
+        import numpy as np
+        ocr.read_text(np.full((48, 160, 3), 255, dtype=np.uint8), det_fallback=False)
+        if ocr.DET_FALLBACK != "never" and not ocr.USE_DET:
+            ocr.get_det_engine()
+    except Exception as e:
+        print(f"[WARN] 预热失败: {e}", flush=True)
+
+    _Handler.service = OcrService(ocr, registry)
+    _Handler.verbose = args.verbose
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.remove(args.unix)
+        server = UnixHTTPServer(args.unix, _Handler)
+        os.chmod(args.unix, 0o600)
+        where = f"unix:{args.unix}"
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), _Handler)
+        server.daemon_threads = True
+        where = f"http://{args.host}:{server.server_address[1]}"
+    print(f"✅ 识别服务已启动：{where}（ROI 配置：{', '.join(registry.ids())}）", flush=True)
+
+    def _stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # 被服务管理器（systemd 等）以 SIGTERM 停止时同样清理套接字文件
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+        print("👋 识别服务已停止", flush=True)
+
+
+# ---------- 客户端（仅标准库） ----------
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = 600):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.unix_path)
+        self.sock = sock
+
+
+def _connection(url: str, unix: str = "", timeout: float = 600):
+    if unix:
+        return UnixHTTPConnection(unix, timeout)
+    u = urllib.parse.urlsplit(url)
+    return http.client.HTTPConnection(u.hostname or DEFAULT_HOST, u.port or DEFAULT_PORT, timeout=timeout)
+
+
+def request(method: str, path: str, body: bytes = None, headers: dict = None, url: str = "", unix: str = ""):
+    conn = _connection(url or f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", unix)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        resp = conn.getresponse()
+        data = json.loads(resp.read().decode("utf-8") or "null")
+        if resp.status != 200:
+            raise RuntimeError(data.get("error") if isinstance(data, dict) else data)
+        return data
+    finally:
+        conn.close()
+
+
+def ocr_paths(paths, config: str = DEFAULT_CONFIG, upload: bool = False, url: str = "", unix: str = ""):
+    """按路径（服务端直接读取）或上传图片字节识别，返回行列表"""
+    if not upload:
+        body = json.dumps({"paths": [os.path.abspath(p) for p in paths], "config": config}).encode("utf-8")
+        return request("POST", "/ocr", body, {"Content-Type": "application/json"}, url, unix)
+    rows = []
+    for p in paths:
+        with open(p, "rb") as f:
+            data = f.read()
+        query = urllib.parse.urlencode({"config": config, "filename": os.path.basename(p)})
+        rows.append(request("POST", f"/ocr?{query}", data, {"Content-Type": "application/octet-stream"}, url, unix))
+    return rows
+
+
+def _write_csv(rows, path: str):
+    columns = []
+    for row in rows:
+        for k in row:
+            if k not in columns:
+                columns.append(k)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(columns)
+        for row in rows:
+            w.writerow(["" if row.get(c) is None else str(row.get(c)) for c in columns])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常驻 OCR 识别服务与客户端")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_serve = sub.add_parser("serve", help="启动服务（引擎常驻内存）")
+    p_serve.add_argument("--host", default=DEFAULT_HOST)
+    p_serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p_serve.add_argument("--unix", default="", help="改为监听 Unix 套接字路径")
+    p_serve.add_argument("--config", action="append", default=[],
+                         help="额外的 ROI 配置，格式 名称=路径（可多次指定；默认配置名为 default）")
+    p_serve.add_argument("--threads", type=int, default=-1, help="ONNXRuntime 每个会话的线程数（默认自动）")
+    p_serve.add_argument("--det-fallback", default=None)
+    p_serve.add_argument("--preprocess", choices=["numpy", "pil"], default=None)
+    p_serve.add_argument("--align", action="store_true", help="按各配置的 template_image 对齐后再裁剪")
+    p_serve.add_argument("--recheck", type=float, default=None, metavar="THRESHOLD",
+                         help="得分低于该值的结果再做一次二次识别（0 关闭）")
+    p_serve.add_argument("--verbose", action="store_true", help="打印每个请求")
+
+    for name in ("ocr", "health"):
+        p = sub.add_parser(name, help="识别图片" if name == "ocr" else "检查服务状态")
+        p.add_argument("--url", default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+        p.add_argument("--unix", default="", help="通过 Unix 套接字连接")
+        if name == "ocr":
+            p.add_argument("images", nargs="+")
+            p.add_argument("--config", default=DEFAULT_CONFIG, help="ROI 配置名称")
+            p.add_argument("--upload", action="store_true", help="上传图片字节（服务端无法访问该路径时使用）")
+            p.add_argument("--csv", default="", help="把结果写入 CSV（默认逐行打印 JSON）")
+
+    args = parser.parse_args(argv)
+    if args.cmd == "serve":
+        serve(args)
+        return 0
+    try:
+        if args.cmd == "health":
+            print(json.dumps(request("GET", "/health", url=args.url, unix=args.unix), ensure_ascii=False))
+            return 0
+        rows = ocr_paths(args.images, args.config, args.upload, args.url, args.unix)
+    except (OSError, RuntimeError) as e:
+        print(f"[ERROR] 识别服务请求失败: {e}", file=sys.stderr)
+        return 1
+    if args.csv:
+        _write_csv(rows, args.csv)
+        print(f"🎉 结果已保存到 {args.csv}")
+    else:
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
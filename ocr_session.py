@@ -0,0 +1,182 @@
+import os
+import threading
+import contextlib
+from typing import Optional
+
+# ONNXRuntime 会话参数：线程数、图优化级别、内存池、执行模式。
+# RapidOCR 构建 det/cls/rec 会话时写死了 SessionOptions（关闭内存池、ORT_ENABLE_ALL），
+# 只透传线程数；这里在创建引擎期间替换其 SessionOptions 构造函数，把下列参数应用到每个会话。
+#
+# roi_config.json 中的 "engine" 段（均可省略）：
+#   {"intra_op_num_threads": "auto" | 整数, "inter_op_num_threads": 1,
+#    "graph_optimization_level": "all" | "extended" | "basic" | "disable",
+#    "cpu_mem_arena": false, "execution_mode": "sequential" | "parallel",
+#    "rec": {...}, "det": {...}, "cls": {...}}      # 按模型覆盖上面的任意项
+
+SESSION_KEYS = ("intra_op_num_threads", "inter_op_num_threads", "graph_optimization_level",
+                "cpu_mem_arena", "execution_mode")
+MODELS = ("det", "cls", "rec")
+GRAPH_LEVELS = ("disable", "basic", "extended", "all")
+EXEC_MODES = ("sequential", "parallel")
+
+_PATCH_LOCK = threading.RLock()  # 替换 SessionOptions 构造函数期间持有，串行化同一进程内的引擎创建
+
+# 与 RapidOCR 默认行为一致（线程数 -1 表示由 ONNXRuntime 自行决定）
+DEFAULTS = {
+    "intra_op_num_threads": -1,
+    "inter_op_num_threads": -1,
+    "graph_optimization_level": "all",
+    "cpu_mem_arena": False,
+    "execution_mode": "sequential",
+}
+
+
+def auto_threads(workers: int = 1, cpus: Optional[int] = None) -> int:
+    """按进程数平分 CPU 核，避免多个 ONNXRuntime 会话互相抢占线程；单进程时交给 ONNXRuntime 自行决定"""
+    if workers <= 1:
+        return -1
+    return max(1, (cpus or os.cpu_count() or 1) // workers)
+
+
+def _check(key: str, value):
+    if key in ("intra_op_num_threads", "inter_op_num_threads"):
+        if value == "auto":
+            return value
+        return int(value)
+    if key == "graph_optimization_level":
+        value = str(value).lower()
+        if value not in GRAPH_LEVELS:
+            raise ValueError(f"graph_optimization_level 只能是 {' / '.join(GRAPH_LEVELS)}：{value}")
+        return value
+    if key == "execution_mode":
+        value = str(value).lower()
+        if value not in EXEC_MODES:
+            raise ValueError(f"execution_mode 只能是 {' / '.join(EXEC_MODES)}：{value}")
+        return value
+    if key == "cpu_mem_arena":
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        return bool(value)
+    raise KeyError(key)
+
+
+def merge_options(*layers: Optional[dict]) -> dict:
+    """按顺序合并多层配置（后者覆盖前者），按模型的覆盖段同样逐层合并；未知键忽略"""
+    out = dict(DEFAULTS)
+    per_model = {m: {} for m in MODELS}
+    for layer in layers:
+        for key, value in (layer or {}).items():
+            if value is None:
+                continue
+            if key in SESSION_KEYS:
+                out[key] = _check(key, value)
+            elif key in MODELS and isinstance(value, dict):
+                for k, v in value.items():
+                    if k in SESSION_KEYS and v is not None:
+                        per_model[key][k] = _check(k, v)
+    for m in MODELS:
+        if per_model[m]:
+            out[m] = per_model[m]
+    return out
+
+
+def resolve_options(options: dict, workers: int = 1) -> dict:
+    """把 "auto" 线程数换算成具体值，供各进程创建会话时使用"""
+    def _resolve(d: dict) -> dict:
+        d = dict(d)
+        if d.get("intra_op_num_threads") == "auto":
+            d["intra_op_num_threads"] = auto_threads(workers)
+        if d.get("inter_op_num_threads") == "auto":
+            d["inter_op_num_threads"] = 1 if workers > 1 else -1
+        return d
+
+    out = _resolve(options)
+    for m in MODELS:
+        if m in out:
+            out[m] = _resolve(out[m])
+    return out
+
+
+def options_for_model(options: dict, model_path) -> dict:
+    name = os.path.basename(str(model_path or "")).lower()
+    base = {k: options[k] for k in SESSION_KEYS if k in options}
+    for m in MODELS:
+        if f"_{m}" in name and m in options:
+            base.update(options[m])
+            break
+    return base
+
+
+def describe(options: dict) -> str:
+    intra = options.get("intra_op_num_threads", -1)
+    parts = [
+        f"线程 {intra if intra and intra > 0 else '自动'}",
+        f"图优化 {options.get('graph_optimization_level')}",
+        f"内存池 {'开' if options.get('cpu_mem_arena') else '关'}",
+        f"执行 {options.get('execution_mode')}",
+    ]
+    inter = options.get("inter_op_num_threads", -1)
+    if inter and inter > 0:
+        parts.insert(1, f"inter {inter}")
+    overrides = [m for m in MODELS if m in options]
+    if overrides:
+        parts.append(f"按模型覆盖 {','.join(overrides)}")
+    return "，".join(parts)
+
+
+def apply_session_options(sess_opt, options: dict):
+    import onnxruntime as ort
+
+    cpus = os.cpu_count() or 1
+    intra = int(options.get("intra_op_num_threads", -1))
+    if intra > 0:
+        sess_opt.intra_op_num_threads = min(intra, cpus)
+    inter = int(options.get("inter_op_num_threads", -1))
+    if inter > 0:
+        sess_opt.inter_op_num_threads = min(inter, cpus)
+    sess_opt.graph_optimization_level = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }[options.get("graph_optimization_level", "all")]
+    sess_opt.enable_cpu_mem_arena = bool(options.get("cpu_mem_arena", False))
+    sess_opt.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if options.get("execution_mode") == "parallel"
+                               else ort.ExecutionMode.ORT_SEQUENTIAL)
+    return sess_opt
+
+
+def _session_class():
+    try:
+        from rapidocr_onnxruntime.utils.infer_engine import OrtInferSession
+    except Exception:
+        return None
+    if not isinstance(OrtInferSession.__dict__.get("_init_sess_opts"), staticmethod):
+        return None
+    return OrtInferSession
+
+
+@contextlib.contextmanager
+def session_options(options: Optional[dict]):
+    """在此上下文中创建的 RapidOCR 引擎，其 det/cls/rec 会话都使用 options 中的参数。
+
+    RapidOCR 版本不兼容时不做替换（产出 False），调用方可退回只透传线程数。
+    替换的是进程级的类属性：整个上下文持有 _PATCH_LOCK，同一进程中其他线程（识别预览、常驻服务）
+    创建引擎时须同样经过本上下文（options 为空时只加锁、不替换），不会用到彼此的参数。
+    """
+    with _PATCH_LOCK:
+        cls = _session_class() if options else None
+        if cls is None:
+            yield False
+            return
+        original = cls.__dict__["_init_sess_opts"]
+
+        def _init_sess_opts(config):
+            sess_opt = original.__func__(config)
+            return apply_session_options(sess_opt, options_for_model(options, config.get("model_path")))
+
+        cls._init_sess_opts = staticmethod(_init_sess_opts)
+        try:
+            yield True
+        finally:
+            cls._init_sess_opts = original
@@ -0,0 +1,146 @@
+import os
+import re
+import csv
+import glob
+import heapq
+import hashlib
+import tempfile
+import unicodedata
+from typing import Iterator, List, Optional, Tuple
+
+# 多机分片：按相对路径的稳定哈希把同一图片目录划分给 N 台机器，各机器无需协调即可得到互不重叠的子集，
+# 各自写出分片 CSV；最后用合并命令把分片按相对路径排序归并为最终结果（外部排序，内存占用与总行数无关）。
+
+MERGE_CHUNK_ROWS = 50000   # 合并时每个排序块的行数（超出即写入临时文件）
+
+
+def parse_shard(spec: str) -> Optional[Tuple[int, int]]:
+    """"i/N"（i 从 1 开始）→ (i, N)；空字符串为不分片"""
+    if not spec:
+        return None
+    m = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", str(spec))
+    if not m:
+        raise ValueError(f"--shard 格式应为 i/N（如 1/4）：{spec}")
+    i, n = int(m.group(1)), int(m.group(2))
+    if n < 1 or not 1 <= i <= n:
+        raise ValueError(f"--shard 的 i 应在 1~N 之间：{spec}")
+    return i, n
+
+
+def shard_of(rel: str, n: int) -> int:
+    """相对路径所属分片（1~N）。统一为 "/" 分隔与 NFC 形式，不同平台、不同机器上结果一致"""
+    key = unicodedata.normalize("NFC", rel.replace("\\", "/"))
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % n + 1
+
+
+def select_shard(found, shard: Optional[Tuple[int, int]]) -> Iterator[Tuple[str, str]]:
+    """从 (路径, 相对路径) 序列中只保留属于本分片的条目（惰性）"""
+    if shard is None:
+        yield from found
+        return
+    i, n = shard
+    for path, rel in found:
+        if shard_of(rel, n) == i:
+            yield path, rel
+
+
+def shard_path(path: str, shard: Optional[Tuple[int, int]]) -> str:
+    """ocr_result.csv → ocr_result.shard-2-of-4.csv；不分片时原样返回"""
+    if shard is None or not path:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.shard-{shard[0]}-of-{shard[1]}{ext}"
+
+
+def find_shards(path: str) -> List[str]:
+    """查找 path 对应的全部分片文件；分片数不一致或有缺失时抛出 ValueError"""
+    stem, ext = os.path.splitext(path)
+    pattern = re.compile(re.escape(os.path.basename(stem)) + r"\.shard-(\d+)-of-(\d+)" + re.escape(ext) + "$")
+    found = {}
+    for p in glob.glob(glob.escape(stem) + ".shard-*-of-*" + ext):
+        m = pattern.match(os.path.basename(p))
+        if m:
+            found[(int(m.group(1)), int(m.group(2)))] = p
+    if not found:
+        raise FileNotFoundError(f"未找到分片文件：{stem}.shard-*-of-*{ext}")
+    totals = {n for _, n in found}
+    if len(totals) > 1:
+        raise ValueError(f"分片数不一致（{', '.join(str(n) for n in sorted(totals))}），请只保留同一次分片的结果")
+    n = totals.pop()
+    missing = [str(i) for i in range(1, n + 1) if (i, n) not in found]
+    if missing:
+        raise ValueError(f"缺少分片 {', '.join(missing)}（共 {n} 片）")
+    return [found[(i, n)] for i in range(1, n + 1)]
+
+
+def _sort_key(rel: str):
+    # 按路径分段比较，同一目录下的文件排在一起；多页文件的 "#页码" 按数字排序（#2 在 #10 之前）
+    parts = rel.split("/")
+    name, sep, page = parts[-1].rpartition("#")
+    if sep and page.isdigit():
+        return [(p, 0) for p in parts[:-1]] + [(name, int(page))]
+    return [(p, 0) for p in parts]
+
+
+def _spill(rows: List[list], key_idx: int, tmpdir: str) -> str:
+    rows.sort(key=lambda r: _sort_key(r[key_idx] if len(r) > key_idx else ""))
+    fd, path = tempfile.mkstemp(suffix=".csv", dir=tmpdir)
+    with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f, lineterminator="\n").writerows(rows)
+    rows.clear()
+    return path
+
+
+def _read_run(path: str) -> Iterator[list]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.reader(f)
+
+
+def merge_shards(paths: List[str], key_column: str, chunk_rows: int = MERGE_CHUNK_ROWS) -> Iterator[dict]:
+    """按 key_column（相对路径）排序归并各分片 CSV，逐行产出 dict（键为分片表头）。
+
+    每个分片按 chunk_rows 行一块排序后写入临时文件，再对所有块做 k 路归并；
+    内存中最多一块加上每块一行。相对路径重复的行只保留第一条。
+    """
+    chunk_rows = max(1, int(chunk_rows))
+    header = None
+    with tempfile.TemporaryDirectory(prefix="ocr_merge_", dir=os.path.dirname(os.path.abspath(paths[0]))) as tmpdir:
+        runs = []
+        for p in paths:
+            with open(p, "r", encoding="utf-8", newline="") as f:
+                reader = csv.reader(f)
+                h = next(reader, None)
+                if h is None:
+                    continue
+                if header is None:
+                    header = h
+                    if key_column not in header:
+                        raise ValueError(f"{p} 中没有 {key_column} 列，无法排序合并")
+                    key_idx = header.index(key_column)
+                elif h != header:
+                    raise ValueError(f"{p} 的表头与其他分片不一致：{h} ≠ {header}")
+                buf = []
+                for rec in reader:
+                    buf.append(rec)
+                    if len(buf) >= chunk_rows:
+                        runs.append(_spill(buf, key_idx, tmpdir))
+                if buf:
+                    runs.append(_spill(buf, key_idx, tmpdir))
+        if header is None:
+            return
+        streams = [_read_run(r) for r in runs]
+        last, duplicates = None, 0
+        try:
+            for rec in heapq.merge(*streams, key=lambda r: _sort_key(r[key_idx] if len(r) > key_idx else "")):
+                key = rec[key_idx] if len(rec) > key_idx else ""
+                if key and key == last:
+                    duplicates += 1
+                    continue
+                last = key
+                yield dict(zip(header, rec))
+        finally:
+            for s in streams:
+                s.close()
+        if duplicates:
+            print(f"[WARN] 跳过 {duplicates} 条相对路径重复的行（同一图片出现在多个分片中）", flush=True)
@@ -0,0 +1,271 @@
+import os
+import sys
+import time
+import select
+import sqlite3
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from ocr_discovery import IMAGE_EXTS, dir_excluded, wanted
+
+# 热文件夹监控：发现新到达的图片，等待写入完成（大小与修改时间稳定）后交给识别。
+# - Linux 本地目录使用 inotify（ctypes 调用，无第三方依赖）；
+# - 其他平台或网络共享使用轮询：只重新列出修改时间有变化的目录，未变化的目录不再读取；
+# - inotify 看不到其他机器写入网络共享的文件，因此 inotify 模式下仍定期做一次轮询兜底。
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0))
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.dirs = {}  # wd → (目录路径, 相对路径)
+
+    def add(self, path: str, rel: str) -> bool:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _IN_MASK)
+        if wd < 0:
+            return False
+        self.dirs[wd] = (path, rel)
+        return True
+
+    def read(self, timeout: float):
+        """返回 [(事件掩码, 目录路径, 目录相对路径, 文件名)]；队列溢出时返回 None"""
+        r, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not r:
+            return []
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            pos = 0
+            while pos + _EVENT.size <= len(data):
+                wd, mask, _, n = _EVENT.unpack_from(data, pos)
+                name = os.fsdecode(data[pos + _EVENT.size:pos + _EVENT.size + n].rstrip(b"\0"))
+                pos += _EVENT.size + n
+                if mask & _IN_Q_OVERFLOW:
+                    return None
+                if wd in self.dirs:
+                    path, rel = self.dirs[wd]
+                    events.append((mask, path, rel, name))
+        return events
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class FolderWatcher:
+    """监控目录中新出现的图片；poll() 返回已写入完成（在 settle 秒内大小与修改时间均未变化）的文件"""
+
+    def __init__(self, root: str, include=None, exclude=None, recursive: bool = True,
+                 settle: float = 2.0, poll_interval: float = 2.0, use_inotify: bool = True,
+                 rescan_interval: float = 60.0, skip: Optional[set] = None):
+        self.root = os.path.abspath(root)
+        # 已处理文件的相对路径（调用方持续追加）；这些文件不再做稳定性检查
+        self.skip = skip if skip is not None else set()
+        self.include, self.exclude = list(include or []), list(exclude or [])
+        self.recursive = recursive
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self._dirs: Dict[str, Tuple[int, set, List[Tuple[str, str]]]] = {}  # 目录 → (mtime_ns, 文件名集合, 子目录)
+        self._candidates: Dict[str, list] = {}  # 路径 → [相对路径, 大小, mtime_ns, 稳定起始时间]
+        self._last_scan = 0.0
+        self._inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+            except Exception:
+                self._inotify = None
+        self.mode = "inotify" if self._inotify is not None else "polling"
+        self._scan()
+
+    # ---------- 发现 ----------
+    def _consider(self, path: str, rel: str):
+        if path not in self._candidates and rel not in self.skip and wanted(rel, self.include, self.exclude, IMAGE_EXTS):
+            self._candidates[path] = [rel, -1, -1, 0.0]
+
+    def _scan(self):
+        """轮询扫描：修改时间未变（且不是刚刚修改）的目录沿用上次的文件名集合，不再列出"""
+        now = time.time()
+        stack = [(self.root, "")]
+        seen_dirs = set()
+        while stack:
+            path, rel_dir = stack.pop()
+            seen_dirs.add(path)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            known = self._dirs.get(path)
+            # 修改时间精度有限，最近 2 秒内修改过的目录总是重新列出
+            if known is not None and known[0] == mtime and now - mtime / 1e9 > 2.0:
+                stack.extend(known[2])
+                continue
+            names, subdirs = set(), []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self.recursive and not (self.exclude and dir_excluded(rel, self.exclude)):
+                                    subdirs.append((entry.path, rel))
+                                continue
+                        except OSError:
+                            continue
+                        names.add(entry.name)
+                        if known is None or entry.name not in known[1]:
+                            self._consider(entry.path, rel)
+            except OSError:
+                continue
+            if known is None and self._inotify is not None:
+                self._inotify.add(path, rel_dir)
+            self._dirs[path] = (mtime, names, subdirs)
+            stack.extend(subdirs)
+        for gone in set(self._dirs) - seen_dirs:
+            del self._dirs[gone]
+        self._last_scan = time.monotonic()
+
+    def _drain_events(self, timeout: float):
+        events = self._inotify.read(timeout)
+        if events is None:
+            # 事件队列溢出：做一次完整扫描补齐
+            self._scan()
+            return
+        for mask, dir_path, rel_dir, name in events:
+            path = os.path.join(dir_path, name)
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            if mask & _IN_ISDIR:
+                if self.recursive and not (self.exclude and dir_excluded(rel, self.exclude)):
+                    # 新目录：加监控后扫描一次（加监控之前写入的文件不会产生事件）
+                    self._scan()
+                continue
+            self._consider(path, rel)
+
+    # ---------- 稳定性检查 ----------
+    def _ready(self) -> List[Tuple[str, str]]:
+        now = time.monotonic()
+        ready = []
+        for path, cand in list(self._candidates.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                # 文件已被移走或删除
+                del self._candidates[path]
+                continue
+            if st.st_size != cand[1] or st.st_mtime_ns != cand[2]:
+                cand[1], cand[2], cand[3] = st.st_size, st.st_mtime_ns, now
+                continue
+            if st.st_size > 0 and now - cand[3] >= self.settle and _readable(path):
+                ready.append((path, cand[0]))
+                del self._candidates[path]
+        return ready
+
+    def poll(self, timeout: float = 1.0) -> List[Tuple[str, str]]:
+        """等待最多 timeout 秒，返回新近写入完成的 (路径, 相对路径)"""
+        if self._inotify is not None:
+            wait = timeout if not self._candidates else min(timeout, self.settle / 2)
+            self._drain_events(wait)
+            if time.monotonic() - self._last_scan >= self.rescan_interval:
+                self._scan()
+        else:
+            wait = timeout if not self._candidates else min(timeout, self.settle / 2)
+            next_scan = self._last_scan + self.poll_interval
+            time.sleep(max(0.0, min(wait, next_scan - time.monotonic())))
+            if time.monotonic() >= next_scan:
+                self._scan()
+        return self._ready()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._candidates)
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+
+def _readable(path: str) -> bool:
+    # Windows 下写入中的文件通常无法以读方式打开
+    try:
+        with open(path, "rb") as f:
+            f.read(1)
+        return True
+    except OSError:
+        return False
+
+
+class WatchLedger:
+    """已处理文件登记（SQLite）：重启后不会重复识别、重复追加"""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed ("
+            " rel_path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, processed REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def paths(self) -> set:
+        return {r[0] for r in self.conn.execute("SELECT rel_path FROM processed")}
+
+    def mark(self, items: List[Tuple[str, str]]):
+        now = time.time()
+        rows = []
+        for path, rel in items:
+            try:
+                st = os.stat(path)
+                rows.append((rel, st.st_size, st.st_mtime_ns, now))
+            except OSError:
+                rows.append((rel, None, None, now))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO processed (rel_path, size, mtime_ns, processed) VALUES (?, ?, ?, ?)", rows
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def output_relpaths(csv_path: str, column: str) -> set:
+    """读取已有 CSV 中的相对路径列（逐行读取，不载入整个文件）"""
+    import csv
+
+    if not os.path.exists(csv_path):
+        return set()
+    out = set()
+    try:
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None) or []
+            if column not in header:
+                return set()
+            idx = header.index(column)
+            for rec in reader:
+                if len(rec) > idx:
+                    out.add(rec[idx])
+    except Exception:
+        return out
+    return out
@@ -0,0 +1,326 @@
+import os
+import re
+import csv
+import time
+from typing import Iterator, List, Optional
+
+# 流式结果写出：每识别完一张即追加一行，内存占用与图片数量无关。
+# 所有列均按文本写出（Parquet/Feather 中为字符串类型），避免 Excel 把长编号显示为科学计数法。
+# 导出格式：CSV、XLSX（openpyxl 只写模式，超出行数上限自动分表）、JSON Lines、Parquet/Feather（需要 pyarrow）。
+
+
+def _as_text(v) -> str:
+    return "" if v is None else str(v)
+
+
+def read_csv_header(path: str) -> List[str]:
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return next(csv.reader(f), [])
+    except OSError:
+        return []
+
+
+def iter_csv_rows(path: str) -> Iterator[dict]:
+    """逐行读取 CSV 为 {列名: 文本}（不整体载入内存）"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+class CsvRowWriter:
+    """逐行追加 CSV，按行数/时间间隔定期刷新到磁盘。
+
+    append=True 时在已有文件末尾续写（表头须一致，否则抛出 ValueError），文件不存在或为空时先写表头。
+    """
+
+    def __init__(self, path: str, columns: List[str], flush_every: int = 100, flush_seconds: float = 2.0,
+                 append: bool = False):
+        self.path = path
+        self.columns = list(columns)
+        self.flush_every = max(1, int(flush_every))
+        self.flush_seconds = flush_seconds
+        has_rows = append and os.path.exists(path) and os.path.getsize(path) > 0
+        if has_rows:
+            header = read_csv_header(path)
+            if header != self.columns:
+                raise ValueError(f"{path} 的表头与当前 ROI 列不一致：{header} ≠ {self.columns}")
+        self._f = open(path, "a" if has_rows else "w", encoding="utf-8", newline="")
+        self._w = csv.writer(self._f, lineterminator="\n")
+        if not has_rows:
+            self._w.writerow(self.columns)
+        self._since_flush = 0
+        self._last_flush = time.monotonic()
+        self.rows = 0
+
+    def write(self, row: dict):
+        self._w.writerow([_as_text(row.get(c, "")) for c in self.columns])
+        self.rows += 1
+        self._since_flush += 1
+        if self._since_flush >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self._f.flush()
+        try:
+            os.fsync(self._f.fileno())
+        except OSError:
+            pass
+        self._since_flush = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._f.closed:
+            return
+        self.flush()
+        self._f.close()
+
+
+UNMATCHED_SHEET = "未匹配"
+EXCEL_MAX_ROWS = 1048576    # Excel 单个工作表的行数上限（含表头）
+_UNMATCHED = object()
+
+
+def sheet_title(name: str, used=()) -> str:
+    """Excel 工作表名：去掉不允许的字符、最长 31 个字符，与已有名称重复时加序号"""
+    base = re.sub(r"[\[\]:*?/\\]", "_", str(name)).strip("'") or "Sheet"
+    title, i = base[:31], 2
+    while title in used:
+        suffix = f"_{i}"
+        title, i = base[:31 - len(suffix)] + suffix, i + 1
+    return title
+
+
+class XlsxRowWriter:
+    """openpyxl 只写模式：行数据边写边落到临时文件，关闭时生成 xlsx，内存占用与行数无关。
+
+    sheets 为 {名称: 列} 时按 row[sheet_key] 写入对应工作表（各自只含自己的列），其余行写入“未匹配”工作表。
+    任一工作表写满 Excel 的行数上限后自动续写到“名称_2”、“名称_3”……
+    """
+
+    def __init__(self, path: str, columns: List[str], sheet_title: str = "Sheet1",
+                 sheets: Optional[dict] = None, sheet_key: Optional[str] = None, max_rows: int = EXCEL_MAX_ROWS):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.columns = list(columns)
+        self.max_rows = max(2, int(max_rows))
+        self._wb = Workbook(write_only=True)
+        self._sheet_key = sheet_key
+        self._used = set()
+        # 逻辑工作表 → [工作表, 列, 已写数据行数, 名称, 分卷序号]
+        self._targets = {}
+        if sheets:
+            for name, cols in sheets.items():
+                self._targets[name] = self._open(name, list(cols))
+        else:
+            self._targets[None] = self._open(sheet_title, self.columns)
+        self._split = bool(sheets)
+        self.rows = 0
+
+    def _open(self, name: str, cols: List[str], part: int = 1) -> list:
+        title = sheet_title(name if part == 1 else f"{name}_{part}", self._used)
+        self._used.add(title)
+        ws = self._wb.create_sheet(title=title)
+        ws.append(list(cols))
+        return [ws, cols, 0, name, part]
+
+    def write(self, row: dict):
+        key = row.get(self._sheet_key) if self._split else None
+        target = self._targets.get(key)
+        if target is None:
+            # 不属于任何工作表的行（未匹配模板、预处理出错）按需建“未匹配”表
+            target = self._targets.get(_UNMATCHED)
+            if target is None:
+                target = self._targets[_UNMATCHED] = self._open(UNMATCHED_SHEET, self.columns)
+        if target[2] >= self.max_rows - 1:
+            target[:] = self._open(target[3], target[1], target[4] + 1)
+        target[0].append([_as_text(row.get(c, "")) for c in target[1]])
+        target[2] += 1
+        self.rows += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._wb is None:
+            return
+        try:
+            self._wb.save(self.path)
+        finally:
+            self._wb = None
+
+
+class JsonlRowWriter:
+    """JSON Lines：每行一个 JSON 对象（键为列名，值均为文本）"""
+
+    def __init__(self, path: str, columns: List[str], flush_every: int = 1000):
+        import json
+
+        self._dumps = json.dumps
+        self.path = path
+        self.columns = list(columns)
+        self.flush_every = max(1, int(flush_every))
+        self._f = open(path, "w", encoding="utf-8", newline="\n")
+        self.rows = 0
+
+    def write(self, row: dict):
+        self._f.write(self._dumps({c: _as_text(row.get(c, "")) for c in self.columns}, ensure_ascii=False))
+        self._f.write("\n")
+        self.rows += 1
+        if self.rows % self.flush_every == 0:
+            self._f.flush()
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+
+
+class _ArrowRowWriter:
+    """按列缓冲 batch_rows 行后作为一个 Arrow record batch 写出；所有列均为字符串类型。
+    open_writer(path, schema) 返回带 write_batch / close 的底层写出器（Parquet 或 Arrow IPC）"""
+
+    def __init__(self, path: str, columns: List[str], open_writer, batch_rows: int = 65536):
+        import pyarrow as pa
+
+        self._pa = pa
+        self.path = path
+        self.columns = list(columns)
+        self.batch_rows = max(1, int(batch_rows))
+        self.schema = pa.schema([(c, pa.string()) for c in self.columns])
+        self._buf = [[] for _ in self.columns]
+        self._writer = open_writer(path, self.schema)
+        self.rows = 0
+
+    def write(self, row: dict):
+        for buf, c in zip(self._buf, self.columns):
+            buf.append(_as_text(row.get(c, "")))
+        self.rows += 1
+        if len(self._buf[0]) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if self._writer is None or not self._buf or not self._buf[0]:
+            return
+        pa = self._pa
+        arrays = [pa.array(buf, type=pa.string()) for buf in self._buf]
+        self._writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        self._buf = [[] for _ in self.columns]
+
+    def close(self):
+        if self._writer is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._writer.close()
+            self._writer = None
+
+
+def _open_parquet(path: str, schema):
+    import pyarrow.parquet as pq
+    return pq.ParquetWriter(path, schema, compression="zstd")
+
+
+def _open_feather(path: str, schema):
+    import pyarrow as pa
+    codec = "lz4" if pa.Codec.is_available("lz4") else None
+    return pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression=codec))
+
+
+class ParquetRowWriter(_ArrowRowWriter):
+    """Parquet（需要 pyarrow）：每 batch_rows 行一个 row group"""
+
+    def __init__(self, path: str, columns: List[str], batch_rows: int = 65536):
+        super().__init__(path, columns, _open_parquet, batch_rows)
+
+
+class FeatherRowWriter(_ArrowRowWriter):
+    """Feather v2 / Arrow IPC 文件（需要 pyarrow），可用 pandas.read_feather 直接读取"""
+
+    def __init__(self, path: str, columns: List[str], batch_rows: int = 65536):
+        super().__init__(path, columns, _open_feather, batch_rows)
+
+
+# 导出格式 → 文件扩展名；csv / xlsx 的路径由 OUTPUT_CSV / OUTPUT_XLSX 决定，其余与 CSV 同名换扩展名
+FORMATS = {"csv": ".csv", "xlsx": ".xlsx", "jsonl": ".jsonl", "parquet": ".parquet", "feather": ".feather"}
+
+
+def parse_formats(spec) -> List[str]:
+    """"csv,xlsx,parquet" → ["csv", "xlsx", "parquet"]（去重保序）；未知格式抛出 ValueError"""
+    items = spec.split(",") if isinstance(spec, str) else list(spec or [])
+    out = []
+    for f in items:
+        f = f.strip().lower().lstrip(".")
+        if not f:
+            continue
+        if f not in FORMATS:
+            raise ValueError(f"未知的导出格式：{f}（可选 {' / '.join(FORMATS)}）")
+        if f not in out:
+            out.append(f)
+    if not out:
+        raise ValueError("至少需要一种导出格式")
+    return out
+
+
+def open_row_writer(fmt: str, path: str, columns: List[str], sheets: Optional[dict] = None,
+                    sheet_key: Optional[str] = None, flush_every: int = 100):
+    """按格式创建逐行写出器（write / flush / close）；缺少可选依赖时抛出 ImportError"""
+    if fmt == "csv":
+        return CsvRowWriter(path, columns, flush_every=flush_every)
+    if fmt == "xlsx":
+        return XlsxRowWriter(path, columns, sheets=sheets, sheet_key=sheet_key)
+    if fmt == "jsonl":
+        return JsonlRowWriter(path, columns)
+    if fmt == "parquet":
+        return ParquetRowWriter(path, columns)
+    if fmt == "feather":
+        return FeatherRowWriter(path, columns)
+    raise ValueError(f"未知的导出格式：{fmt}")
+
+
+class BackgroundRowWriter:
+    """后台写出线程：识别线程只把行放入有上限的队列，由后台线程交给各写出器。
+
+    写出出错时记录异常并继续取走队列中的行（避免识别线程阻塞），下一次 write() 或 join() 时抛出。
+    """
+
+    _STOP = object()
+
+    def __init__(self, writers: list, depth: int = 64):
+        import queue
+        import threading
+
+        self.writers = list(writers)
+        self.error = None
+        self._q = queue.Queue(maxsize=max(1, int(depth)))
+        self._t = threading.Thread(target=self._run, name="ocr-writer", daemon=True)
+        self._t.start()
+
+    def _run(self):
+        while True:
+            row = self._q.get()
+            if row is self._STOP:
+                return
+            if self.error is not None:
+                continue
+            try:
+                for w in self.writers:
+                    w.write(row)
+            except Exception as e:
+                self.error = e
+
+    def write(self, row: dict):
+        if self.error is not None:
+            raise self.error
+        self._q.put(row)
+
+    def join(self):
+        """等待队列中的行全部写出（不关闭写出器）"""
+        if self._t.is_alive():
+            self._q.put(self._STOP)
+            self._t.join()
+        if self.error is not None:
+            raise self.error
@@ -1,23 +1,45 @@
 import os
 import json
-import cv2
 import sys
+import time
 import numpy as np
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
-# 可选：用于中文文字绘制与输入的支持
-try:
-    from PIL import Image as PILImage, ImageDraw, ImageFont
-    PIL_AVAILABLE = True
-except Exception:
-    PIL_AVAILABLE = False
+# 可选：PIL 用于中文文字绘制，tkinter 用于中文输入。两者都在首次用到时才导入，
+# 未找到中文字体时不会导入 PIL，不弹输入框时不会导入 tkinter，缩短启动时间。
+# OpenCV 是必需依赖，但同样在首次绘制或打开窗口时才导入（约占冷启动耗时的一大半）。
+_OPTIONAL = {}
 
-try:
-    import tkinter as tk
-    from tkinter import simpledialog
-    TK_AVAILABLE = True
-except Exception:
-    TK_AVAILABLE = False
+
+def _cv2():
+    """返回 cv2 模块（首次调用时导入）"""
+    if "cv2" not in _OPTIONAL:
+        import cv2
+        _OPTIONAL["cv2"] = cv2
+    return _OPTIONAL["cv2"]
+
+
+def _pil():
+    """返回 (Image, ImageDraw, ImageFont)；PIL 不可用时返回 None"""
+    if "pil" not in _OPTIONAL:
+        try:
+            from PIL import Image as PILImage, ImageDraw, ImageFont
+            _OPTIONAL["pil"] = (PILImage, ImageDraw, ImageFont)
+        except Exception:
+            _OPTIONAL["pil"] = None
+    return _OPTIONAL["pil"]
+
+
+def _tk():
+    """返回 (tkinter, simpledialog)；不可用时返回 None"""
+    if "tk" not in _OPTIONAL:
+        try:
+            import tkinter as tk
+            from tkinter import simpledialog
+            _OPTIONAL["tk"] = (tk, simpledialog)
+        except Exception:
+            _OPTIONAL["tk"] = None
+    return _OPTIONAL["tk"]
 
 
 IMAGE_DIR = "images"
@@ -43,19 +65,25 @@ CJK_FONT_CANDIDATES = [
     "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
 ]
 
+# 实时识别预览：每画完并命名一个框，后台线程按批量识别相同的链路（裁剪 → 小框放大 → 增强 → read_text）
+# 识别这个框，在框下方显示文本、置信度与耗时；触发检测回退或超过耗时预算的框标红。命令行 --preview 开启
+PREVIEW_OCR = False
+PREVIEW_BUDGET_MS = 300  # 单个框的识别耗时预算（毫秒，含预处理与检测回退）
+
 FONT_CACHE = {}
 
 
-def _load_cjk_font(size: int = 20) -> Optional[ImageFont.FreeTypeFont]:
-    if not PIL_AVAILABLE:
-        return None
+def _load_cjk_font(size: int = 20):
     f = FONT_CACHE.get(size)
     if f is not None:
         return f
     for path in CJK_FONT_CANDIDATES:
         try:
             if os.path.exists(path):
-                f = ImageFont.truetype(path, size)
+                pil = _pil()
+                if pil is None:
+                    return None
+                f = pil[2].truetype(path, size)
                 FONT_CACHE[size] = f
                 return f
         except Exception:
@@ -63,59 +91,97 @@ def _load_cjk_font(size: int = 20) -> Optional[ImageFont.FreeTypeFont]:
     return None
 
 
-def draw_text(frame, text: str, org: Tuple[int, int], color=(0, 255, 0), font_scale=0.6, thickness=2):
-    """在图像上绘制文字，优先使用 PIL 支持中文；否则回退到 cv2.putText（仅 ASCII）。"""
-    x, y = org
-    if USE_PIL_TEXT and PIL_AVAILABLE:
-        font = _load_cjk_font(size=int(22 * font_scale))
-        if font is not None:
-            # cv2 BGR -> PIL RGB
-            try:
-                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                pil_img = PILImage.fromarray(rgb)
-                draw = ImageDraw.Draw(pil_img)
+class TextBatch:
+    """一帧内的文字集中绘制：先 add() 收集，render() 时一次画完。
+
+    PIL 路径每帧只做一次 BGR→RGB→PIL→BGR 往返，且只转换所有文字覆盖的区域，
+    不再每个标签整帧往返一次；找不到中文字体时逐条回退到 cv2.putText（仅 ASCII）。
+    """
+
+    def __init__(self):
+        self.items = []  # (text, org, color, font_scale, thickness, multiline, max_width, line_spacing, bg)
+
+    def add(self, text, org: Tuple[int, int], color=(0, 255, 0), font_scale=0.6, thickness=2,
+            multiline: bool = False, max_width: Optional[int] = None, line_spacing: int = 8, bg=None):
+        """bg 为背景色（BGR）时先铺一块底色，浅色底图上的文字更易读"""
+        self.items.append((str(text), org, color, font_scale, thickness, multiline, max_width, line_spacing, bg))
+        return self
+
+    @staticmethod
+    def _pil_lines(s: str, font, multiline: bool, max_width: Optional[int]):
+        if multiline and max_width and max_width > 0:
+            unit = max(1, int(max_width / max(1, int(font.size * 0.9))))
+            return [s[i:i + unit] for i in range(0, len(s), unit)]
+        return [s]
+
+    def render(self, frame):
+        cv2 = _cv2()
+        pil_items, cv_items = [], []
+        for item in self.items:
+            font = _load_cjk_font(size=int(22 * item[3])) if USE_PIL_TEXT else None
+            (pil_items if font is not None else cv_items).append((item, font))
+        if pil_items and not self._render_pil(frame, pil_items):
+            cv_items.extend(pil_items)
+        for (s, (x, y), color, font_scale, thickness, multiline, _, line_spacing, bg), _ in cv_items:
+            # 回退：OpenCV 英文字体（中文会显示为 ???）
+            lines = [s[i:i + 40] for i in range(0, len(s), 40)] if multiline else [s]
+            for idx, ln in enumerate(lines):
+                if bg is not None:
+                    (tw, th), base = cv2.getTextSize(ln, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+                    ly = y + int(idx * (22 * font_scale + line_spacing))
+                    cv2.rectangle(frame, (x - 2, ly - th - 2), (x + tw + 2, ly + base + 2), bg, -1)
+                cv2.putText(frame, ln, (x, y + int(idx * (22 * font_scale + line_spacing))),
+                            cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+        self.items = []
+        return frame
+
+    def _render_pil(self, frame, pil_items) -> bool:
+        cv2 = _cv2()
+        try:
+            PILImage, ImageDraw, _ = _pil()
+            fh, fw = frame.shape[:2]
+            placed = []
+            x0, y0, x1, y1 = fw, fh, 0, 0
+            for (s, (x, y), color, _, _, multiline, max_width, line_spacing, bg), font in pil_items:
+                lines = self._pil_lines(s, font, multiline, max_width)
+                step = font.size + line_spacing
+                width = max(int(font.getlength(ln)) for ln in lines) + 2
+                x0, y0 = min(x0, x), min(y0, y)
+                x1, y1 = max(x1, x + width), max(y1, y + len(lines) * step + font.size // 4)
                 # PIL 颜色为 RGB
                 rgb_color = (color[2], color[1], color[0]) if len(color) == 3 else (0, 255, 0)
-                draw.text((x, y), str(text), font=font, fill=rgb_color)
-                # PIL RGB -> cv2 BGR
-                frame[:] = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-                return frame
-            except Exception:
-                pass
-    # 回退：OpenCV 英文字体（中文会显示为 ???）
-    cv2.putText(frame, str(text), (x, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
-    return frame
+                rgb_bg = (bg[2], bg[1], bg[0]) if bg is not None else None
+                placed.append((x, y, lines, step, font, rgb_color, rgb_bg))
+            x0, y0, x1, y1 = max(0, x0), max(0, y0), min(fw, x1), min(fh, y1)
+            if x1 <= x0 or y1 <= y0:
+                return True
+            region = frame[y0:y1, x0:x1]
+            pil_img = PILImage.fromarray(cv2.cvtColor(region, cv2.COLOR_BGR2RGB))
+            draw = ImageDraw.Draw(pil_img)
+            for x, y, lines, step, font, rgb_color, rgb_bg in placed:
+                for idx, ln in enumerate(lines):
+                    if rgb_bg is not None:
+                        draw.rectangle(draw.textbbox((x - x0, y - y0 + idx * step), ln, font=font), fill=rgb_bg)
+                    draw.text((x - x0, y - y0 + idx * step), ln, font=font, fill=rgb_color)
+            region[:] = cv2.cvtColor(np.asarray(pil_img), cv2.COLOR_RGB2BGR)
+            return True
+        except Exception:
+            return False
+
+
+def draw_text(frame, text: str, org: Tuple[int, int], color=(0, 255, 0), font_scale=0.6, thickness=2):
+    """在图像上绘制文字，优先使用 PIL 支持中文；否则回退到 cv2.putText（仅 ASCII）。
+    需要画多条文字时请用 TextBatch 一次画完。"""
+    return TextBatch().add(text, org, color, font_scale, thickness).render(frame)
+
 
 def draw_text_multiline(frame, text: str, org: Tuple[int, int], color=(0, 255, 0), font_scale=0.6, thickness=2, max_width: Optional[int] = None, line_spacing: int = 8):
-    x, y = org
-    s = str(text)
-    if USE_PIL_TEXT and PIL_AVAILABLE:
-        font = _load_cjk_font(size=int(22 * font_scale))
-        if font is not None:
-            try:
-                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                pil_img = PILImage.fromarray(rgb)
-                draw = ImageDraw.Draw(pil_img)
-                rgb_color = (color[2], color[1], color[0]) if len(color) == 3 else (0, 255, 0)
-                lines = [s]
-                if max_width and max_width > 0:
-                    unit = max(1, int(max_width / max(1, int(font.size * 0.9))))
-                    lines = [s[i:i + unit] for i in range(0, len(s), unit)]
-                for idx, ln in enumerate(lines):
-                    draw.text((x, y + idx * (font.size + line_spacing)), ln, font=font, fill=rgb_color)
-                frame[:] = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-                return frame
-            except Exception:
-                pass
-    chunk = 40
-    lines = [s[i:i + chunk] for i in range(0, len(s), chunk)]
-    for idx, ln in enumerate(lines):
-        cv2.putText(frame, ln, (x, y + int(idx * (22 * font_scale + line_spacing))), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
-    return frame
+    return TextBatch().add(text, org, color, font_scale, thickness, True, max_width, line_spacing).render(frame)
+
 
 def measure_text_height(text: str, font_scale: float, max_width: Optional[int] = None, line_spacing: int = 8) -> int:
     s = str(text)
-    if USE_PIL_TEXT and PIL_AVAILABLE:
+    if USE_PIL_TEXT:
         font = _load_cjk_font(size=int(22 * font_scale))
         if font is not None:
             lines = [s]
@@ -137,7 +203,214 @@ def list_images(dir_path):
     ]
 
 
-def draw_and_collect_rois(image_path, existing_cfg=None):
+HEADER_MIN_H = 220
+HEADER_GAP = 8
+
+
+def roi_key(r) -> tuple:
+    return str(r.get("name", "field")), r["x"], r["y"], r["w"], r["h"]
+
+
+class RoiRenderer:
+    """ROI 标注界面的分层渲染，画面 = 表头层 + 底图层 + 正在拖拽的蓝框：
+    - 底图层：缩放后的模板图 + 已有（黄）与新增（绿）ROI 框和名称，仅在 ROI 列表变化时重建；
+    - 表头层：说明文字，仅在文字变化时重建；
+    - 每帧只把两层拷入复用的画布，再画一个蓝框，耗时与 ROI 数量无关。
+    """
+
+    def __init__(self, img, max_w: int = 1280, max_h: int = 900):
+        cv2 = _cv2()
+        self.h, self.w = img.shape[:2]
+        self.scale = min(1.0, min(max_w / float(self.w), max_h / float(self.h)))
+        self.dw, self.dh = int(self.w * self.scale), int(self.h * self.scale)
+        self.base = cv2.resize(img, (self.dw, self.dh)) if self.scale != 1.0 else img.copy()
+        self._layers = {}  # 层名 -> (键, 图像)
+        self._frame = None
+
+    def box(self, r) -> Tuple[int, int, int, int]:
+        """归一化 ROI -> 底图坐标 (x, y, w, h)"""
+        ex, ey = int(r["x"] * self.w), int(r["y"] * self.h)
+        ew, eh = int(r["w"] * self.w), int(r["h"] * self.h)
+        return int(ex * self.scale), int(ey * self.scale), int(ew * self.scale), int(eh * self.scale)
+
+    def _cached(self, name, key, build):
+        cached = self._layers.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, build())
+            self._layers[name] = cached
+        return cached[1]
+
+    def overlay(self, existing, new, notes=None) -> np.ndarray:
+        """底图 + ROI 框与名称；existing 画黄色、new 画绿色。
+        notes: {roi_key(r): (文字, 颜色)}，写在对应框的下方（识别预览）"""
+        notes = notes or {}
+
+        def build():
+            cv2 = _cv2()
+            layer = self.base.copy()
+            texts = TextBatch()
+            for rois, color in ((existing or [], (0, 255, 255)), (new or [], (0, 255, 0))):
+                for r in rois:
+                    sx, sy, sw, sh = self.box(r)
+                    cv2.rectangle(layer, (sx, sy), (sx + sw, sy + sh), color, 2)
+                    texts.add(r.get("name", "field"), (sx + 4, sy + 18), color, 0.6, 2)
+                    note = notes.get(roi_key(r))
+                    if note is not None:
+                        # 写在框下方；框贴近底边时改写在框上方
+                        ny = sy + sh + 4 if sy + sh + 28 < self.dh else max(0, sy - 24)
+                        texts.add(note[0], (sx, ny), note[1], 0.6, 2, bg=(0, 0, 0))
+            return texts.render(layer)
+
+        key = (tuple(map(roi_key, existing or [])), tuple(map(roi_key, new or [])), tuple(sorted(notes.items())))
+        return self._cached("overlay", key, build)
+
+    def header(self, lines) -> np.ndarray:
+        """lines: [(文字, 颜色, 字号, 线宽)]，自上而下多行排版"""
+        def build():
+            max_width = self.dw - 40
+            heights = [measure_text_height(t, fs, max_width=max_width, line_spacing=6) for t, _, fs, _ in lines]
+            layer = np.zeros((max(HEADER_MIN_H, sum(heights) + 40), self.dw, 3), dtype=np.uint8)
+            texts = TextBatch()
+            y0 = 30
+            for (t, color, fs, th), lh in zip(lines, heights):
+                texts.add(t, (20, y0), color, fs, th, True, max_width, 6)
+                y0 += lh + HEADER_GAP
+            return texts.render(layer)
+
+        return self._cached("header", tuple(lines), build)
+
+    def compose(self, header, overlay, rect=None) -> np.ndarray:
+        """拼出一帧（复用同一块画布）；rect 为原图坐标的 (x1, y1, x2, y2)，画成蓝框"""
+        cv2 = _cv2()
+        hh = header.shape[0]
+        shape = (hh + self.dh, self.dw, 3)
+        if self._frame is None or self._frame.shape != shape:
+            self._frame = np.empty(shape, dtype=np.uint8)
+        self._frame[:hh] = header
+        self._frame[hh:] = overlay
+        if rect is not None:
+            x1, y1, x2, y2 = rect
+            sx, sy = int(min(x1, x2) * self.scale), int(min(y1, y2) * self.scale) + hh
+            srw, srh = int(abs(x2 - x1) * self.scale), int(abs(y2 - y1) * self.scale)
+            cv2.rectangle(self._frame, (sx, sy), (sx + srw, sy + srh), (255, 0, 0), 1)
+        return self._frame
+
+
+class OcrPreview:
+    """后台识别预览：submit() 只入队，识别在单独线程中进行，界面循环不等待。
+
+    与批量识别同一链路：按 RoiPlan 裁剪 → 小框放大 → enhance_for_ocr（或等价的 numpy 实现）
+    → read_text（按列的检测回退与二次识别策略），并做列清洗。首次识别前在后台线程里
+    导入 mass_ocr_to_excel_rapidocr 并初始化引擎（读取配置文件的 engine 段），加载耗时不计入框的耗时。
+    """
+
+    PENDING, OK, FLAGGED = (200, 200, 200), (255, 255, 0), (60, 60, 255)
+
+    def __init__(self, img, config_path: str = OUTPUT_JSON, budget_ms: float = PREVIEW_BUDGET_MS):
+        import queue
+        import threading
+
+        self.img = img  # BGR 原图
+        self.config_path = config_path
+        self.budget_ms = budget_ms
+        self.version = 0  # 每有一个结果 +1，界面据此重绘
+        self._notes = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="roi-preview", daemon=True)
+        self._thread.start()
+
+    def submit(self, roi: dict):
+        self._note(roi, "识别中…", self.PENDING)
+        self._queue.put(dict(roi))
+
+    def notes(self) -> dict:
+        with self._lock:
+            return dict(self._notes)
+
+    def close(self):
+        self._queue.put(None)
+
+    def _note(self, roi, text, color):
+        with self._lock:
+            self._notes[roi_key(roi)] = (text, color)
+            self.version += 1
+
+    def _run(self):
+        try:
+            ocr, pil_img = self._setup()
+        except Exception as e:
+            print(f"[WARN] 识别预览不可用：{e}", flush=True)
+            while True:
+                roi = self._queue.get()
+                if roi is None:
+                    return
+                self._note(roi, "预览不可用", self.FLAGGED)
+        while True:
+            roi = self._queue.get()
+            if roi is None:
+                return
+            try:
+                self._preview(ocr, pil_img, roi)
+            except Exception as e:
+                self._note(roi, f"[ERROR] {e}", self.FLAGGED)
+
+    def _setup(self):
+        from PIL import Image
+
+        import mass_ocr_to_excel_rapidocr as ocr
+
+        cv2 = _cv2()
+        t0 = time.perf_counter()
+        ocr.ENGINE_SETTINGS = ocr.load_engine_config(self.config_path)
+        ocr.init_ocr(use_det=ocr.USE_DET, verbose=False)
+        if not ocr.USE_DET and ocr.DET_FALLBACK != "never":
+            # 检测回退引擎也提前创建，首个触发回退的框的耗时不含加载
+            ocr.get_det_engine()
+        pil_img = Image.fromarray(cv2.cvtColor(self.img, cv2.COLOR_BGR2RGB))
+        print(f"🔎 识别预览已就绪（引擎加载 {time.perf_counter() - t0:.1f}s，耗时预算 {self.budget_ms:.0f}ms/框）", flush=True)
+        return ocr, pil_img
+
+    def _preview(self, ocr, pil_img, roi):
+        name = str(roi.get("name", "field"))
+        steps, _ = ocr.compile_roi_plan([dict(roi, name=name)]).for_size(pil_img.size)
+        if not steps:
+            self._note(roi, "空框（宽或高为 0），不识别", self.FLAGGED)
+            return
+        entry, box, upscale = steps[0]
+        ocr.take_fallback_stats()
+        t0 = time.perf_counter()
+        crop = pil_img.crop(box)
+        if upscale is not None:
+            crop = crop.resize(upscale, ocr.Image.LANCZOS)
+        if ocr.PREPROCESS == "numpy":
+            prep = ocr.enhance_crop_array(crop)
+        else:
+            prep = ocr._to_numpy_rgb(ocr.enhance_for_ocr(crop))
+        t1 = time.perf_counter()
+        text, score = ocr.read_text(prep, name, entry["det_fallback"], recheck=entry["recheck"])
+        t2 = time.perf_counter()
+        fallback = ocr.take_fallback_stats()["calls"] > 0
+        text = text if text.startswith("[ERROR]") else ocr.finish_text(entry, text)
+        ms = (t2 - t0) * 1000.0
+        flags = []
+        if fallback:
+            flags.append("检测回退")
+        if ms > self.budget_ms:
+            flags.append("超出耗时预算")
+        if not text:
+            flags.append("未识别到文字")
+        label = f"{text or '(空)'} | {score or 0.0:.2f} | {ms:.0f}ms" + (f" ! {'/'.join(flags)}" if flags else "")
+        self._note(roi, label, self.FLAGGED if flags else self.OK)
+        warn = "[WARN] " if flags else ""
+        print(f"{warn}预览 {name}: {text or '(空)'}  置信度 {score or 0.0:.2f}  耗时 {ms:.0f}ms"
+              f"（预处理 {(t1 - t0) * 1000.0:.0f}ms，识别 {(t2 - t1) * 1000.0:.0f}ms）"
+              + (f"  ⚠ {'、'.join(flags)}" if flags else ""), flush=True)
+
+
+def draw_and_collect_rois(image_path, existing_cfg=None, preview: bool = PREVIEW_OCR,
+                          budget_ms: float = PREVIEW_BUDGET_MS):
+    cv2 = _cv2()
     img = cv2.imread(image_path)
     if img is None:
         try:
@@ -145,26 +418,32 @@ def draw_and_collect_rois(image_path, existing_cfg=None):
             img = cv2.imdecode(data, cv2.IMREAD_COLOR)
         except Exception:
             pass
-    if img is None and PIL_AVAILABLE:
+    if img is None and _pil() is not None:
         try:
-            pil_img = PILImage.open(image_path).convert("RGB")
+            pil_img = _pil()[0].open(image_path).convert("RGB")
             img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
         except Exception:
             pass
     if img is None:
         raise RuntimeError(f"无法读取图片: {image_path}")
 
-    clone = img.copy()
+    renderer = RoiRenderer(img)
+    h, w = renderer.h, renderer.w
+    scale = renderer.scale
     # 新增：将 ROI 以字典保存，并在画框结束后即时命名
     rois = []  # new rois, each as {name, x, y, w, h} (normalized)
     drawing = False
     start_pt = (0, 0)
     current_rect = None  # (x1, y1, x2, y2)
     rect_finished = False
+    # 事件驱动重绘：只有鼠标/按键改变了状态才重新拼帧并 imshow，空闲时不做任何绘制
+    dirty = True
+    previewer = OcrPreview(img, budget_ms=budget_ms) if preview else None
+    preview_seen = 0
 
     HEADER_H_OFFSET = 260
     def mouse_cb(event, x, y, flags, param):
-        nonlocal drawing, start_pt, current_rect, rect_finished, HEADER_H_OFFSET
+        nonlocal drawing, start_pt, current_rect, rect_finished, HEADER_H_OFFSET, dirty
         if y < HEADER_H_OFFSET:
             return
         adj_x = x
@@ -175,34 +454,39 @@ def draw_and_collect_rois(image_path, existing_cfg=None):
             oy = int(adj_y / scale)
             start_pt = (ox, oy)
             current_rect = None
+            dirty = True
         elif event == cv2.EVENT_MOUSEMOVE and drawing:
             ox = int(adj_x / scale)
             oy = int(adj_y / scale)
             current_rect = (start_pt[0], start_pt[1], ox, oy)
+            dirty = True
         elif event == cv2.EVENT_LBUTTONUP:
             drawing = False
             ox = int(adj_x / scale)
             oy = int(adj_y / scale)
             current_rect = (start_pt[0], start_pt[1], ox, oy)
             rect_finished = True
+            dirty = True
 
     window_name = "ROI标注: 左键拖拽画框 | u撤销 | c清空 | d丢弃已有 | s保存 | q退出"
     cv2.namedWindow(window_name, cv2.WINDOW_AUTOSIZE)
     cv2.setMouseCallback(window_name, mouse_cb)
 
-    h, w = img.shape[:2]
-    max_w, max_h = 1280, 900
-    scale = min(1.0, min(max_w / float(w), max_h / float(h)))
-    dw, dh = int(w * scale), int(h * scale)
-    base = cv2.resize(img, (dw, dh)) if scale != 1.0 else clone.copy()
-    max_w, max_h = 1280, 900
-    scale = min(1.0, min(max_w / float(w), max_h / float(h)))
-    dw, dh = int(w * scale), int(h * scale)
+    def existing_rois():
+        return existing_cfg.get("rois") if existing_cfg else None
+
+    def show(header_lines, rect=None):
+        nonlocal HEADER_H_OFFSET
+        header = renderer.header(header_lines)
+        HEADER_H_OFFSET = header.shape[0]
+        notes = previewer.notes() if previewer is not None else None
+        cv2.imshow(window_name, renderer.compose(header, renderer.overlay(existing_rois(), rois, notes), rect))
 
     def prompt_text_in_window(prompt, default):
         """弹出命名输入。优先使用 Tk 对话框支持中文输入；回退到 ASCII 输入。"""
-        if ENABLE_TK_INPUT and TK_AVAILABLE:
+        if ENABLE_TK_INPUT and _tk() is not None:
             try:
+                tk, simpledialog = _tk()
                 root = tk.Tk()
                 root.withdraw()
                 # 让对话框出现在前台
@@ -214,45 +498,14 @@ def draw_and_collect_rois(image_path, existing_cfg=None):
                 return value.strip() if value.strip() else default
             except Exception:
                 pass
-        # 回退：在 OpenCV 窗口中进行 ASCII 输入
+        # 回退：在 OpenCV 窗口中进行 ASCII 输入（按键驱动，每次按键只重建表头层）
         typed = ""
         while True:
-            h1 = measure_text_height(prompt, 1.1, max_width=dw - 40, line_spacing=6)
-            h2 = measure_text_height(f"输入：{typed}", 1.1, max_width=dw - 40, line_spacing=6)
-            h3 = measure_text_height("回车确认 | ESC取消(默认) | 退格删除", 1.0, max_width=dw - 40, line_spacing=6)
-            header_h_local = max(220, h1 + h2 + h3 + 40)
-            nonlocal HEADER_H_OFFSET
-            HEADER_H_OFFSET = header_h_local
-            canvas = np.zeros((dh + header_h_local, dw, 3), dtype=np.uint8)
-            canvas[header_h_local:header_h_local + dh, 0:dw] = base
-            existing_count = 0
-            if existing_cfg and existing_cfg.get("rois"):
-                existing_count = len(existing_cfg["rois"])
-                for r in existing_cfg["rois"]:
-                    ex = int(r["x"] * w)
-                    ey = int(r["y"] * h)
-                    ew = int(r["w"] * w)
-                    eh = int(r["h"] * h)
-                    sx, sy, sw, sh = int(ex * scale), int(ey * scale), int(ew * scale), int(eh * scale)
-                    sy += header_h_local
-                    cv2.rectangle(canvas, (sx, sy), (sx + sw, sy + sh), (0, 255, 255), 2)
-                    canvas = draw_text(canvas, r.get("name", "field"), (sx + 4, sy + 18), (0, 255, 255), 0.9, 2)
-            for r in rois:
-                ex = int(r["x"] * w)
-                ey = int(r["y"] * h)
-                ew = int(r["w"] * w)
-                eh = int(r["h"] * h)
-                sx, sy, sw, sh = int(ex * scale), int(ey * scale), int(ew * scale), int(eh * scale)
-                sy += header_h_local
-                cv2.rectangle(canvas, (sx, sy), (sx + sw, sy + sh), (0, 255, 0), 2)
-                canvas = draw_text(canvas, r.get("name", "field"), (sx + 4, sy + 18), (0, 255, 0), 0.9, 2)
-            y0 = 30
-            canvas = draw_text_multiline(canvas, prompt, (20, y0), (255, 255, 255), 1.1, 2, max_width=dw - 40, line_spacing=6)
-            y0 += h1 + 10
-            canvas = draw_text_multiline(canvas, f"输入：{typed}", (20, y0), (0, 255, 0), 1.1, 2, max_width=dw - 40, line_spacing=6)
-            y0 += h2 + 10
-            canvas = draw_text_multiline(canvas, "回车确认 | ESC取消(默认) | 退格删除", (20, y0), (255, 255, 255), 1.0, 1, max_width=dw - 40, line_spacing=6)
-            cv2.imshow(window_name, canvas)
+            show([
+                (prompt, (255, 255, 255), 1.1, 2),
+                (f"输入：{typed}", (0, 255, 0), 1.1, 2),
+                ("回车确认 | ESC取消(默认) | 退格删除", (255, 255, 255), 1.0, 1),
+            ])
             k = cv2.waitKey(0) & 0xFF
             try:
                 vis = cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE)
@@ -271,66 +524,19 @@ def draw_and_collect_rois(image_path, existing_cfg=None):
 
     try:
         while True:
-            existing_count = 0
-            if existing_cfg and existing_cfg.get("rois"):
-                existing_count = len(existing_cfg["rois"])
-            s1 = "左键拖拽画框; u撤销; c清空; d丢弃黄色; s保存; q退出; ESC退出"
-            s2 = f"已存在字段: {existing_count}  | 新增框: {len(rois)}"
-            s3 = "提示: 每个框画完即命名；按 s 一次性保存"
-            s4 = "提示: 仅按字母键执行操作（s/u/c/d/q），避免 Ctrl 组合键"
-            h1 = measure_text_height(s1, 1.0, max_width=dw - 40, line_spacing=6)
-            h2 = measure_text_height(s2, 0.9, max_width=dw - 40, line_spacing=6)
-            h3 = measure_text_height(s3, 0.85, max_width=dw - 40, line_spacing=6)
-            h4 = measure_text_height(s4, 0.9, max_width=dw - 40, line_spacing=6)
-            header_h = max(220, h1 + h2 + h3 + h4 + 40)
-            HEADER_H_OFFSET = header_h
-            display = np.zeros((dh + header_h, dw, 3), dtype=np.uint8)
-            display[header_h:header_h + dh, 0:dw] = base
-
-            # draw existing config rois (in yellow)
-            if existing_cfg and existing_cfg.get("rois"):
-                for r in existing_cfg["rois"]:
-                    ex = int(r["x"] * w)
-                    ey = int(r["y"] * h)
-                    ew = int(r["w"] * w)
-                    eh = int(r["h"] * h)
-                    sx, sy, sw, sh = int(ex * scale), int(ey * scale), int(ew * scale), int(eh * scale)
-                    sy += header_h
-                    cv2.rectangle(display, (sx, sy), (sx + sw, sy + sh), (0, 255, 255), 2)
-                    display = draw_text(display, r.get("name", "field"), (sx + 4, sy + 18), (0, 255, 255), 0.6, 2)
-
-            # draw new rois (in green)
-            for r in rois:
-                ex = int(r["x"] * w)
-                ey = int(r["y"] * h)
-                ew = int(r["w"] * w)
-                eh = int(r["h"] * h)
-                sx, sy, sw, sh = int(ex * scale), int(ey * scale), int(ew * scale), int(eh * scale)
-                sy += header_h
-                cv2.rectangle(display, (sx, sy), (sx + sw, sy + sh), (0, 255, 0), 2)
-                display = draw_text(display, r.get("name", "field"), (sx + 4, sy + 18), (0, 255, 0), 0.6, 2)
-
-            # draw current rect (in blue)
-            if current_rect is not None and drawing:
-                (x1, y1, x2, y2) = current_rect
-                x = min(x1, x2)
-                y = min(y1, y2)
-                rw = abs(x2 - x1)
-                rh = abs(y2 - y1)
-                sx, sy, srw, srh = int(x * scale), int(y * scale), int(rw * scale), int(rh * scale)
-                sy += header_h
-                cv2.rectangle(display, (sx, sy), (sx + srw, sy + srh), (255, 0, 0), 1)
-
-            y0 = 30
-            display = draw_text_multiline(display, s1, (20, y0), (255, 255, 255), 1.0, 2, max_width=dw - 40, line_spacing=6)
-            y0 += h1 + 8
-            display = draw_text_multiline(display, s2, (20, y0), (255, 255, 255), 0.9, 2, max_width=dw - 40, line_spacing=6)
-            y0 += h2 + 8
-            display = draw_text_multiline(display, s3, (20, y0), (255, 255, 255), 0.85, 2, max_width=dw - 40, line_spacing=6)
-            y0 += h3 + 8
-            display = draw_text_multiline(display, s4, (20, y0), (255, 255, 255), 0.9, 2, max_width=dw - 40, line_spacing=6)
-
-            cv2.imshow(window_name, display)
+            # 后台预览有新结果时重绘
+            if previewer is not None and previewer.version != preview_seen:
+                preview_seen = previewer.version
+                dirty = True
+            if dirty:
+                dirty = False
+                existing_count = len(existing_rois() or [])
+                show([
+                    ("左键拖拽画框; u撤销; c清空; d丢弃黄色; s保存; q退出; ESC退出", (255, 255, 255), 1.0, 2),
+                    (f"已存在字段: {existing_count}  | 新增框: {len(rois)}", (255, 255, 255), 0.9, 2),
+                    ("提示: 每个框画完即命名；按 s 一次性保存", (255, 255, 255), 0.85, 2),
+                    ("提示: 仅按字母键执行操作（s/u/c/d/q），避免 Ctrl 组合键", (255, 255, 255), 0.9, 2),
+                ], current_rect if (drawing and current_rect is not None) else None)
             key = cv2.waitKey(20) & 0xFF
 
             # allow closing if window was closed by user
@@ -357,10 +563,15 @@ def draw_and_collect_rois(image_path, existing_cfg=None):
                     "w": ww / w,
                     "h": hh / h,
                 })
+                if previewer is not None:
+                    previewer.submit(rois[-1])
                 # 重置状态，避免重复弹窗
                 current_rect = None
                 rect_finished = False
+                dirty = True
 
+            if key != 255:
+                dirty = True
             if key == 27:  # ESC
                 return None
             elif (key == ord('u')) and rois:  # 仅支持字母键操作，避免 Ctrl 组合键
@@ -386,11 +597,13 @@ def draw_and_collect_rois(image_path, existing_cfg=None):
 
                 if existing_cfg and existing_cfg.get("rois"):
                     merged_rois = _merge_dedup(existing_cfg.get("rois", []), rois)
-                    return {
-                        "template_image": existing_cfg.get("template_image", os.path.basename(image_path)),
-                        "template_size": {"width": w, "height": h},
-                        "rois": merged_rois,
-                    }
+                    # 保留已有配置中的其他段（如 engine）
+                    return dict(
+                        existing_cfg,
+                        template_image=existing_cfg.get("template_image", os.path.basename(image_path)),
+                        template_size={"width": w, "height": h},
+                        rois=merged_rois,
+                    )
                 else:
                     return {
                         "template_image": os.path.basename(image_path),
@@ -398,6 +611,8 @@ def draw_and_collect_rois(image_path, existing_cfg=None):
                         "rois": rois,
                     }
     finally:
+        if previewer is not None:
+            previewer.close()
         try:
             cv2.destroyAllWindows()
             cv2.waitKey(1)
@@ -417,7 +632,45 @@ def load_existing_config(path):
     return None
 
 
-def main():
+def merge_into_templates(path, config):
+    """已有多模板配置（templates 列表）时，把本次标注作为其中一个模板保存：
+    template_image 相同的模板被替换（保留其名称），其他模板与配置段不变"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    except Exception:
+        return config
+    if not (isinstance(cfg, dict) and isinstance(cfg.get("templates"), list) and not cfg.get("rois")):
+        return config
+    image = config.get("template_image")
+    old = next((t for t in cfg["templates"] if t.get("template_image") == image), None)
+    entry = {
+        "name": (old or {}).get("name") or os.path.splitext(image or "")[0],
+        "template_image": image,
+        "template_size": config.get("template_size"),
+        "rois": config.get("rois", []),
+    }
+    if old and old.get("thumbnail"):
+        entry["thumbnail"] = old["thumbnail"]
+    templates = [entry if t is old else t for t in cfg["templates"]] if old else cfg["templates"] + [entry]
+    print(f"多模板配置：{'更新' if old else '新增'}模板 {entry['name']}（共 {len(templates)} 个模板）")
+    return dict(cfg, templates=templates)
+
+
+def _parse_args(argv: List[str]):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ROI 标注工具")
+    parser.add_argument("--preview", action="store_true", default=PREVIEW_OCR,
+                        help="每画完一个框在后台识别，显示文本、置信度与耗时")
+    parser.add_argument("--budget-ms", type=float, default=PREVIEW_BUDGET_MS,
+                        help=f"识别预览的单框耗时预算，超出时标红（默认 {PREVIEW_BUDGET_MS}）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = _parse_args([] if argv is None else argv)
+
     images = list_images(IMAGE_DIR)
     if not images:
         print(f"未在 {IMAGE_DIR} 找到图片")
@@ -427,15 +680,16 @@ def main():
     if existing_cfg:
         print(f"检测到已有配置文件：{OUTPUT_JSON}，当前字段数：{len(existing_cfg.get('rois', []))}。保存将追加新字段。")
     print(f"共发现 {len(images)} 张图片。将以首张图片作为模板进行标注。")
-    config = draw_and_collect_rois(images[0], existing_cfg=existing_cfg)
+    config = draw_and_collect_rois(images[0], existing_cfg=existing_cfg, preview=args.preview, budget_ms=args.budget_ms)
     if config is None:
         print("未保存配置，已退出。")
         return
 
+    config = merge_into_templates(OUTPUT_JSON, config)
     with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
         json.dump(config, f, ensure_ascii=False, indent=2)
     print(f"✅ ROI配置已保存到 {OUTPUT_JSON}")
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -1,6 +1,7 @@
 import os
 import sys
 import ctypes
+import multiprocessing
 
 if getattr(sys, "frozen", False):
     BASE_DIR = os.path.dirname(sys.executable)
@@ -49,8 +50,9 @@ def run():
         alert(f"未找到 images 目录：{images_dir}\n请在与程序同级创建 images 并放入图片后重试。")
         log("images dir missing")
         return 1
-    has_image = any(str(f).lower().endswith((".png", ".jpg", ".jpeg")) for f in os.listdir(images_dir))
-    if not has_image:
+    # 找到第一张图片即停止，不必列出整个（可能很大的）目录树
+    from ocr_discovery import first_image
+    if first_image(images_dir) is None:
         alert("images 目录为空或无图片文件。请放入待识别图片后重试。")
         log("no images found")
         return 1
@@ -103,5 +105,7 @@ def run():
     return 0
 
 if __name__ == "__main__":
+    # 打包为 exe 后多进程识别需要此调用，避免子进程重复执行入口
+    multiprocessing.freeze_support()
     code = run()
     sys.exit(code)